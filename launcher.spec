@@ -18,6 +18,7 @@ config_dir = 'resources/{}'.format(launcher_config.config_select.config_dir)
 hiddenimports=[]
 hiddenimports.append('importlib')  # Kivy 1.9.2
 hiddenimports.append('_cffi_backend')  # Paramiko (cryptography)
+hiddenimports.append('_scandir')  # scandir C extension, imported conditionally
 
 a = Analysis(['src/launcher.py'],
              hiddenimports=hiddenimports)
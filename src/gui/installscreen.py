@@ -33,6 +33,7 @@ from kivy.network.urlrequest import UrlRequest
 from kivy.uix.screenmanager import Screen
 from kivy.logger import Logger
 
+from sync import progressrecord
 from sync.modmanager import ModManager
 from utils.devmode import devmode
 from utils.fake_enum import enum
@@ -68,6 +69,10 @@ class Controller(object):
         self.mod_manager = ModManager(self.settings)
         self.version = version
         self.para = None
+        self.revalidate_para = None
+        self.update_para = None
+        self.pending_mod_data = None
+        self.progress_decoder = progressrecord.ProgressDecoder()
 
         Clock.schedule_once(self.update_footer_label, 0)
 
@@ -89,7 +94,7 @@ class Controller(object):
             # Don't run logic if required third party programs are not installed
             if third_party.helpers.check_requirements(verbose=False):
                 # download mod description
-                self.start_mod_checking(force_download_new=True)
+                self.start_mod_checking(force_download_new=True, use_cache_first=True)
 
             else:
                 # This will check_requirements(dt) which is not really what we
@@ -113,16 +118,26 @@ class Controller(object):
 
         Clock.schedule_interval(partial(stage1_wait_to_init_action_button, workaround_partial), 0)
 
-    def start_mod_checking(self, force_download_new=False):
+    def start_mod_checking(self, force_download_new=False, use_cache_first=False):
         """Start the whole process of getting metadata and then checking if all
         the mods are correctly downloaded.
+
+        use_cache_first: when downloading new metadata, start checking the mods
+        with the cached metadata right away, without waiting for the master
+        server. Only the mods that changed are checked again once the new
+        metadata arrives.
         """
         self.set_action_button_state(DynamicButtonStates.checking)
 
         self.syncing_failed = False
         self.mod_manager.reset()
+        self.pending_mod_data = None
+
+        if force_download_new and use_cache_first and self.settings.get('mod_data_cache'):
+            self.on_download_mod_description_resolve({'data': self.settings.get('mod_data_cache')})
+            self.revalidate_mod_description()
 
-        if force_download_new:
+        elif force_download_new:
             # download mod description
             self.para = self.mod_manager.download_mod_description()
             self.para.then(self.on_download_mod_description_resolve,
@@ -231,15 +246,63 @@ class Controller(object):
             Logger.debug('on_watchdog_metadata_fetch: Requirements not met. Aborting.')
             return
 
-        data = data['data']
+        if not data['changed']:
+            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Not doing anything.')
+            return
 
-        if data != self.settings.get('mod_data_cache'):
-            Logger.info('on_watchdog_metadata_fetch: Data differs, restarting the checking routine.')
-            self.settings.set('automatic_download', True)
-            self.restart_checking_mods(force_download_new=True)
+        # No digest is known for metadata cached by older versions
+        if self.settings.get('mod_data_digest') is None and \
+           data['data'] == self.settings.get('mod_data_cache'):
+            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Saving its digest.')
+            self.mod_manager.save_mod_description(data)
+            return
 
-        else:
-            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Not doing anything.')
+        Logger.info('on_watchdog_metadata_fetch: Data differs, updating the synchronized mods.')
+        self.mod_manager.save_mod_description(data)
+        self.watchdog_reschedule(data['data'])
+        self.update_syncing_mods(data['data'])
+
+    def update_syncing_mods(self, mod_data):
+        """Check the mods of the new metadata and pass them to the running
+        sync. Only the torrents of the mods that changed are restarted, the
+        other ones keep seeding.
+        """
+
+        self.update_para = self.mod_manager.prepare_and_check(mod_data, self.mod_manager.get_mod_states())
+        self.update_para.then(self.on_update_check_resolve, self.on_update_check_reject, None)
+
+    def restart_with_download(self):
+        """Check all the mods again and download the ones that need it."""
+
+        self.settings.set('automatic_download', True)
+        self.restart_checking_mods()
+
+    def on_update_check_resolve(self, progress):
+        if not self.is_para_running('sync'):
+            Logger.info('on_update_check_resolve: Syncing has stopped in the meantime. Restarting the checking routine.')
+            self.restart_with_download()
+            return
+
+        try:
+            self.mod_manager.select_server(self.settings.get('selected_server'))
+
+        except KeyError:
+            Logger.info('on_update_check_resolve: The selected server is gone. Restarting the checking routine.')
+            self.restart_with_download()
+            return
+
+        self.mod_manager.update_sync(self.para)
+        self.view.ids.server_list_scrolled.servers = self.mod_manager.get_servers()
+
+        # Don't allow playing until the new mods are downloaded
+        if not all(mod.is_complete() for mod in self.mod_manager.get_synced_elements()):
+            self.set_action_button_state(DynamicButtonStates.install)
+            self.disable_action_buttons()
+
+    def on_update_check_reject(self, data):
+        Logger.error('on_update_check_reject: Could not check the new mods: {}. Restarting the checking routine.'.format(
+            data.get('msg', DEFAULT_ERROR_MESSAGE)))
+        self.restart_with_download()
 
     def metadata_watchdog(self, dt):
         """Check if the metadata has changed from the time it was last fetched.
@@ -255,9 +318,64 @@ class Controller(object):
 
         Logger.debug('metadata_watchdog: Requirements met proceeding with the download.')
 
-        self.watchdog_para = self.mod_manager.download_mod_description(dry_run=True)
+        self.watchdog_para = self.mod_manager.check_mod_description()
         self.watchdog_para.then(self.on_watchdog_metadata_fetch, None, None)
 
+    def revalidate_mod_description(self):
+        """Download the metadata in the background while the cached metadata
+        is being used.
+        """
+
+        self.revalidate_para = self.mod_manager.download_mod_description(dry_run=True)
+        self.revalidate_para.then(self.on_revalidate_resolve, self.on_revalidate_reject, None)
+
+    def on_revalidate_resolve(self, progress):
+        data = progress['data']
+        self.watchdog_reschedule(data)
+
+        if data == self.settings.get('mod_data_cache'):
+            Logger.info('on_revalidate_resolve: The cached metadata is up to date.')
+            self.mod_manager.save_mod_description(progress)
+            return
+
+        if self.is_para_running('sync'):
+            Logger.info('on_revalidate_resolve: Data differs, updating the synchronized mods.')
+            self.mod_manager.save_mod_description(progress)
+            self.update_syncing_mods(data)
+
+        elif self.is_para_running('checkmods'):
+            Logger.info('on_revalidate_resolve: Data differs, checking the changed mods after the current check.')
+            self.mod_manager.save_mod_description(progress)
+            self.pending_mod_data = data
+
+        elif self.is_para_running():
+            # Don't interrupt the user. The watchdog will pick the changes up
+            Logger.info('on_revalidate_resolve: Data differs, leaving it to the watchdog.')
+
+        else:
+            Logger.info('on_revalidate_resolve: Data differs, checking the changed mods.')
+            self.mod_manager.save_mod_description(progress)
+            self.recheck_changed_mods(data)
+
+    def on_revalidate_reject(self, data):
+        message = data.get('msg', DEFAULT_ERROR_MESSAGE)
+
+        if 'launcher is out of date' in message:
+            self.stop_mod_processing()
+            self.on_download_mod_description_reject(data)
+            return
+
+        Logger.error('on_revalidate_reject: Could not download the metadata, using the cached data: {}'.format(message))
+
+    def recheck_changed_mods(self, mod_data):
+        """Check the mods again with new metadata. The mods that have not
+        changed since the last check are not checked again.
+        """
+
+        self.disable_action_buttons()
+        self.set_action_button_state(DynamicButtonStates.checking)
+        self.checkmods(mod_data, known_states=self.mod_manager.get_mod_states())
+
     def seeding_and_action_button_upkeep(self, dt):
         """Check if seeding should be performed and if the play button should be available again.
         Start or stop seeding as needed.
@@ -781,8 +899,8 @@ class Controller(object):
 
     # Checkmods callbacks ######################################################
 
-    def checkmods(self, mod_data):
-        self.para = self.mod_manager.prepare_and_check(mod_data)
+    def checkmods(self, mod_data, known_states=None):
+        self.para = self.mod_manager.prepare_and_check(mod_data, known_states)
         self.para.then(self.on_checkmods_resolve,
                        self.on_checkmods_reject,
                        self.on_checkmods_progress)
@@ -791,8 +909,24 @@ class Controller(object):
         self.view.ids.status_image.show()
         self._set_status_label(progress.get('msg'))
 
+    def check_pending_mod_data(self):
+        """Check the mods again if new metadata has arrived during the check.
+        Return True if a new check has been started.
+        """
+
+        if self.pending_mod_data is None:
+            return False
+
+        mod_data, self.pending_mod_data = self.pending_mod_data, None
+        self.recheck_changed_mods(mod_data)
+        return True
+
     def on_checkmods_resolve(self, progress):
         self.para = None
+
+        if self.check_pending_mod_data():
+            return
+
         Logger.debug('InstallScreen: Checking mods finished')
         self.view.ids.status_image.hide()
         self._set_status_label(progress.get('msg'))
@@ -867,6 +1001,10 @@ class Controller(object):
 
     def on_checkmods_reject(self, data):
         self.para = None
+
+        if self.check_pending_mod_data():
+            return
+
         message = data.get('msg', DEFAULT_ERROR_MESSAGE)
         details = data.get('details', None)
         last_line = details if details else message
@@ -917,12 +1055,32 @@ class Controller(object):
     def on_sync_progress(self, progress, percentage):
         # Logger.debug('InstallScreen: syncing in progress')
 
+        message = progress.get('msg')
+        mods = progress.get('mods')
+
+        record = progress.get('progress_record')
+        if record:
+            try:
+                state = self.progress_decoder.decode(record)
+            except ValueError as ex:
+                Logger.error('InstallScreen: Could not decode the sync progress: {}'.format(ex))
+                return
+
+            if state is None:
+                # The full record has been skipped. Ask for a new one
+                if self.progress_decoder.keyframe_needed and self.para:
+                    self.para.send_message('progress_keyframe')
+
+                return
+
+            message, mods, percentage = progressrecord.format_progress(state)
+
         # Hide the status indicator when we are seeding because that was somehow confusing people :(
         if percentage != 1:
             self.view.ids.status_image.show()
         else:
             self.view.ids.status_image.hide()
-        self._set_status_label(progress.get('msg'), progress.get('mods'))
+        self._set_status_label(message, mods)
 
         # By request: show an empty progress bar if seeding (progress == 100%)
         if percentage == 1:
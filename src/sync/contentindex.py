@@ -0,0 +1,235 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import platform
+import shutil
+
+import libtorrent
+
+from kivy.logger import Logger
+from utils import context
+from utils import paths
+from utils.hashcache import HashCache
+from utils.metadatafile import MetadataFile, get_mods_names
+from utils.unicode_helpers import decode_utf8
+
+if platform.system() == 'Windows':
+    import pywintypes
+    import win32file
+
+
+def _link_file(source, destination):
+    """Create a hard link. Raise OSError on failure."""
+
+    if platform.system() == 'Windows':
+        try:
+            win32file.CreateHardLink(destination, source)
+
+        except pywintypes.error as ex:
+            raise OSError(ex.winerror, ex.strerror, destination)
+
+    else:
+        os.link(source, destination)
+
+
+class ContentIndex(object):
+    """Map of the files already present on disk, by their SHA1 checksum.
+
+    The index is built from the torrents of all the mods that have metadata.
+    Before a torrent is downloaded, its files that are missing on disk can be
+    created from identical files of other mods (or from the same mod, if a file
+    has been moved) so only new content has to be downloaded.
+
+    The candidate files are hashed before being used, so a modified file is
+    never reused. libtorrent still verifies the pieces of all the new files.
+    """
+
+    def __init__(self):
+        super(ContentIndex, self).__init__()
+
+        self.entries = {}  # sha1: [(full_path, size, mod_name, torrent_url)]
+        self.hash_caches = {}  # (mod_name, torrent_url): HashCache
+
+    def add_torrent(self, torrent_info, save_path, mod_name, torrent_url):
+        """Add the files of the torrent, stored in save_path, to the index."""
+
+        for entry in torrent_info.files():
+            if entry.size == 0 or entry.filehash.is_all_zeros():
+                continue
+
+            full_path = os.path.join(save_path, entry.path.decode('utf-8'))
+            self.entries.setdefault(entry.filehash.to_bytes(), []).append(
+                (full_path, entry.size, mod_name, torrent_url))
+
+    @classmethod
+    def build(cls):
+        """Build the index from the metadata of all the mods."""
+
+        content_index = cls()
+
+        for mod_name in get_mods_names():
+            metadata_file = MetadataFile(mod_name)
+
+            try:
+                metadata_file.read_data()
+
+            except (IOError, ValueError):
+                continue
+
+            # The files of a mod that has not been fully synced are most
+            # probably incomplete
+            if metadata_file.get_dirty():
+                continue
+
+            torrent_content = metadata_file.get_torrent_content()
+            resume_data = metadata_file.get_torrent_resume_data()
+            if not torrent_content or not resume_data:
+                continue
+
+            try:
+                save_path = libtorrent.bdecode(resume_data).get('save_path')
+                torrent_info = libtorrent.torrent_info(libtorrent.bdecode(torrent_content))
+
+            except (RuntimeError, AttributeError) as ex:
+                Logger.error('ContentIndex: Could not parse the metadata of {}: {}'.format(mod_name, repr(ex)))
+                continue
+
+            if not save_path:
+                continue
+
+            content_index.add_torrent(torrent_info, decode_utf8(save_path), mod_name, metadata_file.get_torrent_url())
+
+        Logger.info('ContentIndex: Indexed {} distinct files'.format(len(content_index.entries)))
+        return content_index
+
+    def _get_hash_cache(self, mod_name, torrent_url):
+        key = (mod_name, torrent_url)
+
+        if key not in self.hash_caches:
+            hash_cache = HashCache(mod_name, torrent_url)
+            hash_cache.load()
+            self.hash_caches[key] = hash_cache
+
+        return self.hash_caches[key]
+
+    def find_file(self, checksum, size, exclude_path=None):
+        """Return the path of an existing file with the given checksum or None."""
+
+        for full_path, entry_size, mod_name, torrent_url in self.entries.get(checksum, []):
+            if entry_size != size or full_path == exclude_path:
+                continue
+
+            try:
+                if os.path.getsize(full_path) != size:
+                    continue
+
+                if self._get_hash_cache(mod_name, torrent_url).sha1(full_path) != checksum:
+                    continue
+
+            except (IOError, OSError):
+                continue
+
+            return full_path
+
+        return None
+
+    def reuse_files(self, torrent_info, save_path, use_hardlinks=False, message_queue=None):
+        """Create the files of the torrent that are missing on disk (or have a
+        wrong size) from identical files already present on disk.
+        Return the number of bytes that won't need to be downloaded.
+        """
+
+        operations = []  # (source, destination)
+
+        for entry in torrent_info.files():
+            if entry.size == 0 or entry.filehash.is_all_zeros():
+                continue
+
+            destination = os.path.join(save_path, entry.path.decode('utf-8'))
+
+            try:
+                if os.path.getsize(destination) == entry.size:
+                    continue  # libtorrent will check it
+
+            except OSError:
+                pass
+
+            source = self.find_file(entry.filehash.to_bytes(), entry.size, exclude_path=destination)
+            if source:
+                operations.append((source, destination, entry.size))
+
+        if not operations:
+            return 0
+
+        if message_queue:
+            message_queue.progress({'msg': 'Reusing {} files already on disk...'.format(len(operations)),
+                                    'log': []}, 0)
+
+        # Create all the files under temporary names first. A file being
+        # replaced may be the source of another file of the same torrent
+        reused = []
+        for source, destination, size in operations:
+            tmp_path = destination + '.reuse_tmp'
+
+            try:
+                with context.ignore_nosuchfile_exception():
+                    os.unlink(tmp_path)
+
+                try:
+                    os.makedirs(os.path.dirname(destination))
+                except OSError as ex:
+                    if ex.errno != errno.EEXIST:
+                        raise
+
+                if use_hardlinks:
+                    try:
+                        _link_file(source, tmp_path)
+
+                    except OSError:
+                        shutil.copyfile(source, tmp_path)
+
+                else:
+                    shutil.copyfile(source, tmp_path)
+
+            except (IOError, OSError) as ex:
+                Logger.error('ContentIndex: Could not reuse {} as {}: {}'.format(source, destination, repr(ex)))
+
+                with context.ignore_nosuchfile_exception():
+                    os.unlink(tmp_path)
+                continue
+
+            reused.append((tmp_path, destination, size))
+
+        reused_size = 0
+        for tmp_path, destination, size in reused:
+            try:
+                paths.replace_file(tmp_path, destination)
+
+            except OSError as ex:
+                Logger.error('ContentIndex: Could not rename {}: {}'.format(tmp_path, repr(ex)))
+                continue
+
+            Logger.debug('ContentIndex: Reused an existing file for {}'.format(destination))
+            reused_size += size
+
+        Logger.info('ContentIndex: Reused {} files ({} bytes) instead of downloading them'.format(
+            len(reused), reused_size))
+
+        return reused_size
+
+    def save_hash_caches(self):
+        for hash_cache in self.hash_caches.values():
+            hash_cache.save()
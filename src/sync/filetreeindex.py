@@ -0,0 +1,220 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import struct
+import threading
+import time
+
+from collections import OrderedDict
+from kivy.logger import Logger
+from sync.integrity import parse_files_list, prepare_files_sets
+from utils import paths
+
+
+class FileTreeIndex(object):
+    """Immutable index of the files and directories contained in a torrent.
+
+    Holds the torrent paths as well as the sets used by check_mod_directories
+    (whitelisted entries removed and paths casefolded) so they are computed
+    only once per torrent. The index is keyed by the torrent infohash and is
+    kept in memory and on disk next to the mods metadata.
+
+    Usage:
+        file_index = get_file_index(torrent_info)
+        check_mod_directories(file_index.files, base_directory, file_index=file_index)
+    """
+
+    file_extension = '.tree_index'
+    file_directory = 'mods_metadata'
+    max_age = 30 * 24 * 3600  # Remove the indexes not rebuilt for that long
+    _magic = b'BALT'
+    _version = 1
+    _header = struct.Struct(b'<4sHH')  # magic, version, sections count
+    _section = struct.Struct(b'<II')  # entries count, length
+    _sections = ('files', 'dirs', 'files_nocase', 'dirs_nocase', 'top_dirs_nocase')
+
+    def __init__(self, files, dirs, files_nocase, dirs_nocase, top_dirs_nocase):
+        super(FileTreeIndex, self).__init__()
+
+        self.files = tuple(files)
+        self.dirs = frozenset(dirs)
+        self.files_nocase = frozenset(files_nocase)
+        self.dirs_nocase = frozenset(dirs_nocase)
+        self.top_dirs_nocase = frozenset(top_dirs_nocase)
+
+    @classmethod
+    def from_files_list(cls, files_list):
+        _, dirs, _, _ = parse_files_list(files_list, None)
+        top_dirs_nocase, dirs_nocase, files_nocase, _ = prepare_files_sets(files_list, None)
+
+        return cls(sorted(files_list), dirs, files_nocase, dirs_nocase, top_dirs_nocase)
+
+    @staticmethod
+    def get_file_name(infohash):
+        """Returns the full path to the index file of the torrent"""
+        return paths.get_launcher_directory(FileTreeIndex.file_directory,
+                                            '{}{}'.format(infohash, FileTreeIndex.file_extension))
+
+    def pack(self):
+        """Serialize the index to a binary string."""
+
+        chunks = [self._header.pack(self._magic, self._version, len(self._sections))]
+
+        for section in self._sections:
+            values = sorted(getattr(self, section))
+            blob = '\0'.join(values).encode('utf-8')
+            chunks.append(self._section.pack(len(values), len(blob)))
+            chunks.append(blob)
+
+        return b''.join(chunks)
+
+    @classmethod
+    def unpack(cls, data):
+        """Parse the binary string. Raise ValueError if it is not valid."""
+
+        try:
+            magic, version, sections_count = cls._header.unpack_from(data, 0)
+            if magic != cls._magic or version != cls._version or sections_count != len(cls._sections):
+                raise ValueError('Unknown file tree index format')
+
+            offset = cls._header.size
+            sections = []
+
+            for _ in cls._sections:
+                count, length = cls._section.unpack_from(data, offset)
+                offset += cls._section.size
+
+                blob = data[offset:offset + length]
+                offset += length
+                values = blob.decode('utf-8').split('\0') if count else []
+
+                if len(values) != count:
+                    raise ValueError('Bad entries count')
+
+                sections.append(values)
+
+        except (struct.error, UnicodeDecodeError) as ex:
+            raise ValueError('Corrupted file tree index: {}'.format(repr(ex)))
+
+        return cls(*sections)
+
+    @classmethod
+    def load(cls, infohash):
+        """Read the index of the torrent from the disk. Return None if it does
+        not exist or can't be read.
+        The modification time of the index is updated so that indexes that are
+        still in use are not removed as stale."""
+
+        file_name = cls.get_file_name(infohash)
+
+        try:
+            with open(file_name, 'rb') as file_handle:
+                index = cls.unpack(file_handle.read())
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                Logger.error('FileTreeIndex: Could not read the index of {}: {}'.format(infohash, repr(ex)))
+
+            return None
+
+        except ValueError as ex:
+            Logger.error('FileTreeIndex: Could not read the index of {}: {}'.format(infohash, repr(ex)))
+            return None
+
+        try:
+            os.utime(file_name, None)
+        except OSError as ex:
+            Logger.error('FileTreeIndex: Could not touch the index of {}: {}'.format(infohash, repr(ex)))
+
+        return index
+
+    def save(self, infohash):
+        """Write the index to the disk and remove the stale indexes."""
+
+        file_name = self.get_file_name(infohash)
+
+        with paths.atomic_write(file_name) as file_handle:
+            file_handle.write(self.pack())
+
+        self._remove_stale_indexes(os.path.dirname(file_name))
+
+    @classmethod
+    def _remove_stale_indexes(cls, directory):
+        limit = time.time() - cls.max_age
+
+        for file_name in os.listdir(directory):
+            if not file_name.endswith(cls.file_extension):
+                continue
+
+            file_path = os.path.join(directory, file_name)
+
+            try:
+                if os.path.getmtime(file_path) < limit:
+                    Logger.info('FileTreeIndex: Removing stale index {}'.format(file_path))
+                    os.unlink(file_path)
+
+            except OSError as ex:
+                Logger.error('FileTreeIndex: Could not remove {}: {}'.format(file_path, repr(ex)))
+
+
+_indexes = OrderedDict()  # infohash: FileTreeIndex, least recently used first
+_indexes_lock = threading.Lock()
+_max_indexes = 32
+
+
+def _get_cached_index(infohash):
+    with _indexes_lock:
+        file_index = _indexes.pop(infohash, None)
+        if file_index is not None:
+            _indexes[infohash] = file_index
+
+        return file_index
+
+
+def _cache_index(infohash, file_index):
+    with _indexes_lock:
+        _indexes.pop(infohash, None)
+        _indexes[infohash] = file_index
+
+        while len(_indexes) > _max_indexes:
+            _indexes.popitem(last=False)
+
+
+def get_file_index(torrent_info):
+    """Return the FileTreeIndex of the torrent, building and saving it if it
+    is not available in memory nor on the disk yet."""
+
+    infohash = str(torrent_info.info_hash())
+
+    file_index = _get_cached_index(infohash)
+    if file_index is not None:
+        return file_index
+
+    file_index = FileTreeIndex.load(infohash)
+
+    if file_index is None:
+        Logger.info('FileTreeIndex: Building the index of {}'.format(torrent_info.name()))
+        files_list = [entry.path.decode('utf-8') for entry in torrent_info.files()]
+        file_index = FileTreeIndex.from_files_list(files_list)
+
+        try:
+            file_index.save(infohash)
+
+        except (IOError, OSError) as ex:
+            Logger.error('FileTreeIndex: Could not save the index of {}: {}'.format(infohash, repr(ex)))
+
+    _cache_index(infohash, file_index)
+    return file_index
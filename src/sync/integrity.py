@@ -27,7 +27,7 @@ import shutil
 from kivy.logger import Logger
 from utils import walker
 from utils.context import ignore_exceptions
-from utils.hashes import sha1
+from utils.hashes import hash_files_parallel
 from utils.unicode_helpers import casefold
 from third_party import teamspeak
 
@@ -103,9 +103,35 @@ def filter_out_whitelisted(elements):
     return elements
 
 
+def prepare_files_sets(files_list, checksums, check_subdir='', case_sensitive=False):
+    """Return the (top_dirs, dirs, file_paths, checksums) used by
+    check_mod_directories: whitelisted entries are filtered out and all the
+    paths are casefolded, unless case_sensitive is True.
+    """
+
+    top_dirs, dirs, file_paths, checksums = parse_files_list(files_list, checksums, check_subdir)
+
+    # Remove whitelisted items from the lists
+    dirs = filter_out_whitelisted(dirs)
+    file_paths = filter_out_whitelisted(file_paths)
+
+    # If not case sensitive, rewrite data so it may be used in a case insensitive
+    # comparisons
+    if not case_sensitive:
+        file_paths = set(casefold(filename) for filename in file_paths)
+        dirs = set(casefold(directory) for directory in dirs)
+        top_dirs = set(casefold(top_dir) for top_dir in top_dirs)
+
+        if checksums:
+            checksums = {casefold(key): value for (key, value) in checksums.iteritems()}
+
+    return top_dirs, dirs, file_paths, checksums
+
+
 def check_mod_directories(files_list, base_directory, check_subdir='',
                           on_superfluous='warn', checksums=None,
-                          case_sensitive=False):
+                          case_sensitive=False, hash_cache=None, message_queue=None,
+                          file_index=None):
     """Check if all files and directories present in the mod directories belong
     to the torrent file. If not, remove those if on_superfluous=='remove' or return False
     if on_superfluous=='warn'.
@@ -128,6 +154,12 @@ def check_mod_directories(files_list, base_directory, check_subdir='',
     This function will skip files or directories that match the 'WHITELIST_NAME' variable.
 
     If the dictionary checksums is not None, the files' checksums will be checked.
+    The files are hashed in parallel once the directories have been walked.
+    If hash_cache is given, the checksums of files that have not changed since
+    the last check are taken from it instead of being computed again.
+    If message_queue is given, the hashing progress is reported to it.
+    If file_index (a FileTreeIndex of files_list) is given, its precomputed
+    sets are used instead of parsing files_list again.
 
     Returns if the directory has been cleaned sucessfully or if all files present
     are supposed to be there. Do not ignore this value!
@@ -136,23 +168,18 @@ def check_mod_directories(files_list, base_directory, check_subdir='',
     if on_superfluous not in ('warn', 'remove', 'ignore'):
         raise Exception('Unknown action: {}'.format(on_superfluous))
 
-    top_dirs, dirs, file_paths, checksums = parse_files_list(files_list, checksums, check_subdir)
+    if file_index is not None and not check_subdir and not checksums and not case_sensitive:
+        # Use the precomputed sets. Copy them as they are modified below
+        top_dirs = set(file_index.top_dirs_nocase)
+        dirs = set(file_index.dirs_nocase)
+        file_paths = set(file_index.files_nocase)
 
-    # Remove whitelisted items from the lists
-    dirs = filter_out_whitelisted(dirs)
-    file_paths = filter_out_whitelisted(file_paths)
+    else:
+        top_dirs, dirs, file_paths, checksums = prepare_files_sets(files_list, checksums, check_subdir,
+                                                                   case_sensitive)
 
-    # If not case sensitive, rewrite data so it may be used in a case insensitive
-    # comparisons
+    # Set conditional casefold function
     if not case_sensitive:
-        file_paths = set(casefold(filename) for filename in file_paths)
-        dirs = set(casefold(directory) for directory in dirs)
-        top_dirs = set(casefold(top_dir) for top_dir in top_dirs)
-
-        if checksums:
-            checksums = {casefold(key): value for (key, value) in checksums.iteritems()}
-
-        # Set conditional casefold function
         ccf = lambda x: casefold(x)
     else:
         ccf = lambda x: x
@@ -160,6 +187,7 @@ def check_mod_directories(files_list, base_directory, check_subdir='',
     base_directory = os.path.realpath(base_directory)
     Logger.debug('check_mod_directories: Verifying base_directory: {}'.format(base_directory))
     success = True
+    files_to_hash = {}  # full_path: relative_path
 
     try:
         for directory_nocase in top_dirs:
@@ -195,10 +223,8 @@ def check_mod_directories(files_list, base_directory, check_subdir='',
                         file_paths.remove(relative_file_name_nocase)
                         Logger.debug('check_mod_directories: {} present in torrent metadata'.format(relative_file_name_nocase))
 
-                        if checksums and sha1(full_file_path) != checksums[relative_file_name_nocase]:
-                            Logger.debug('check_mod_directories: File {} exists but its hash differs from expected.'.format(relative_file_name_nocase))
-                            Logger.debug('check_mod_directories: Expected: {}, computed: {}'.format(checksums[relative_file_name_nocase].encode('hex'), sha1(full_file_path).encode('hex')))
-                            return False
+                        if checksums:
+                            files_to_hash[full_file_path] = relative_file_name_nocase
 
                         continue  # File present in the torrent, nothing to see here
 
@@ -260,17 +286,30 @@ def check_mod_directories(files_list, base_directory, check_subdir='',
                 success = False
                 break
 
-            if checksums and sha1(full_path) != checksums[file_entry_nocase]:
-                Logger.debug('check_mod_directories: File {} exists but its hash differs from expected.'.format(file_entry_nocase))
-                Logger.debug('check_mod_directories: Expected: {}, computed: {}'.format(checksums[file_entry_nocase].encode('hex'), sha1(full_path).encode('hex')))
-                success = False
-                break
+            if checksums:
+                files_to_hash[full_path] = file_entry_nocase
 
         if dirs:
             Logger.debug('check_mod_directories: Dirs missing on disk, setting retval to False')
             Logger.debug('check_mod_directories: ' + ', '.join(dirs))
             success = False
 
+        # Verify the checksums of all the files at once, in parallel
+        if success and files_to_hash:
+            hash_function = hash_cache.sha1 if hash_cache else None
+            results = hash_files_parallel(files_to_hash.keys(), hash_function=hash_function,
+                                          message_queue=message_queue)
+
+            for full_path, computed in results:
+                file_entry_nocase = files_to_hash[full_path]
+
+                if computed != checksums[file_entry_nocase]:
+                    Logger.debug('check_mod_directories: File {} exists but its hash differs from expected.'.format(file_entry_nocase))
+                    Logger.debug('check_mod_directories: Expected: {}, computed: {}'.format(checksums[file_entry_nocase].encode('hex'), computed.encode('hex')))
+                    success = False
+                    results.close()
+                    break
+
     except OSError:
         success = False
 
@@ -316,19 +355,27 @@ def parse_files_list(files_list, checksums, only_subdir=''):
     return top_dirs, dirs, file_paths, checksums
 
 
-def check_files_mtime_correct(base_directory, files_data):  # file_path, size, mtime
+def check_files_mtime_correct(base_directory, files_data, files_stats=None):  # file_path, size, mtime
     """Checks if all files have the right size and modification time.
     If the size or modification time differs, the file is considered modified
     and thus the check fails.
 
+    files_stats is an optional {relative_path: stat} dictionary, as returned by
+    walker.stat_files(), used instead of querying each file.
+
     Attention: The modification time check accuracy depends on a number of
     things such as the underlying File System type. Files are also allowed to be
     up to 5 minutes more recent than stated as per libtorrent implementation."""
 
+    if files_stats is None:
+        files_stats = {}
+
     for file_path, size, mtime in files_data:
         try:
             full_file_path = os.path.join(base_directory, file_path)
-            file_stat = os.lstat(full_file_path)
+            file_stat = files_stats.get(os.path.normpath(file_path))
+            if file_stat is None:
+                file_stat = os.lstat(full_file_path)
         except OSError:
             Logger.error('check_files_mtime_correct: Could not perform stat on {}'.format(full_file_path))
             return False
@@ -348,16 +395,23 @@ def check_files_mtime_correct(base_directory, files_data):  # file_path, size, m
     return True
 
 
-def is_ts3_plugin_installed(ts3_plugin_full_path):
-    """Check if the given .ts3_plugin file is installed."""
+def is_ts3_plugin_installed(ts3_plugin_full_path, hash_cache=None, message_queue=None):
+    """Check if the given .ts3_plugin file is installed.
+    hash_cache is an optional HashCache used to speed up checksum verification.
+    The hashing progress is reported to message_queue, if given.
+    """
 
     teamspeak_paths = teamspeak.get_plugins_locations()
+    checksums = None
 
     for teamspeak_path in teamspeak_paths:
         Logger.debug('is_ts3_plugin_installed: Checking if TS3 plugin is installed in {}'.format(teamspeak_path))
-        checksums = teamspeak.compute_checksums_for_ts3_plugin(ts3_plugin_full_path)
+        if checksums is None:
+            checksums = teamspeak.compute_checksums_for_ts3_plugin(ts3_plugin_full_path, message_queue=message_queue)
+
         retval = check_mod_directories(checksums.keys(), base_directory=teamspeak_path,
-                                       on_superfluous='ignore', checksums=checksums)
+                                       on_superfluous='ignore', checksums=checksums,
+                                       hash_cache=hash_cache, message_queue=message_queue)
 
         if retval:
             Logger.info('is_ts3_plugin_installed: TS3 plugin found in {}'.format(teamspeak_path))
@@ -367,7 +421,7 @@ def is_ts3_plugin_installed(ts3_plugin_full_path):
     return False
 
 
-def are_ts_plugins_installed(mod_parent_location, file_paths):
+def are_ts_plugins_installed(mod_parent_location, file_paths, hash_cache=None, message_queue=None):
     """Check if all ts3_plugin files contained inside the mod files are
     installed.
     """
@@ -379,7 +433,7 @@ def are_ts_plugins_installed(mod_parent_location, file_paths):
             continue
 
         file_location = os.path.join(mod_parent_location, file_path)
-        retval = is_ts3_plugin_installed(file_location)
+        retval = is_ts3_plugin_installed(file_location, hash_cache=hash_cache, message_queue=message_queue)
 
         if not retval:
             return retval
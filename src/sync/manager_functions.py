@@ -13,22 +13,26 @@
 
 from __future__ import unicode_literals
 
+import hashlib
 import launcher_config
 import os
 import textwrap
 import time
 
+from collections import OrderedDict
 from datetime import datetime
 from distutils.version import LooseVersion
 from kivy.logger import Logger
 from kivy.config import Config
+from multiprocessing.pool import ThreadPool
 from sync import integrity, torrent_utils
 from sync.mod import Mod
 from sync.server import Server
 from sync.torrentsyncer import TorrentSyncer
 from third_party import teamspeak
+from utils import filecache
 from utils.devmode import devmode
-from utils.requests_wrapper import download_url, DownloadException
+from utils.requests_wrapper import download_url, get_session, DownloadException
 
 default_log_level = devmode.get_log_level('info')
 Config.set('kivy', 'log_level', default_log_level)
@@ -79,6 +83,18 @@ def symlink_mod(message_queue, mod_location, real_location):
         message_queue.reject({'msg': ex.message})
 
 
+def get_metadata_url():
+    domain = devmode.get_launcher_domain(default=launcher_config.domain)
+    metadata_path = devmode.get_metadata_path(default=launcher_config.metadata_path)
+
+    return domain, 'http://{}{}'.format(domain, metadata_path)
+
+
+def get_metadata_digest(content):
+    """Return the digest of the raw metadata.json contents."""
+    return hashlib.sha1(content).hexdigest()
+
+
 def _get_mod_descriptions(para, login, password):
     """
     helper function to get the moddescriptions from the server
@@ -88,9 +104,7 @@ def _get_mod_descriptions(para, login, password):
     """
     para.progress({'msg': 'Downloading mod descriptions'})
 
-    domain = devmode.get_launcher_domain(default=launcher_config.domain)
-    metadata_path = devmode.get_metadata_path(default=launcher_config.metadata_path)
-    url = 'http://{}{}'.format(domain, metadata_path)
+    domain, url = get_metadata_url()
 
     try:
         if login and password:
@@ -145,11 +159,59 @@ def _get_mod_descriptions(para, login, password):
             return ''
 
     para.resolve({'msg': 'Downloading mods descriptions finished',
-                  'data': data})
+                  'data': data,
+                  'digest': get_metadata_digest(res.content),
+                  'validators': filecache.get_validators(res.headers)})
 
     return data
 
 
+def _check_mod_descriptions(para, login, password, digest, validators):
+    """Check if metadata.json has changed since the version with the given
+    digest and validators (ETag, Last-Modified) has been downloaded.
+
+    A conditional request is made so that the server can answer with a 304
+    without any content. If the contents are sent anyway, they are only parsed
+    if their digest differs.
+
+    Meant to be run in a thread, see _get_mod_descriptions() for the full
+    download with all the checks.
+    """
+
+    domain, url = get_metadata_url()
+    auth = (login, password) if login and password else None
+
+    try:
+        res = download_url(domain, url, timeout=5, auth=auth, session=get_session(),
+                           headers=filecache.get_request_headers(validators or {}))
+    except DownloadException as ex:
+        para.reject({'msg': 'Checking metadata: {}'.format(ex.args[0])})
+        return
+
+    if res.status_code == 304:
+        para.resolve({'msg': 'Metadata not modified', 'changed': False})
+        return
+
+    if res.status_code != 200:
+        para.reject({'msg': 'Checking metadata: HTTP error code: {}'.format(res.status_code)})
+        return
+
+    new_digest = get_metadata_digest(res.content)
+    result = {'msg': 'Metadata checked',
+              'changed': new_digest != digest,
+              'digest': new_digest,
+              'validators': filecache.get_validators(res.headers)}
+
+    if result['changed']:
+        try:
+            result['data'] = res.json()
+        except ValueError:
+            para.reject({'msg': 'Checking metadata: Failed to parse metadata received from the master server'})
+            return
+
+    para.resolve(result)
+
+
 def convert_metadata_to_mod(md, torrent_url_prefix):
     # TODO: This should be a constructor of the Mod class
     # parse timestamp
@@ -234,8 +296,73 @@ def parse_servers_data(para, data, launcher_moddir):
     return servers
 
 
+def get_mod_key(mod):
+    """Return the key identifying the exact version of a mod on the disk.
+    Two mods with the same key have the same completeness state.
+    """
+    return (mod.parent_location, mod.foldername, mod.torrent_url)
+
+
+def check_mods_completeness(messagequeue, mods, workers=8, known_states=None):
+    """Run mod.is_complete() for all the mods on a pool of threads.
+    Mods that are present more than once (for example, in a server and in the
+    mods list) are only checked once.
+    Mods whose key is present in known_states ({mod key: complete}) are not
+    checked again, the known state is used instead.
+    The result of each mod is reported with messagequeue.progress as soon as
+    it is known.
+    """
+
+    known_states = known_states or {}
+
+    # Group identical mods together
+    unique_mods = OrderedDict()
+    for mod in mods:
+        unique_mods.setdefault(get_mod_key(mod), []).append(mod)
+
+    if not unique_mods:
+        return
+
+    def report_result(counter, mods_group, complete):
+        for mod in mods_group:
+            mod.up_to_date = complete
+
+        messagequeue.progress({'msg': 'Checking mods: {}/{} mods verified'.format(counter, len(unique_mods)),
+                               'mod_name': mods_group[0].foldername,
+                               'complete': complete},
+                              float(counter) / len(unique_mods))
+
+    # The mods whose state is already known are not submitted to the pool
+    mods_to_check = []
+    counter = 0
+    for key, mods_group in unique_mods.iteritems():
+        if key in known_states:
+            counter += 1
+            report_result(counter, mods_group, known_states[key])
+        else:
+            mods_to_check.append(mods_group)
+
+    if not mods_to_check:
+        return
+
+    def check_mod(mods_group):
+        return mods_group, mods_group[0].is_complete(messagequeue)
+
+    pool = ThreadPool(processes=max(1, min(workers, len(mods_to_check))))
+
+    try:
+        results = pool.imap_unordered(check_mod, mods_to_check)
+
+        for counter, (mods_group, complete) in enumerate(results, counter + 1):
+            report_result(counter, mods_group, complete)
+
+    finally:
+        pool.terminate()
+
+
 def _prepare_and_check(messagequeue, launcher_moddir, launcher_basedir,
-                       mod_descriptions_data, selected_optional_mods):
+                       mod_descriptions_data, selected_optional_mods,
+                       known_states=None):
     launcher = parse_launcher_data(messagequeue, mod_descriptions_data, launcher_basedir)
     mods_list = parse_mods_data(messagequeue, mod_descriptions_data, launcher_moddir)
     servers_list = parse_servers_data(messagequeue, mod_descriptions_data, launcher_moddir)
@@ -264,16 +391,16 @@ def _prepare_and_check(messagequeue, launcher_moddir, launcher_basedir,
 
     messagequeue.progress({'msg': 'Checking mods'})
 
+    mods_to_check = []
     if launcher:
         # TODO: Perform a better check here. Should compare md5sum with actual launcher, etc...
-        launcher.is_complete()
+        mods_to_check.append(launcher)
 
     for server in servers_list:
-        for mod in server.mods:
-            mod.is_complete()
+        mods_to_check.extend(server.mods)
 
-    for mod in mods_list:
-        mod.is_complete()
+    mods_to_check.extend(mods_list)
+    check_mods_completeness(messagequeue, mods_to_check, known_states=known_states)
 
     messagequeue.resolve({'msg': 'Checking mods finished',
                           'mods': mods_list,
@@ -383,7 +510,7 @@ def _try_installing_teamspeak_plugins(message_queue, mod):
             message_queue.reject({'msg': error_message})
             return False
 
-        if not integrity.is_ts3_plugin_installed(ts3_plugin_full_path):
+        if not integrity.is_ts3_plugin_installed(ts3_plugin_full_path, message_queue=message_queue):
             ts3_plugin_files_to_process.append(ts3_plugin_file)
 
     if not ts3_plugin_files_to_process:
@@ -461,7 +588,8 @@ def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed):
             return
 
     # Perform post-download hooks for updated mods
-    for m in mods:
+    # The mods may have been updated during the sync
+    for m in syncer.mods:
         # If the mod had to be updated and the download was performed successfully
         if not m.is_complete() and m.finished_hook_ran:
             # Will only fire up if mod == TFR
@@ -47,14 +47,15 @@ class Mod(object):
     def get_full_path(self):
         return os.path.join(self.parent_location, self.foldername)
 
-    def is_complete(self):
+    def is_complete(self, message_queue=None):
         """Return information on whether the mods is fully synchronized and
         ready to use.
         The data is cached so it is fine to call this method repeatedly.
+        The progress of the check is reported to message_queue, if given.
         """
 
         if self.up_to_date is None:
-            self.up_to_date = is_complete_quick(self)
+            self.up_to_date = is_complete_quick(self, message_queue)
 
         return self.up_to_date
 
@@ -17,9 +17,11 @@ import third_party
 import third_party.steam_query
 
 from manager_functions import (
+    _check_mod_descriptions,
     _get_mod_descriptions,
     _prepare_and_check,
     _sync_all,
+    get_mod_key,
 )
 
 from preparer import prepare_all
@@ -171,27 +173,60 @@ class ModManager(object):
                                   self.settings.get('auth_password'),
                               ),
                               'download_description',
-                              then=then
+                              then=then,
+                              use_host=True
                               )
         return para
 
     def on_download_mod_description_resolve(self, data):
+        self.save_mod_description(data)
+
+    def save_mod_description(self, data):
+        """Cache the downloaded metadata along with what is needed to check
+        cheaply if it has changed.
+        """
+
         self.settings.set('mod_data_cache', data['data'])
+        self.settings.set('mod_data_digest', data.get('digest'))
+        self.settings.set('mod_data_validators', data.get('validators') or {})
+
+    def check_mod_description(self):
+        """Check if the metadata on the master server differs from the cached
+        metadata. The metadata is only downloaded if it has changed.
+        """
+
+        para = protected_para(_check_mod_descriptions,
+                              (
+                                  self.settings.get('auth_login'),
+                                  self.settings.get('auth_password'),
+                                  self.settings.get('mod_data_digest'),
+                                  self.settings.get('mod_data_validators'),
+                              ),
+                              'check_description',
+                              use_threads=True
+                              )
+        return para
 
     def on_download_mod_description_reject(self, data):
         self.reset()
 
-    def prepare_and_check(self, data):
+    def prepare_and_check(self, data, known_states=None):
+        """Parse the metadata and check which mods need to be synchronized.
+        known_states: {mod key: complete} of the mods that don't need to be
+        checked again.
+        """
         para = protected_para(
             _prepare_and_check,
             (
                 self.settings.get('launcher_moddir'),
                 self.settings.get('launcher_basedir'),
                 data,
-                self.settings.get('selected_optional_mods')
+                self.settings.get('selected_optional_mods'),
+                known_states
             ),
             'checkmods',
-            then=(self.on_prepare_and_check_resolve, None, None)
+            then=(self.on_prepare_and_check_resolve, None, None),
+            use_host=True
         )
 
         return para
@@ -215,11 +250,27 @@ class ModManager(object):
         if self.battleye is not None:
             Logger.info('ModManager: Got base battleye:\n{}'.format(repr(self.battleye)))
 
-    def sync_all(self, seed):
+    def get_mod_states(self):
+        """Return {mod key: complete} for the mods whose state is known, so
+        that they don't need to be checked again.
+        """
+
+        mods = self.get_mods(include_all_servers=True)
+        if self.launcher:
+            mods.append(self.launcher)
+
+        return {get_mod_key(mod): mod.up_to_date for mod in mods if mod.up_to_date is not None}
+
+    def get_synced_elements(self):
         synced_elements = self.get_mods(only_selected=True)  # Work on the copy
         if self.launcher:
             synced_elements.append(self.launcher)
 
+        return synced_elements
+
+    def sync_all(self, seed):
+        synced_elements = self.get_synced_elements()
+
         # If we are only seeding, ensure we pass only ready-to-seed mods
         # Note: the libtorrent seed-only flags prevent downloading data, but
         # still truncate the file anyway - something we want to prevent here
@@ -251,6 +302,13 @@ class ModManager(object):
                 if mod.foldername == mod_synchronised:
                     mod.force_completion()
 
+    def update_sync(self, para):
+        """Make the running sync para synchronize the current mods. Only the
+        torrents of the mods that changed are restarted.
+        """
+
+        para.send_message('update_mods', {'mods': self.get_synced_elements()})
+
     def sync_launcher(self, seed=False):
         para = protected_para(
             _sync_all,
@@ -275,7 +333,8 @@ class ModManager(object):
             # directory normalizing process is done and before starting the
             # "search on disk for the mod" part.
             (self.get_mods(), self.get_mods(include_all_servers=True), self.settings.get('launcher_moddir')),
-            'prepare_all')
+            'prepare_all',
+            use_host=True)
         return para
 
     def make_torrent(self, mods):
@@ -296,7 +355,8 @@ class ModManager(object):
             (
                 servers
             ),
-            'query_servers'
+            'query_servers',
+            use_host=True
         )
         return para
 
@@ -0,0 +1,258 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import threading
+import time
+
+from collections import namedtuple
+from kivy.logger import Logger
+from utils.hashes import hash_files_parallel, LARGE_BLOCK_SIZE, PROGRESS_INTERVAL
+
+
+# The data of the previously published torrent of a mod.
+# files: {relative_path: (offset, size, sha1)} of the files that have not
+#        changed on disk since then. sha1 is None for pad files.
+PreviousTorrent = namedtuple('PreviousTorrent', ['piece_length', 'total_size', 'piece_hashes', 'files'])
+
+
+class _ProgressReporter(object):
+    """Report the number of pieces hashed. Called from the hashing threads."""
+
+    def __init__(self, message_queue, total):
+        super(_ProgressReporter, self).__init__()
+
+        self.message_queue = message_queue
+        self.total = total
+        self.done = 0
+        self.last_progress = 0
+        self.lock = threading.Lock()
+
+    def piece_done(self):
+        if not self.message_queue:
+            return
+
+        with self.lock:
+            self.done += 1
+
+            if time.time() - self.last_progress > PROGRESS_INTERVAL or self.done == self.total:
+                self.last_progress = time.time()
+                self.message_queue.progress({'msg': 'Hashing pieces: {}/{}'.format(self.done, self.total)},
+                                            float(self.done) / self.total)
+
+
+class PieceHasher(object):
+    """Compute the piece hashes and the file hashes of a torrent being created,
+    on a pool of threads.
+
+    Each file is a separate work unit: its SHA1 is computed along with the
+    pieces starting inside it, so every byte is read only once (except for the
+    tail of the last piece of a file, which spans the next files).
+
+    If the previous torrent of the mod is given, the pieces that only overlap
+    files unchanged since then (same path, offset and size, and same size and
+    mtime on disk) are copied from it instead of being hashed again.
+
+    Usage:
+        t = libtorrent.create_torrent(fs, piece_size=0, flags=flags)
+        PieceHasher(t, base_directory, previous, message_queue).run()
+    """
+
+    def __init__(self, torrent, base_directory, previous=None, message_queue=None, workers=None):
+        super(PieceHasher, self).__init__()
+
+        self.torrent = torrent
+        self.base_directory = base_directory
+        self.previous = previous
+        self.message_queue = message_queue
+        self.workers = workers
+
+        self.files = [(entry.path.decode('utf-8'), entry.offset, entry.size, entry.pad_file)
+                      for entry in torrent.files()]
+        self.piece_length = torrent.piece_length()
+        self.num_pieces = torrent.num_pieces()
+        self.total_size = sum(size for _, _, size, _ in self.files)
+
+        self.piece_hashes = {}  # piece: sha1
+        self.file_hashes = {}  # file index: sha1
+        self.progress = None
+
+    def _get_piece_size(self, piece, piece_length, total_size):
+        return min(piece_length, total_size - piece * piece_length)
+
+    def _get_file_pieces(self, index):
+        """Return the range of the pieces overlapping the file."""
+
+        _, offset, size, _ = self.files[index]
+        return xrange(offset // self.piece_length, (offset + size - 1) // self.piece_length + 1)
+
+    def _get_starting_pieces(self, index):
+        """Return the range of the pieces whose first byte is in the file."""
+
+        _, offset, size, _ = self.files[index]
+        first_piece = (offset + self.piece_length - 1) // self.piece_length
+        return xrange(first_piece, (offset + size - 1) // self.piece_length + 1)
+
+    def _reuse_previous(self):
+        """Copy the hashes of the unchanged files and pieces from the previous
+        torrent. Return the set of the pieces reused.
+        """
+
+        previous = self.previous
+        if not previous or previous.piece_length != self.piece_length:
+            return set()
+
+        changed_pieces = set()
+
+        for index, (path, offset, size, pad_file) in enumerate(self.files):
+            if size == 0:
+                continue
+
+            previous_entry = previous.files.get(path)
+            if previous_entry and previous_entry[:2] == (offset, size) and (pad_file or previous_entry[2]):
+                if not pad_file:
+                    self.file_hashes[index] = previous_entry[2]
+
+            else:
+                changed_pieces.update(self._get_file_pieces(index))
+
+        reused = set()
+        for piece in xrange(min(self.num_pieces, len(previous.piece_hashes))):
+            if piece in changed_pieces:
+                continue
+
+            # The last piece may have been longer
+            if self._get_piece_size(piece, previous.piece_length, previous.total_size) != \
+               self._get_piece_size(piece, self.piece_length, self.total_size):
+                continue
+
+            self.piece_hashes[piece] = previous.piece_hashes[piece]
+            reused.add(piece)
+
+        return reused
+
+    def _feed(self, index, start, stop, hash_algos):
+        """Update the hash objects with the bytes [start, stop) of the torrent
+        that are stored in the file.
+        """
+
+        path, offset, _, pad_file = self.files[index]
+
+        if pad_file:
+            for hash_algo in hash_algos:
+                hash_algo.update(b'\0' * (stop - start))
+            return
+
+        with open(os.path.join(self.base_directory, path), 'rb') as file_handle:
+            file_handle.seek(start - offset)
+            remaining = stop - start
+
+            while remaining:
+                data = file_handle.read(min(remaining, LARGE_BLOCK_SIZE))
+                if not data:
+                    raise IOError('File {} changed while being hashed'.format(path))
+
+                for hash_algo in hash_algos:
+                    hash_algo.update(data)
+
+                remaining -= len(data)
+
+    def _hash_file(self, index):
+        """Hash the file and the pieces starting in it, if they are not known."""
+
+        _, offset, size, _ = self.files[index]
+        file_end = offset + size
+        file_hash = None if index in self.file_hashes else hashlib.sha1()
+        piece_hashes = {}
+
+        position = offset
+        for piece in self._get_starting_pieces(index):
+            piece_start = piece * self.piece_length
+            piece_end = piece_start + self._get_piece_size(piece, self.piece_length, self.total_size)
+            piece_hash = None if piece in self.piece_hashes else hashlib.sha1()
+
+            if file_hash and piece_start > position:
+                # The end of a piece started in a previous file
+                self._feed(index, position, piece_start, [file_hash])
+
+            hash_algos = [hash_algo for hash_algo in (file_hash, piece_hash) if hash_algo]
+            if hash_algos:
+                self._feed(index, piece_start, min(piece_end, file_end), hash_algos)
+
+            position = min(piece_end, file_end)
+
+            if piece_hash:
+                # The piece may span the next files
+                next_index = index + 1
+                while position < piece_end:
+                    _, next_offset, next_size, _ = self.files[next_index]
+                    if next_size:
+                        self._feed(next_index, next_offset, min(piece_end, next_offset + next_size), [piece_hash])
+                        position = min(piece_end, next_offset + next_size)
+
+                    next_index += 1
+
+                piece_hashes[piece] = piece_hash.digest()
+                self.progress.piece_done()
+
+        if file_hash and position < file_end:
+            self._feed(index, position, file_end, [file_hash])
+
+        return (file_hash.digest() if file_hash else None), piece_hashes
+
+    def _needs_hashing(self, index):
+        _, _, size, pad_file = self.files[index]
+        if size == 0:
+            return False
+
+        if not pad_file and index not in self.file_hashes:
+            return True
+
+        return any(piece not in self.piece_hashes for piece in self._get_starting_pieces(index))
+
+    def run(self):
+        """Compute the missing hashes and set them in the torrent.
+        Return the tuple: (pieces_hashed, pieces_reused)
+        """
+
+        reused = self._reuse_previous()
+        to_hash = self.num_pieces - len(reused)
+        self.progress = _ProgressReporter(self.message_queue, to_hash)
+
+        Logger.info('PieceHasher: Hashing {} out of {} pieces'.format(to_hash, self.num_pieces))
+
+        # Pad files have no checksum so they are only used for their pieces
+        units = [index for index in xrange(len(self.files)) if self._needs_hashing(index)]
+        results = hash_files_parallel(units, hash_function=self._hash_file, workers=self.workers)
+
+        file_hashes = {}
+        piece_hashes = {}
+
+        for index, (file_hash, file_piece_hashes) in results:
+            if file_hash:
+                file_hashes[index] = file_hash
+
+            piece_hashes.update(file_piece_hashes)
+
+        self.file_hashes.update(file_hashes)
+        self.piece_hashes.update(piece_hashes)
+
+        for piece in xrange(self.num_pieces):
+            self.torrent.set_hash(piece, self.piece_hashes[piece])
+
+        for index, file_hash in self.file_hashes.iteritems():
+            self.torrent.set_file_hash(index, file_hash)
+
+        return to_hash, len(reused)
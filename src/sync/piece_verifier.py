@@ -0,0 +1,231 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+# Allow relative imports when the script is run from the command line
+if __name__ == "__main__":
+    import site
+    import os
+    file_directory = os.path.dirname(os.path.realpath(__file__))
+    site.addsitedir(os.path.abspath(os.path.join(file_directory, '..')))
+
+import hashlib
+import os
+
+import libtorrent
+from kivy.logger import Logger
+
+from utils.hashes import hash_files_parallel
+
+
+def file_changed(full_path, size, mtime):
+    """Check if the file has a different size or modification time than
+    stated. Same rules as in integrity.check_files_mtime_correct() apply.
+    """
+
+    try:
+        file_stat = os.stat(full_path)
+    except OSError:
+        return True
+
+    if file_stat.st_size != size:
+        return True
+
+    if int(file_stat.st_mtime) > mtime + 5 * 60 or int(file_stat.st_mtime) < mtime - 1:
+        return True
+
+    return False
+
+
+def get_changed_files(torrent_info, base_directory, file_sizes):
+    """Return the indexes of files that do not match the (size, mtime) pairs
+    stored in the resume data.
+    If file_sizes is empty, all the files are treated as changed.
+    """
+
+    changed = []
+
+    for index, entry in enumerate(torrent_info.files()):
+        if entry.pad_file:
+            continue
+
+        if index >= len(file_sizes):
+            changed.append(index)
+            continue
+
+        full_path = os.path.join(base_directory, entry.path.decode('utf-8'))
+        size, mtime = file_sizes[index][0], file_sizes[index][1]
+
+        if file_changed(full_path, size, mtime):
+            changed.append(index)
+
+    return changed
+
+
+def get_pieces_for_files(torrent_info, file_indexes):
+    """Return the sorted list of pieces that overlap the given files."""
+
+    piece_length = torrent_info.piece_length()
+    files = list(torrent_info.files())
+    pieces = set()
+
+    for index in file_indexes:
+        entry = files[index]
+        if entry.size == 0:
+            continue
+
+        first_piece = entry.offset // piece_length
+        last_piece = (entry.offset + entry.size - 1) // piece_length
+        pieces.update(xrange(first_piece, last_piece + 1))
+
+    return sorted(pieces)
+
+
+def get_files_for_pieces(torrent_info, pieces):
+    """Return the sorted list of file indexes that overlap the given pieces."""
+
+    files = set()
+
+    for piece in pieces:
+        for file_slice in torrent_info.map_block(piece, 0, torrent_info.piece_size(piece)):
+            files.add(file_slice.file_index)
+
+    return sorted(files)
+
+
+def compute_piece_hash(torrent_info, base_directory, piece):
+    """Return the SHA1 digest of the piece as it is stored on disk or None if
+    the piece cannot be read completely.
+    """
+
+    files = torrent_info.files()
+    hash_algo = hashlib.sha1()
+
+    for file_slice in torrent_info.map_block(piece, 0, torrent_info.piece_size(piece)):
+        entry = files.at(file_slice.file_index)
+
+        if entry.pad_file:
+            hash_algo.update(b'\0' * file_slice.size)
+            continue
+
+        full_path = os.path.join(base_directory, entry.path.decode('utf-8'))
+
+        try:
+            with open(full_path, 'rb') as f:
+                f.seek(file_slice.offset)
+                data = f.read(file_slice.size)
+
+        except IOError:
+            return None
+
+        if len(data) != file_slice.size:
+            return None
+
+        hash_algo.update(data)
+
+    return hash_algo.digest()
+
+
+def verify_pieces(torrent_info, base_directory, file_sizes, message_queue=None):
+    """Verify only the pieces overlapping files that have changed on disk
+    since the resume data has been saved.
+
+    torrent_info: libtorrent torrent_info of the mod
+    base_directory: the directory containing the mod directory
+    file_sizes: the 'file sizes' entry of the resume data: [(size, mtime), ...]
+
+    Return a tuple: (bad_pieces, bad_files, checked_pieces)
+    bad_files contains the relative paths of the files that overlap bad pieces.
+    """
+
+    changed_files = get_changed_files(torrent_info, base_directory, file_sizes)
+    pieces_to_check = get_pieces_for_files(torrent_info, changed_files)
+
+    Logger.info('verify_pieces: {} files changed. Checking {} out of {} pieces'.format(
+        len(changed_files), len(pieces_to_check), torrent_info.num_pieces()))
+
+    bad_pieces = []
+    hash_function = lambda piece: compute_piece_hash(torrent_info, base_directory, piece)
+    results = hash_files_parallel(pieces_to_check, hash_function=hash_function,
+                                  message_queue=message_queue)
+
+    for piece, digest in results:
+        if digest != torrent_info.hash_for_piece(piece):
+            bad_pieces.append(piece)
+
+    bad_pieces.sort()
+    files = torrent_info.files()
+    bad_files = [files.at(index).path.decode('utf-8')
+                 for index in get_files_for_pieces(torrent_info, bad_pieces)]
+
+    if bad_pieces:
+        Logger.info('verify_pieces: {} bad pieces in files: {}'.format(len(bad_pieces), ', '.join(bad_files)))
+
+    return bad_pieces, bad_files, pieces_to_check
+
+
+def patch_resume_data(resume_data_bencoded, torrent_info, base_directory, message_queue=None):
+    """Verify the files that changed on disk and update the resume data so that
+    libtorrent only downloads the pieces that are really bad instead of
+    rechecking the whole torrent.
+
+    Return the new bencoded resume data or the original one if it could not be
+    patched.
+    """
+
+    try:
+        resume_data = libtorrent.bdecode(resume_data_bencoded)
+        file_sizes = resume_data['file sizes']
+        pieces = bytearray(resume_data['pieces'])
+
+    except Exception as ex:
+        Logger.info('patch_resume_data: Resume data cannot be patched: {}'.format(repr(ex)))
+        return resume_data_bencoded
+
+    if len(pieces) != torrent_info.num_pieces():
+        Logger.info('patch_resume_data: Pieces count mismatch. Not patching resume data.')
+        return resume_data_bencoded
+
+    bad_pieces, _, checked_pieces = verify_pieces(torrent_info, base_directory, file_sizes, message_queue)
+    if not checked_pieces:
+        return resume_data_bencoded
+
+    for piece in checked_pieces:
+        pieces[piece] |= 1
+
+    for piece in bad_pieces:
+        pieces[piece] &= ~1
+
+    # Store the current state of the files so libtorrent accepts the data
+    new_file_sizes = []
+    for entry in torrent_info.files():
+        full_path = os.path.join(base_directory, entry.path.decode('utf-8'))
+
+        try:
+            file_stat = os.stat(full_path)
+            new_file_sizes.append([file_stat.st_size, int(file_stat.st_mtime)])
+
+        except OSError:
+            new_file_sizes.append([0, 0])
+
+    resume_data['file sizes'] = new_file_sizes
+    resume_data['pieces'] = bytes(pieces)
+
+    if bad_pieces:
+        resume_data['seed'] = 0
+        bad_pieces_set = set(bad_pieces)
+        resume_data['unfinished'] = [entry for entry in resume_data.get('unfinished', [])
+                                     if entry.get('piece') not in bad_pieces_set]
+
+    return libtorrent.bencode(resume_data)
+
@@ -0,0 +1,288 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Compact progress records sent by the TorrentSyncer to the GUI.
+
+A record is a binary string:
+    header: magic, version, kind, stream id, sequence, base sequence, count
+    session: phase, payload download rate, payload upload rate,
+             total payload upload, ETA in seconds (-1 if unknown)
+    full record: the torrent names followed by all the torrent rows
+    delta record: the indexes and the rows of the torrents that changed
+                  since the base full record
+
+Deltas are computed against the last full record and not against the
+previous record so that the GUI can skip records without losing track.
+A full record is sent every KEYFRAME_INTERVAL records or when the GUI asks
+for one because it has skipped the full record that the deltas are based on.
+"""
+
+from __future__ import unicode_literals
+
+import array
+import random
+import struct
+import sys
+
+from utils.eta import format_eta
+
+MAGIC = b'BALP'
+VERSION = 1
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+PHASE_METADATA = 0
+PHASE_CHECKING = 1
+PHASE_SYNCING = 2
+
+KEYFRAME_INTERVAL = 30
+
+# The fields of each torrent row, in order.
+# They are stored as doubles which hold integers exactly up to 2^53
+FIELDS = ('total_wanted', 'total_wanted_done', 'download_rate', 'upload_rate', 'num_peers', 'state')
+
+_header = struct.Struct(b'<4sBBIIIH')  # magic, version, kind, stream, sequence, base sequence, count
+_session = struct.Struct(b'<Bqqqq')  # phase, download rate, upload rate, total upload, ETA
+_names_length = struct.Struct(b'<I')
+_encoding = 'utf-8'
+
+
+def _to_bytes(rows):
+    """Serialize the array of rows in little-endian order."""
+
+    if sys.byteorder == 'big':
+        rows = array.array(rows.typecode, rows)
+        rows.byteswap()
+
+    return rows.tostring()
+
+
+def _from_bytes(data):
+    rows = array.array(b'd')
+    rows.fromstring(data)
+
+    if sys.byteorder == 'big':
+        rows.byteswap()
+
+    return rows
+
+
+class ProgressEncoder(object):
+    """Build the progress records of a sync session."""
+
+    def __init__(self):
+        super(ProgressEncoder, self).__init__()
+
+        self.stream = random.randint(0, 0xFFFFFFFF)
+        self.sequence = 0
+        self.base_sequence = None
+        self.base_names = None
+        self.base_rows = None
+
+    def request_keyframe(self):
+        """Make the next record a full record."""
+
+        self.base_rows = None
+
+    def encode(self, state):
+        """Return the record for the ProgressState."""
+
+        names = state.names
+        rows = array.array(b'd', state.rows)
+
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        eta = -1 if state.eta_secs is None else int(state.eta_secs)
+        session = _session.pack(state.phase, state.download_rate, state.upload_rate, state.total_upload, eta)
+
+        if self.base_rows is None or names != self.base_names or \
+           (self.sequence - self.base_sequence) & 0xFFFFFFFF >= KEYFRAME_INTERVAL:
+
+            self.base_sequence = self.sequence
+            self.base_names = names
+            self.base_rows = rows
+
+            names_data = '\0'.join(names).encode(_encoding)
+            return b''.join((_header.pack(MAGIC, VERSION, KIND_FULL, self.stream, self.sequence,
+                                          self.sequence, len(names)),
+                             session,
+                             _names_length.pack(len(names_data)),
+                             names_data,
+                             _to_bytes(rows)))
+
+        width = len(FIELDS)
+        changed = [index for index in xrange(len(names))
+                   if rows[index * width:(index + 1) * width] != self.base_rows[index * width:(index + 1) * width]]
+
+        changed_rows = array.array(b'd')
+        for index in changed:
+            changed_rows.extend(rows[index * width:(index + 1) * width])
+
+        return b''.join((_header.pack(MAGIC, VERSION, KIND_DELTA, self.stream, self.sequence,
+                                      self.base_sequence, len(changed)),
+                         session,
+                         struct.pack(b'<{}H'.format(len(changed)), *changed),
+                         _to_bytes(changed_rows)))
+
+
+class ProgressState(object):
+    """The state of a sync session.
+    rows holds the values of FIELDS for each torrent of names, one after the
+    other.
+    """
+
+    def __init__(self, phase, download_rate, upload_rate, total_upload, eta_secs, names, rows):
+        super(ProgressState, self).__init__()
+
+        self.phase = phase
+        self.download_rate = download_rate
+        self.upload_rate = upload_rate
+        self.total_upload = total_upload
+        self.eta_secs = None if eta_secs is None or eta_secs < 0 else eta_secs
+        self.names = names
+        self.rows = rows
+
+    def get_field(self, index, field):
+        return int(self.rows[index * len(FIELDS) + FIELDS.index(field)])
+
+    def get_totals(self):
+        """Return (total_wanted, total_wanted_done, num_peers) of all the torrents."""
+
+        width = len(FIELDS)
+        wanted = int(sum(self.rows[FIELDS.index('total_wanted')::width]))
+        done = int(sum(self.rows[FIELDS.index('total_wanted_done')::width]))
+        peers = int(sum(self.rows[FIELDS.index('num_peers')::width]))
+
+        return wanted, done, peers
+
+    def get_unfinished(self):
+        """Return the names of the torrents that are not fully downloaded."""
+
+        return [name for index, name in enumerate(self.names)
+                if self.get_field(index, 'total_wanted_done') != self.get_field(index, 'total_wanted')]
+
+
+class ProgressDecoder(object):
+    """Rebuild the state of a sync session from its progress records."""
+
+    def __init__(self):
+        super(ProgressDecoder, self).__init__()
+
+        self.stream = None
+        self.base_sequence = None
+        self.base_names = None
+        self.base_rows = None
+        self.missing_base = None
+        self.keyframe_needed = False  # A full record should be requested from the encoder
+
+    def decode(self, record):
+        """Return the ProgressState for the record or None if the record is a
+        delta whose base record has not been received.
+        keyframe_needed is set the first time a delta with a given missing base
+        record is decoded.
+        Raise ValueError if the record is malformed.
+        """
+
+        self.keyframe_needed = False
+
+        try:
+            magic, version, kind, stream, sequence, base_sequence, count = _header.unpack_from(record)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('Unknown progress record format')
+
+            offset = _header.size
+            session = _session.unpack_from(record, offset)
+            offset += _session.size
+
+            if kind == KIND_FULL:
+                names_length, = _names_length.unpack_from(record, offset)
+                offset += _names_length.size
+                names_data = record[offset:offset + names_length].decode(_encoding)
+                names = names_data.split('\0') if count else []
+                rows = _from_bytes(record[offset + names_length:])
+
+                if len(rows) != count * len(FIELDS):
+                    raise ValueError('Truncated progress record')
+
+                self.stream = stream
+                self.base_sequence = sequence
+                self.base_names = names
+                self.base_rows = rows
+
+                return ProgressState(*(session + (names, rows)))
+
+            if kind != KIND_DELTA:
+                raise ValueError('Unknown progress record kind: {}'.format(kind))
+
+            if stream != self.stream or base_sequence != self.base_sequence:
+                if self.missing_base != (stream, base_sequence):
+                    self.missing_base = (stream, base_sequence)
+                    self.keyframe_needed = True
+
+                return None
+
+            changed = struct.unpack_from(b'<{}H'.format(count), record, offset)
+            offset += 2 * count
+            changed_rows = _from_bytes(record[offset:])
+
+            width = len(FIELDS)
+            if len(changed_rows) != count * width:
+                raise ValueError('Truncated progress record')
+
+            rows = array.array(b'd', self.base_rows)
+            for position, index in enumerate(changed):
+                rows[index * width:(index + 1) * width] = changed_rows[position * width:(position + 1) * width]
+
+            return ProgressState(*(session + (self.base_names, rows)))
+
+        except (struct.error, UnicodeDecodeError) as ex:
+            raise ValueError('Corrupted progress record: {}'.format(ex))
+
+
+def format_progress(state):
+    """Return the (message, unfinished mods, fraction) to show for the state."""
+
+    if state.phase == PHASE_METADATA:
+        return 'Downloading metadata...', [], 0
+
+    total_size, downloaded_size, session_actual_peers = state.get_totals()
+    if total_size == 0:
+        total_size = 1
+
+    download_fraction = float(downloaded_size) / total_size
+
+    if download_fraction != 1:
+        action = 'Checking missing pieces:' if state.phase == PHASE_CHECKING else 'Syncing:'
+        ETA = format_eta(state.eta_secs)
+
+        # Don't round to 100.00% if the actual value is 99.999%
+        fraction_to_show = download_fraction * 100.0
+        if fraction_to_show > 99.99:
+            fraction_to_show = 99.99
+
+        progress_message = '{} {:0.2f}% complete ({:0.2f} KB/s) {}'.format(
+                           action,
+                           fraction_to_show,
+                           float(state.download_rate) / 1024.0,
+                           'ETA: {}'.format(ETA) if ETA else '')
+
+        return progress_message, state.get_unfinished(), download_fraction
+
+    if state.upload_rate / 1024 > 0:
+        progress_message = 'Ready to play. Seeding mods: {} connections ({:0.2f} KB/s). Total: {} MB'.format(
+                           session_actual_peers,
+                           state.upload_rate / 1024,
+                           state.total_upload / 1024 / 1024)
+    else:
+        progress_message = 'Ready to play. Seeding mods...'
+
+    return progress_message, [], download_fraction
@@ -0,0 +1,215 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import shutil
+
+import libtorrent
+from kivy.logger import Logger
+
+from sync.piece_verifier import file_changed, get_pieces_for_files
+from utils import paths
+
+# Resume data entries that describe the old torrent and can't be kept
+_TORRENT_SPECIFIC_KEYS = ('unfinished', 'piece_priority', 'file_priority', 'mapped_files', 'merkle tree',
+                          'trackers', 'url-list', 'httpseeds', 'peers', 'peers6', 'banned_peers',
+                          'banned_peers6', 'info', 'name', 'blocks per piece')
+
+BLOCK_SIZE = 16 * 1024  # The size of the libtorrent blocks
+
+
+def _get_good_files(torrent_info, resume_data, base_directory):
+    """Return {(sha1, size): relative_path} of the files of the torrent that
+    were fully downloaded and have not changed on disk since then.
+    """
+
+    file_sizes = resume_data['file sizes']
+    pieces = bytearray(resume_data['pieces'])
+    good_files = {}
+
+    for index, entry in enumerate(torrent_info.files()):
+        if entry.pad_file or entry.size == 0 or entry.filehash.is_all_zeros() or index >= len(file_sizes):
+            continue
+
+        if not all(pieces[piece] & 1 for piece in get_pieces_for_files(torrent_info, [index])):
+            continue
+
+        relative_path = entry.path.decode('utf-8')
+        size, mtime = file_sizes[index][0], file_sizes[index][1]
+
+        if not file_changed(os.path.join(base_directory, relative_path), size, mtime):
+            good_files[(entry.filehash.to_bytes(), entry.size)] = relative_path
+
+    return good_files
+
+
+def _move_files(base_directory, moves, copies):
+    """Move and copy the files. All the files are first created under a
+    temporary name because a destination may be the source of another move.
+    Return the relative paths of the destinations successfully created.
+    """
+
+    pending = []  # (tmp_path, destination)
+
+    # Copies first, while the sources are still in place
+    for source, destination in copies:
+        tmp_path = os.path.join(base_directory, destination) + '.reconcile_tmp'
+
+        try:
+            shutil.copyfile(os.path.join(base_directory, source), tmp_path)
+            pending.append((tmp_path, destination))
+
+        except (IOError, OSError) as ex:
+            Logger.error('Reconciler: Could not copy {} to {}: {}'.format(source, destination, repr(ex)))
+
+    for source, destination in moves:
+        tmp_path = os.path.join(base_directory, destination) + '.reconcile_tmp'
+
+        try:
+            os.rename(os.path.join(base_directory, source), tmp_path)
+            pending.append((tmp_path, destination))
+
+        except OSError as ex:
+            Logger.error('Reconciler: Could not move {} to {}: {}'.format(source, destination, repr(ex)))
+
+    done = []
+    for tmp_path, destination in pending:
+        full_path = os.path.join(base_directory, destination)
+
+        try:
+            paths.replace_file(tmp_path, full_path)
+            done.append(destination)
+
+        except OSError as ex:
+            Logger.error('Reconciler: Could not rename {}: {}'.format(tmp_path, repr(ex)))
+
+    return done
+
+
+def _ensure_parent_directory(full_path):
+    try:
+        os.makedirs(os.path.dirname(full_path))
+
+    except OSError as ex:
+        if ex.errno != errno.EEXIST:
+            raise
+
+
+def reconcile(old_torrent_info, old_resume_data_bencoded, new_torrent_info, base_directory):
+    """Prepare the mod directory for a new version of its torrent.
+
+    Files of the old torrent that are present in the new torrent under another
+    path (same checksum and size) are moved to their new location. Then resume
+    data is generated for the new torrent, marking as downloaded the pieces that
+    only contain files known to be complete. The remaining files are left to
+    piece_verifier.patch_resume_data() and libtorrent.
+
+    Return the bencoded resume data of the new torrent or None if the old
+    torrent data can't be used.
+    """
+
+    try:
+        old_resume_data = libtorrent.bdecode(old_resume_data_bencoded)
+        good_files = _get_good_files(old_torrent_info, old_resume_data, base_directory)
+
+    except Exception as ex:
+        Logger.info('Reconciler: Could not use the old torrent data: {}'.format(repr(ex)))
+        return None
+
+    good_paths = {relative_path: key for key, relative_path in good_files.iteritems()}
+    in_place = set()
+    moves = []
+    copies = []
+    used_sources = set()
+
+    # Files that stay in place are never moved away
+    new_files = list(new_torrent_info.files())
+    for entry in new_files:
+        relative_path = entry.path.decode('utf-8')
+
+        if not entry.filehash.is_all_zeros() and \
+           good_paths.get(relative_path) == (entry.filehash.to_bytes(), entry.size):
+            in_place.add(relative_path)
+
+    for entry in new_files:
+        relative_path = entry.path.decode('utf-8')
+        if entry.pad_file or entry.size == 0 or entry.filehash.is_all_zeros() or relative_path in in_place:
+            continue
+
+        source = good_files.get((entry.filehash.to_bytes(), entry.size))
+        if source is None:
+            continue
+
+        try:
+            _ensure_parent_directory(os.path.join(base_directory, relative_path))
+
+        except OSError as ex:
+            Logger.error('Reconciler: Could not create the directory of {}: {}'.format(relative_path, repr(ex)))
+            continue
+
+        if source in in_place or source in used_sources:
+            copies.append((source, relative_path))
+        else:
+            moves.append((source, relative_path))
+            used_sources.add(source)
+
+    if moves or copies:
+        Logger.info('Reconciler: Moving {} and copying {} files to their new location'.format(
+            len(moves), len(copies)))
+
+    known_good = in_place.union(_move_files(base_directory, moves, copies))
+
+    # Mark the pieces that only overlap files known to be good
+    pieces = bytearray(b'\x01' * new_torrent_info.num_pieces())
+    file_sizes = []
+    unknown_files = []
+
+    for index, entry in enumerate(new_files):
+        relative_path = entry.path.decode('utf-8')
+
+        if entry.pad_file or entry.size == 0:
+            file_sizes.append([0, 0])
+            continue
+
+        if relative_path in known_good:
+            try:
+                file_stat = os.stat(os.path.join(base_directory, relative_path))
+                file_sizes.append([file_stat.st_size, int(file_stat.st_mtime)])
+                continue
+
+            except OSError:
+                pass
+
+        # Unknown state. patch_resume_data will verify the file
+        file_sizes.append([0, 0])
+        unknown_files.append(index)
+
+    for piece in get_pieces_for_files(new_torrent_info, unknown_files):
+        pieces[piece] = 0
+
+    resume_data = dict(old_resume_data)
+    for key in _TORRENT_SPECIFIC_KEYS:
+        resume_data.pop(key, None)
+
+    resume_data['info-hash'] = new_torrent_info.info_hash().to_bytes()
+    resume_data['blocks per piece'] = max(1, new_torrent_info.piece_length() // BLOCK_SIZE)
+    resume_data['pieces'] = bytes(pieces)
+    resume_data['file sizes'] = file_sizes
+    resume_data['seed'] = 0 if unknown_files else 1
+
+    Logger.info('Reconciler: {} out of {} files reused from the previous version of the mod'.format(
+        len(known_good), len(new_files)))
+
+    return libtorrent.bencode(resume_data)
@@ -0,0 +1,199 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import json
+import time
+
+from kivy.logger import Logger
+from third_party.steam_query import RESPONSE_DOWN, RESPONSE_UNKNOWN
+from utils import paths
+
+
+class ServerStatusStore(object):
+    """Last known A2S status of the servers: players, max players, map and
+    the measured round trip time, along with the time it has been received.
+
+    The store is persisted so the server list can be shown right away when the
+    launcher starts, and refreshed in the background. The refresh interval is
+    the shortest while the list is being looked at and doubles after each
+    refresh otherwise.
+
+    Usage:
+        store = get_store()
+        store.mark_viewed()
+        if store.should_refresh(servers):
+            ... query the servers and call store.update(server, info) ...
+            store.save()
+    """
+
+    file_name = 'server_status.json'
+    ttl = 60  # An entry older than that needs refreshing
+    min_refresh_interval = 30
+    max_refresh_interval = 15 * 60
+    viewed_window = 2 * 60  # The list is considered watched for that long
+    max_age = 7 * 24 * 3600  # Don't load entries older than that
+
+    def __init__(self, file_path=None):
+        super(ServerStatusStore, self).__init__()
+
+        self.file_path = file_path or paths.get_launcher_directory(self.file_name)
+        self.entries = {}  # server key: {'player_count', 'max_players', 'map', 'rtt', 'down', 'updated_at'}
+        self.last_viewed = 0
+        self.last_refresh = 0
+        self.refresh_interval = self.min_refresh_interval
+
+    def get_file_name(self):
+        """Returns the full path to the store file"""
+        return self.file_path
+
+    @staticmethod
+    def get_key(server):
+        return '{}:{}'.format(server.ip, server.port)
+
+    def load(self):
+        """Read the entries from the disk.
+        A missing or corrupted file is treated as an empty store.
+        """
+
+        self.entries = {}
+
+        try:
+            with open(self.get_file_name(), 'rb') as file_handle:
+                entries = json.load(file_handle)
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                Logger.error('ServerStatusStore: Could not read {}: {}'.format(self.get_file_name(), repr(ex)))
+            return
+
+        except ValueError:
+            Logger.error('ServerStatusStore: Corrupted file {}. Ignoring.'.format(self.get_file_name()))
+            return
+
+        limit = time.time() - self.max_age
+        self.entries = {key: entry for key, entry in entries.iteritems()
+                        if isinstance(entry, dict) and entry.get('updated_at', 0) > limit}
+
+    def save(self):
+        with paths.atomic_write(self.get_file_name()) as file_handle:
+            json.dump(self.entries, file_handle)
+
+    def update(self, server, info, now=None):
+        """Store the A2S info of the server. info is None if the server did
+        not respond.
+        """
+
+        now = now or time.time()
+        key = self.get_key(server)
+
+        if info is None:
+            # Keep the last known data, it is shown as down anyway
+            entry = dict(self.entries.get(key, {}))
+            entry.update({'down': True, 'updated_at': now})
+
+        else:
+            entry = {
+                'player_count': info['player_count'],
+                'max_players': info['max_players'],
+                'map': info.get('map'),
+                'rtt': info.get('rtt'),
+                'down': False,
+                'updated_at': now,
+            }
+
+        self.entries[key] = entry
+
+    def get(self, server):
+        """Return the last entry of the server or None."""
+        return self.entries.get(self.get_key(server))
+
+    def is_fresh(self, server, now=None):
+        entry = self.get(server)
+        return entry is not None and (now or time.time()) - entry['updated_at'] < self.ttl
+
+    def format_players(self, server):
+        """Return the player count of the server as shown in the server list."""
+
+        entry = self.get(server)
+        if entry is None:
+            return RESPONSE_UNKNOWN
+
+        if entry['down']:
+            return RESPONSE_DOWN
+
+        return '{}/{}'.format(entry['player_count'], entry['max_players'])
+
+    def get_rtt(self, server):
+        """Return the last measured RTT of the server or None."""
+
+        entry = self.get(server)
+        if entry is None or entry['down']:
+            return None
+
+        return entry.get('rtt')
+
+    def sort_by_latency(self, servers):
+        """Return the servers sorted by their measured RTT. The servers with
+        an unknown latency come last, in their original order.
+        """
+
+        def sort_key(server):
+            rtt = self.get_rtt(server)
+            return (rtt is None, rtt or 0)
+
+        return sorted(servers, key=sort_key)
+
+    def mark_viewed(self, now=None):
+        """Record that the server list is being looked at."""
+
+        self.last_viewed = now or time.time()
+        self.refresh_interval = self.min_refresh_interval
+
+    def refresh_started(self, now=None):
+        now = now or time.time()
+        self.last_refresh = now
+
+        if now - self.last_viewed > self.viewed_window:
+            self.refresh_interval = min(self.refresh_interval * 2, self.max_refresh_interval)
+
+    def should_refresh(self, servers, now=None):
+        """Return True if the servers should be queried again."""
+
+        now = now or time.time()
+
+        if now - self.last_refresh < self.refresh_interval:
+            return False
+
+        # Nobody is looking and the entries are still fresh
+        if now - self.last_viewed > self.viewed_window and \
+           all(self.is_fresh(server, now) for server in servers):
+            return False
+
+        return True
+
+
+_store = None
+
+
+def get_store():
+    """Return the ServerStatusStore of the launcher, loading it on first use."""
+
+    global _store
+
+    if _store is None:
+        _store = ServerStatusStore()
+        _store.load()
+
+    return _store
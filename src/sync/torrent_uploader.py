@@ -16,19 +16,27 @@ import errno
 import inspect
 import json
 import launcher_config
+import libtorrent
 import os
+import platform
 import textwrap
+import threading
 import time
 
 from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from kivy.logger import Logger
 from kivy.config import Config
 from manager_functions import _torrent_url_base
 from sync import torrent_utils
 from sync import manager_functions
+from sync.piece_hasher import PreviousTorrent
+from sync.piece_verifier import file_changed
 from utils.devmode import devmode
 from utils import pypeeker
 from utils import remote
+from utils.hashes import get_default_workers_count, PROGRESS_INTERVAL
+from utils.metadatafile import MetadataFile
 
 default_log_level = devmode.get_log_level('info')
 Config.set('kivy', 'log_level', default_log_level)
@@ -130,31 +138,170 @@ def make_torrent(message_queue, launcher_basedir, mods):
         Logger.info('make_torrent: generator terminated')
 
 
-def _make_torrent(message_queue, launcher_basedir, mods):
-    """Create torrents from mods on the disk."""
+def get_previous_torrent(mod):
+    """Return the PreviousTorrent of the mod, containing the files that did
+    not change on disk since its torrent was last synced or seeded, or None if
+    that information is not available.
+    """
 
-    Logger.info('make_torrent: Starting the torrents creations process...')
-    # announces = ['http://{}/announce.php'.format(launcher_config.domain)]
-    announces = devmode.get_torrent_tracker_urls()
-    web_seeds = devmode.get_torrent_web_seeds()
+    metadata_file = MetadataFile(mod.foldername)
+    metadata_file.read_data(ignore_open_errors=True)
 
-    if web_seeds is None:
-        web_seeds = []
+    torrent_content = metadata_file.get_torrent_content()
+    resume_data_bencoded = metadata_file.get_torrent_resume_data()
+    if not torrent_content or not resume_data_bencoded:
+        return None
+
+    try:
+        torrent_info = torrent_utils.get_torrent_info_from_bytestring(torrent_content)
+        file_sizes = libtorrent.bdecode(resume_data_bencoded).get('file sizes', [])
+
+    except (RuntimeError, AttributeError) as ex:
+        Logger.error('make_torrent: Could not parse the previous torrent of {}: {}'.format(
+            mod.foldername, repr(ex)))
+        return None
+
+    files = {}
+    for index, entry in enumerate(torrent_info.files()):
+        relative_path = entry.path.decode('utf-8')
+
+        if entry.pad_file:
+            files[relative_path] = (entry.offset, entry.size, None)
+            continue
+
+        if entry.filehash.is_all_zeros() or index >= len(file_sizes):
+            continue
+
+        size, mtime = file_sizes[index][0], file_sizes[index][1]
+        if not file_changed(os.path.join(mod.parent_location, relative_path), size, mtime):
+            files[relative_path] = (entry.offset, entry.size, entry.filehash.to_bytes())
+
+    piece_hashes = [torrent_info.hash_for_piece(piece) for piece in xrange(torrent_info.num_pieces())]
+    return PreviousTorrent(torrent_info.piece_length(), torrent_info.total_size(), piece_hashes, files)
+
+
+class _CreationProgress(object):
+    """Aggregate the progress of the torrents being created at the same time
+    into 'Creating file:' progress messages.
+    """
+
+    def __init__(self, message_queue, total):
+        super(_CreationProgress, self).__init__()
+
+        self.message_queue = message_queue
+        self.total = total
+        self.finished = 0
+        self.fractions = OrderedDict()  # output_file: fraction
+        self.last_progress = 0
+        self.lock = threading.Lock()
+
+    def _send(self, force):
+        if not force and time.time() - self.last_progress < PROGRESS_INTERVAL:
+            return
+
+        self.last_progress = time.time()
+        fraction = (self.finished + sum(self.fractions.values())) / float(self.total)
+
+        if self.fractions:
+            msg = 'Creating file: {}'.format(', '.join(self.fractions))
+        else:
+            msg = 'Checking mods: {}/{}'.format(self.finished, self.total)
+
+        self.message_queue.progress({'msg': msg}, fraction)
+
+    def start(self, output_file):
+        with self.lock:
+            self.fractions[output_file] = 0.0
+            self._send(force=True)
+
+    def update(self, output_file, fraction):
+        with self.lock:
+            self.fractions[output_file] = fraction
+            self._send(force=False)
+
+    def finish(self, output_file=None):
+        with self.lock:
+            self.fractions.pop(output_file, None)
+            self.finished += 1
+            self._send(force=True)
+
+    def get_queue(self, output_file):
+        """Return an object that can be passed as a message queue to
+        create_torrent to report the progress of that file.
+        """
+
+        return _CreationProgressQueue(self, output_file)
+
+
+class _CreationProgressQueue(object):
+    def __init__(self, creation_progress, output_file):
+        super(_CreationProgressQueue, self).__init__()
+
+        self.creation_progress = creation_progress
+        self.output_file = output_file
+
+    def progress(self, data=None, percentage=0.0):
+        self.creation_progress.update(self.output_file, percentage)
+
+
+def _is_rotational(directory):
+    """Return True if the directory is known to be stored on a spinning disk."""
+
+    if platform.system() != 'Linux':
+        return False  # Unknown
+
+    try:
+        st_dev = os.stat(directory).st_dev
+        block_device = '/sys/dev/block/{}:{}'.format(os.major(st_dev), os.minor(st_dev))
+
+        # Partitions don't have a queue directory, their parent device has
+        for queue_path in (os.path.join(block_device, 'queue'), os.path.join(block_device, '..', 'queue')):
+            try:
+                with open(os.path.join(queue_path, 'rotational'), 'rb') as f:
+                    return f.read().strip() == b'1'
+
+            except IOError:
+                continue
+
+    except OSError:
+        pass
+
+    return False
 
-    if not announces:
-        Logger.error('make_torrent: torrent_tracker_urls cannot be empty!')
-        message_queue.reject({'msg': 'torrent_tracker_urls cannot be empty!'})
-        return
 
-    mods_created = []
+def _get_disk_key(directory):
+    """Return a value identifying the disk holding the directory."""
 
-    counter = 0
-    for mod in mods:
-        counter += 1
+    drive = os.path.splitdrive(os.path.abspath(directory))[0]
+    if drive:
+        return drive.lower()
 
+    try:
+        return os.stat(directory).st_dev
+
+    except OSError:
+        return None
+
+
+def _create_mod_torrent(mod, launcher_basedir, announces, web_seeds, creation_progress, disk_semaphores, workers):
+    """Create the torrent of a single mod. Run on a thread of the pool.
+    Return (mod, file_created, output_file, timestamp) or None if the mod has
+    been skipped.
+    """
+
+    directory = os.path.join(mod.parent_location, mod.foldername)
+    if not os.path.exists(directory):
+        Logger.error('make_torrent: Directory does not exist! Skipping. Directory: {}'.format(directory))
+        creation_progress.finish()
+        return None
+
+    # Don't read several mods at once from the same spinning disk.
+    # Checking whether the mod is up to date reads the mod files as well
+    with disk_semaphores[_get_disk_key(mod.parent_location)]:
         if mod.is_complete():
             Logger.info('make_torrent: Mod {} is up to date, skipping...'.format(mod.foldername))
-            continue
+            creation_progress.finish()
+            return None
 
         Logger.info('make_torrent: Generating new torrent for mod {}...'.format(mod.foldername))
 
@@ -163,18 +310,99 @@ def _make_torrent(message_queue, launcher_basedir, mods):
         output_path = os.path.join(launcher_basedir, output_file)
         comment = '{} dependency on mod {}'.format(launcher_config.launcher_name, mod.foldername)
 
-        directory = os.path.join(mod.parent_location, mod.foldername)
-        if not os.path.exists(directory):
-            Logger.error('make_torrent: Directory does not exist! Skipping. Directory: {}'.format(directory))
-            continue
+        creation_progress.start(output_file)
+        previous = get_previous_torrent(mod)
+        file_created = torrent_utils.create_torrent(directory, announces, output_path, comment, web_seeds,
+                                                    message_queue=creation_progress.get_queue(output_file),
+                                                    previous=previous, workers=workers)
+
+    with file(file_created, 'rb') as f:
+        mod.torrent_content = f.read()
+    mod.torrent_url = '{}{}'.format(_torrent_url_base(), output_file)
+
+    creation_progress.finish(output_file)
+    Logger.info('make_torrent: New torrent for mod {} created!'.format(mod.foldername))
+
+    return mod, file_created, output_file, timestamp
+
+
+def _create_torrents(message_queue, launcher_basedir, mods, announces, web_seeds):
+    """Check the mods and create the torrents of the modified ones, several at
+    a time. Return the list of (mod, file_created, output_file, timestamp) in
+    the order of mods.
+
+    The number of mods processed at once is bounded by the torrent_creation_jobs
+    devmode setting (defaults to the number of CPUs). Mods stored on the same
+    spinning disk are hashed one at a time, unless torrent_jobs_per_disk is set.
+    """
+
+    if not mods:
+        return []
+
+    jobs = max(1, min(len(mods), devmode.get_torrent_creation_jobs(default=get_default_workers_count())))
+    jobs_per_disk = devmode.get_torrent_jobs_per_disk(default=None)
+
+    disk_semaphores = {}
+    mods_by_disk = OrderedDict()
+    for index, mod in enumerate(mods):
+        disk_key = _get_disk_key(mod.parent_location)
+        mods_by_disk.setdefault(disk_key, []).append((index, mod))
+
+        if disk_key not in disk_semaphores:
+            limit = jobs_per_disk
+            if limit is None:
+                limit = 1 if _is_rotational(mod.parent_location) else jobs
+
+            disk_semaphores[disk_key] = threading.BoundedSemaphore(max(1, limit))
+
+    # Interleave the disks so that the threads waiting for a busy disk don't
+    # hold back the mods stored on the other disks
+    tasks = []
+    disk_queues = list(mods_by_disk.values())
+    while any(disk_queues):
+        for disk_queue in disk_queues:
+            if disk_queue:
+                tasks.append(disk_queue.pop(0))
+
+    Logger.info('make_torrent: Checking {} mods on {} disks using {} jobs'.format(
+        len(mods), len(disk_semaphores), jobs))
+
+    creation_progress = _CreationProgress(message_queue, len(mods))
+    workers = max(2, get_default_workers_count() // jobs)
+
+    def run_task(task):
+        index, mod = task
+        return index, _create_mod_torrent(mod, launcher_basedir, announces, web_seeds,
+                                          creation_progress, disk_semaphores, workers)
 
-        message_queue.progress({'msg': 'Creating file: {}'.format(output_file)}, counter / len(mods))
-        file_created = torrent_utils.create_torrent(directory, announces, output_path, comment, web_seeds)
-        with file(file_created, 'rb') as f:
-            mod.torrent_content = f.read()
-        mod.torrent_url = '{}{}'.format(_torrent_url_base(), output_file)
-        mods_created.append((mod, file_created, output_file, timestamp))
-        Logger.info('make_torrent: New torrent for mod {} created!'.format(mod.foldername))
+    pool = ThreadPool(processes=jobs)
+
+    try:
+        results = sorted(pool.imap_unordered(run_task, tasks))
+
+    finally:
+        pool.terminate()
+
+    return [result for _, result in results if result]
+
+
+def _make_torrent(message_queue, launcher_basedir, mods):
+    """Create torrents from mods on the disk."""
+
+    Logger.info('make_torrent: Starting the torrents creations process...')
+    # announces = ['http://{}/announce.php'.format(launcher_config.domain)]
+    announces = devmode.get_torrent_tracker_urls()
+    web_seeds = devmode.get_torrent_web_seeds()
+
+    if web_seeds is None:
+        web_seeds = []
+
+    if not announces:
+        Logger.error('make_torrent: torrent_tracker_urls cannot be empty!')
+        message_queue.reject({'msg': 'torrent_tracker_urls cannot be empty!'})
+        return
+
+    mods_created = _create_torrents(message_queue, launcher_basedir, mods, announces, web_seeds)
 
     if mods_created:
         mods_user_friendly_list = []
@@ -286,8 +514,11 @@ def perform_update(message_queue, mods_created):
         # Delete old torrents
         message_queue.progress({'msg': 'Deleting old torrents...'}, 1)
         Logger.info('perform_update: Deleting old torrents...')
+        remote_files_names = connection.list_files(torrents_path)
+        files_to_remove = []
+
         for mod, local_file_path, file_name, _ in mods_created:
-            for remote_file_name in connection.list_files(torrents_path):
+            for remote_file_name in remote_files_names:
                 if not remote_file_name.endswith('.torrent'):
                     continue
 
@@ -298,8 +529,10 @@ def perform_update(message_queue, mods_created):
                     continue
 
                 # Got the file[s] to remove
-                file_path = remote.join(torrents_path, remote_file_name)
-                connection.remove_file(file_path)
+                files_to_remove.append(remote.join(torrents_path, remote_file_name))
+
+        if files_to_remove:
+            connection.remove_files(files_to_remove)
 
         # Sleep custom amount of time
         if server_delay:
@@ -310,9 +543,8 @@ def perform_update(message_queue, mods_created):
         # Push new torrents
         message_queue.progress({'msg': 'Pushing new torrents...'}, 1)
         Logger.info('perform_update: Pushing new torrents...')
-        for mod, local_file_path, file_name, _ in mods_created:
-            remote_torrent_path = remote.join(torrents_path, file_name)
-            connection.put_file(local_file_path, remote_torrent_path)
+        connection.put_files([(local_file_path, remote.join(torrents_path, file_name))
+                              for _, local_file_path, file_name, _ in mods_created])
 
         message_queue.progress({'msg': 'Updating modified metadata.json...'}, 1)
         Logger.info('perform_update: Updated metadata.json:\n{}'.format(metadata_json_updated))
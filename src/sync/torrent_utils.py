@@ -22,10 +22,14 @@ import textwrap
 import libtorrent
 from kivy.logger import Logger
 
+from sync.filetreeindex import get_file_index
 from sync.integrity import check_mod_directories, check_files_mtime_correct, are_ts_plugins_installed, is_whitelisted
+from sync.piece_hasher import PieceHasher
 from utils import paths
 from utils import unicode_helpers
 from utils import walker
+from utils.dirsnapshot import DirectorySnapshot
+from utils.hashcache import HashCache
 from utils.metadatafile import MetadataFile
 
 
@@ -45,7 +49,7 @@ def set_torrent_complete(mod):
     metadata_file.write_data()
 
 
-def is_complete_quick(mod):
+def is_complete_quick(mod, message_queue=None):
     """Performs a quick check to see if the mod *seems* to be correctly installed.
     This check assumes no external changes have been made to the mods.
 
@@ -54,7 +58,11 @@ def is_complete_quick(mod):
     2. Check if torrent is not dirty [download completed successfully] (instant)
     3. Check if torrent url matches (instant)
     4. Check if files have the right size and modification time (very quick)
-    5. Check if there are no superfluous files in the directory (very quick)"""
+    5. Check if there are no superfluous files in the directory (very quick)
+
+    Steps 4 and 5 are limited to the entries that changed since the last
+    successful check, according to the mod's DirectorySnapshot.
+    The progress of the files hashing, if any, is reported to message_queue."""
 
     Logger.info('Is_complete: Checking mod {} for completeness...'.format(mod.foldername))
 
@@ -100,27 +108,64 @@ def is_complete_quick(mod):
         return False
     resume_data = libtorrent.bdecode(resume_data_bencoded)
 
+    # Find out what changed since the last successful check
+    snapshot = DirectorySnapshot(mod.foldername, mod.torrent_url)
+    snapshot.load()
+    changed_files, changed_dirs = snapshot.get_changed_entries(mod.parent_location)
+    snapshot_outdated = not snapshot.is_valid() or changed_files or changed_dirs
+
     # (4)
     file_sizes = resume_data['file sizes']
     files = torrent_info.files()
     # file_path, size, mtime
     files_data = map(lambda x, y: (y.path.decode('utf-8'), x[0], x[1]), file_sizes, files)
 
-    if not check_files_mtime_correct(mod.parent_location, files_data):
+    if snapshot.is_valid():
+        changed_files = set(changed_files)
+        files_data = [file_data for file_data in files_data if file_data[0] in changed_files]
+        files_stats = None
+
+    else:
+        # All the files need checking. Get their stat data in one pass
+        files_stats = {}
+        for top_directory in set(file_data[0].split(os.sep, 1)[0] for file_data in files_data):
+            files_stats.update(walker.stat_files(os.path.join(mod.parent_location, top_directory),
+                                                 mod.parent_location))
+
+    if not check_files_mtime_correct(mod.parent_location, files_data, files_stats):
         Logger.info('Is_complete: Some files seem to have been modified in the meantime. Marking as not complete')
         return False
 
     # (5) Check if there are no additional files in the directory
-    # TODO: Check if these checksums are even needed now
-    checksums = dict([(entry.path.decode('utf-8'), entry.filehash.to_bytes()) for entry in torrent_info.files()])
-    files_list = checksums.keys()
-    if not check_mod_directories(files_list, mod.parent_location, on_superfluous='warn'):
+    file_index = get_file_index(torrent_info)
+    files_list = file_index.files
+
+    # Adding or removing an entry changes the modification time of its parent
+    # directory so there is no need to walk the directories if none changed
+    if snapshot.is_valid() and not changed_dirs:
+        Logger.info('Is_complete: Directories unchanged since the last check. Skipping the directory scan')
+
+    elif not check_mod_directories(files_list, mod.parent_location, on_superfluous='warn',
+                                   file_index=file_index, message_queue=message_queue):
         Logger.info('Is_complete: Superfluous files in mod directory. Marking as not complete')
         return False
 
-    if not are_ts_plugins_installed(mod.parent_location, files_list):
-        Logger.info('Is_complete: TS plugin out of date or not installed.')
-        return False
+    # The hash cache is bound to the torrent url and gets invalidated on change
+    hash_cache = HashCache(mod.foldername, mod.torrent_url)
+    hash_cache.load()
+
+    try:
+        if not are_ts_plugins_installed(mod.parent_location, files_list, hash_cache=hash_cache,
+                                        message_queue=message_queue):
+            Logger.info('Is_complete: TS plugin out of date or not installed.')
+            return False
+
+    finally:
+        hash_cache.save()
+
+    if snapshot_outdated:
+        snapshot.update(mod.parent_location, files_list, file_index.dirs)
+        snapshot.save()
 
     return True
 
@@ -478,7 +523,14 @@ def create_add_torrent_flags(just_seed=False):
     return flags
 
 
-def create_torrent(directory, announces=None, output=None, comment=None, web_seeds=None):
+def create_torrent(directory, announces=None, output=None, comment=None, web_seeds=None,
+                   message_queue=None, previous=None, workers=None):
+    """Create a torrent file from the directory.
+    The pieces are hashed on multiple threads. If previous (a PieceHasher
+    PreviousTorrent) is given, the hashes of the unchanged files and pieces are
+    reused. workers is the number of hashing threads to use.
+    """
+
     if not output:
         output = directory + ".torrent"
 
@@ -497,6 +549,12 @@ def create_torrent(directory, announces=None, output=None, comment=None, web_see
     libtorrent.add_files(fs, unicode_helpers.encode_utf8(directory), is_not_whitelisted, flags=flags)
     t = libtorrent.create_torrent(fs, piece_size=piece_size, flags=flags)
 
+    # Keep the piece size of the previous torrent, unless the mod size changed
+    # a lot, so its piece hashes can be reused
+    if previous and previous.piece_length != t.piece_length() and \
+       t.piece_length() // 2 <= previous.piece_length <= t.piece_length() * 2:
+        t = libtorrent.create_torrent(fs, piece_size=previous.piece_length, flags=flags)
+
     for announce in announces:
         t.add_tracker(unicode_helpers.encode_utf8(announce))
 
@@ -507,7 +565,10 @@ def create_torrent(directory, announces=None, output=None, comment=None, web_see
         t.add_url_seed(unicode_helpers.encode_utf8(web_seed))
     # t.add_http_seed("http://...")
 
-    libtorrent.set_piece_hashes(t, unicode_helpers.encode_utf8(os.path.dirname(directory)))
+    hasher = PieceHasher(t, os.path.dirname(directory), previous=previous, message_queue=message_queue,
+                         workers=workers)
+    pieces_hashed, pieces_reused = hasher.run()
+    Logger.info('create_torrent: {} pieces hashed, {} pieces reused'.format(pieces_hashed, pieces_reused))
 
     with open(output, "wb") as file_handle:
         file_handle.write(libtorrent.bencode(t.generate()))
@@ -28,15 +28,23 @@ if __name__ == "__main__":
 
 import libtorrent
 import textwrap
+import time
 import torrent_utils
 
 from kivy.logger import Logger
+from multiprocessing.pool import ThreadPool
+from sync import piece_verifier
+from sync import progressrecord
+from sync import reconciler
+from sync.contentindex import ContentIndex
+from sync.filetreeindex import get_file_index
 from sync.integrity import check_mod_directories
+from utils import filecache
 from utils import requests_wrapper
+from utils.devmode import devmode
 from utils.eta import Eta
-from utils.metadatafile import MetadataFile
+from utils.metadatafile import MetadataFile, batch_updates
 from utils.unicode_helpers import decode_utf8, encode_utf8
-from time import sleep
 
 
 class PrepareParametersException(Exception):
@@ -45,6 +53,10 @@ class PrepareParametersException(Exception):
 
 class TorrentSyncer(object):
     _update_interval = 1
+    _resume_data_checkpoint_interval = 5 * 60  # Save resume data periodically in case of a crash
+    _resume_data_timeout = 30
+    _torrent_removal_timeout = 30
+    _metadata_download_workers = 8
     session = None
 
     def __init__(self, result_queue, mods, max_download_speed=0, max_upload_speed=0):
@@ -63,6 +75,16 @@ class TorrentSyncer(object):
         self.result_queue = result_queue
         self.mods = mods
         self.force_termination = False
+        self.just_seed = False
+        self.session_logs = []
+        self.last_status_update = 0
+        self.last_resume_data_checkpoint = time.time()
+        self.resume_data_pending = set()  # Mods for which resume data has been requested
+        self.resume_data_received = {}  # mod: bencoded resume data waiting to be written
+        self.removal_pending = set()  # Info hashes of the torrents being removed from the session
+        self.prefetched_torrents = {}  # url: torrent content or PrepareParametersException
+        self.content_index = None  # Files already on disk that can be reused
+        self.content_index_wanted = False  # Build the content index when a mod needs downloading
 
         for m in mods:
             m.finished_hook_ran = False
@@ -90,6 +112,12 @@ class TorrentSyncer(object):
         self.session = libtorrent.session(fingerprint=fingerprint)
         self.session.listen_on(6881, 6891)  # This is just a port suggestion. On failure, the port is automatically selected.
 
+        # Get notified about torrent state changes instead of polling each torrent
+        categories = libtorrent.alert.category_t
+        self.session.set_alert_mask(categories.error_notification |
+                                    categories.status_notification |
+                                    categories.storage_notification)
+
         # Prevent conversion to C int error
         settings.download_rate_limit = min(max_download_speed, 999999) * 1024
         settings.upload_rate_limit = min(max_upload_speed, 999999) * 1024
@@ -97,18 +125,77 @@ class TorrentSyncer(object):
         self.session.set_settings(settings)
 
     def get_session_logs(self):
-        """Get alerts from torrent engine and forward them to the manager process"""
-        torrent_log = []
+        """Return the alerts gathered by process_alerts() since the last call,
+        to be forwarded to the manager process."""
+
+        torrent_log = self.session_logs
+        self.session_logs = []
+
+        return torrent_log
+
+    def get_mod_for_handle(self, handle):
+        """Return the mod paired with the torrent handle or None."""
+
+        for mod in self.mods_with_valid_handle():
+            if mod.torrent_handle == handle:
+                return mod
+
+        return None
+
+    def process_alerts(self):
+        """Wait for the next libtorrent alerts and handle them.
+        The status of all the torrents is refreshed every _update_interval
+        seconds with a single state_update_alert. The status of a torrent that
+        changed its state, finished, got paused or failed is refreshed as soon
+        as the alert arrives so the caller can act on it immediately.
+
+        Return True if the status of all the torrents has been refreshed.
+        """
+
+        status_refreshed = False
+        now = time.time()
+
+        if now - self.last_status_update >= self._update_interval:
+            self.last_status_update = now
+            self.session.post_torrent_updates()
+
+        timeout = max(0, self.last_status_update + self._update_interval - now)
+        self.session.wait_for_alert(int(timeout * 1000))
 
         alerts = self.session.pop_alerts()  # Important: these are messages for the whole session, not only one torrent!
-                                            # Use alert.handle in the future to get the torrent handle
         for alert in alerts:
-            # Filter with: alert.category() & libtorrent.alert.category_t.error_notification
+            if isinstance(alert, libtorrent.state_update_alert):
+                for status in alert.status:
+                    mod = self.get_mod_for_handle(status.handle)
+                    if mod:
+                        mod.status = status
+
+                status_refreshed = True
+                continue
+
             message = decode_utf8(alert.message(), errors='ignore')
             Logger.info("Alerts: Category: {}, Message: {}".format(alert.category(), message))
-            torrent_log.append({'message': message, 'category': alert.category()})
+            self.session_logs.append({'message': message, 'category': alert.category()})
 
-        return torrent_log
+            if isinstance(alert, libtorrent.save_resume_data_alert):
+                self.on_resume_data_received(alert.handle, libtorrent.bencode(alert.resume_data))
+
+            elif isinstance(alert, libtorrent.save_resume_data_failed_alert):
+                self.on_resume_data_received(alert.handle, None)
+
+            elif isinstance(alert, libtorrent.torrent_removed_alert):
+                self.removal_pending.discard(str(alert.info_hash))
+
+            elif isinstance(alert, (libtorrent.state_changed_alert,
+                                  libtorrent.torrent_finished_alert,
+                                  libtorrent.torrent_paused_alert,
+                                  libtorrent.torrent_resumed_alert,
+                                  libtorrent.torrent_error_alert)):
+                mod = self.get_mod_for_handle(alert.handle)
+                if mod:
+                    mod.status = mod.torrent_handle.status()
+
+        return status_refreshed
 
     def set_whitelist_filter(self, whitelisted):
         """Set an IP whitelist so that the torrent client will ONLY seed (and
@@ -154,7 +241,8 @@ class TorrentSyncer(object):
     def log_session_progress(self):
         """Log the progress of syncing the torrents.
         Progress for each individual torrent is written to the log file.
-        Progress for the whole session is shown in the status label.
+        Progress for the whole session is sent to the GUI as a compact progress
+        record (see sync.progressrecord) which is formatted there.
 
         - If at least one torrent is downloading its metadata, the progress will
         be "Downloading metadata..."
@@ -163,74 +251,50 @@ class TorrentSyncer(object):
         """
 
         session_logs = self.get_session_logs()
-
-        # If not all torrents have retrieved metadata, just show a message
-        if not all(mod.torrent_handle.has_metadata() for mod in self.mods_with_valid_handle()):
-            self.result_queue.progress({'msg': 'Downloading metadata...',
-                                        'log': session_logs,
-                                        }, 0)
-            return
-
-        # We can now assume that every torrent has got the metadata downloaded
-        # so we can get its size on disk
-
         status = self.session.status()
+        mods = list(self.mods_with_valid_handle())
 
-        total_size = 0.0
-        downloaded_size = 0.0
-        unfinished_mods = []
-
-        for mod in self.mods_with_valid_handle():
-            downloaded_size += mod.status.total_wanted_done
-            total_size += mod.status.total_wanted
-
-            if mod.status.total_wanted_done != mod.status.total_wanted:
-                unfinished_mods.append(mod.foldername)
-
-        if total_size == 0:
-            total_size = 1
-
-        download_fraction = downloaded_size / total_size
-        session_actual_peers = 0
-        syncing_message = 'Syncing:'
-        action = syncing_message
+        # If not all torrents have retrieved metadata, just show a message
+        if not all(mod.status.has_metadata for mod in mods):
+            phase = progressrecord.PHASE_METADATA
+            mods = []
 
         # If at least one torrent is checking its pieces, show a message
-        for mod in self.mods_with_valid_handle():
-            session_actual_peers += mod.status.num_peers
-            if mod.status.state == libtorrent.torrent_status.checking_files:
-                action = 'Checking missing pieces:'
+        elif any(mod.status.state == libtorrent.torrent_status.checking_files for mod in mods):
+            phase = progressrecord.PHASE_CHECKING
 
-        if action == syncing_message:
-            ETA = self.eta.calculate_eta(status.payload_download_rate, total_size, downloaded_size)
         else:
-            ETA = ''
+            phase = progressrecord.PHASE_SYNCING
 
-        if download_fraction != 1:
-            # Don't round to 100.00% if the actual value is 99.999%
-            fraction_to_show = download_fraction * 100.0
-            if fraction_to_show > 99.99:
-                fraction_to_show = 99.99
-
-            progress_message = '{} {:0.2f}% complete ({:0.2f} KB/s) {}'.format(
-                               action,
-                               fraction_to_show,
-                               float(status.payload_download_rate) / 1024.0,
-                               'ETA: {}'.format(ETA) if ETA else '')
-            progress_mods = unfinished_mods
-        else:
-            if status.payload_upload_rate / 1024 > 0:
-                progress_message = 'Ready to play. Seeding mods: {} connections ({:0.2f} KB/s). Total: {} MB'.format(
-                                   session_actual_peers,
-                                   status.payload_upload_rate / 1024,
-                                   status.total_payload_upload / 1024 / 1024)
-            else:
-                progress_message = 'Ready to play. Seeding mods...'
-            progress_mods = []
-
-        self.result_queue.progress({'msg': progress_message,
-                                    'mods': progress_mods,
-                                    'log': self.get_session_logs(),
+        # We can now assume that every torrent has got the metadata downloaded
+        # so we can get its size on disk
+        rows = []
+        for mod in mods:
+            rows.extend((mod.status.total_wanted,
+                         mod.status.total_wanted_done,
+                         mod.status.download_rate,
+                         mod.status.upload_rate,
+                         mod.status.num_peers,
+                         int(mod.status.state)))
+
+        total_size = sum(mod.status.total_wanted for mod in mods)
+        downloaded_size = sum(mod.status.total_wanted_done for mod in mods)
+
+        eta_secs = None
+        if phase == progressrecord.PHASE_SYNCING:
+            eta_secs = self.eta.calculate_eta_secs(status.payload_download_rate, total_size or 1, downloaded_size)
+
+        state = progressrecord.ProgressState(phase,
+                                             status.payload_download_rate,
+                                             status.payload_upload_rate,
+                                             status.total_payload_upload,
+                                             eta_secs,
+                                             [mod.foldername for mod in mods],
+                                             rows)
+        progress_message, _, download_fraction = progressrecord.format_progress(state)
+
+        self.result_queue.progress({'progress_record': self.progress_encoder.encode(state),
+                                    'log': session_logs,
                                     }, download_fraction)
 
         # Don't log at 100% to prevent spamming while seeding
@@ -269,35 +333,10 @@ class TorrentSyncer(object):
                 return torrent_info, None  # Don't cache torrent_content
 
             else:  # Torrent from url
-                try:
-                    Logger.info('TorrentSyncer: Fetching torrent: {}'.format(mod.torrent_url))
-                    res = requests_wrapper.download_url(None, mod.torrent_url, timeout=5)
-                except requests_wrapper.DownloadException as ex:
-                    error_message = 'Downloading metadata: {}'.format(ex.args[0])
-                    raise PrepareParametersException(error_message)
-
-                if res.status_code == 404:
-                    message = textwrap.dedent('''\
-                        Torrent file could not be downloaded from the master server.
-                        Reason: file not found on the server (HTTP 404).
-
-                        This may be because the mods are updated on the server right now.
-                        Please try again in a few minutes.
-                        ''')
-                    raise PrepareParametersException(message)
-
-                elif res.status_code != 200:
-                    message = textwrap.dedent('''\
-                        Torrent file could not be downloaded from the master server.
-                        HTTP error code: {}
-
-                        Contact the master server owner to fix this issue.
-                        '''.format(unicode(res.status_code)))
-                    raise PrepareParametersException(message)
+                torrent_content = self.get_torrent_content(mod.torrent_url)
 
                 try:
-                    torrent_content = res.content
-                    torrent_info = torrent_utils.get_torrent_info_from_bytestring(res.content)
+                    torrent_info = torrent_utils.get_torrent_info_from_bytestring(torrent_content)
 
                 except RuntimeError as ex:  # Raised by libtorrent.torrent_info()
                     error_message = 'Could not parse torrent metadata: {}\nContact the master server owner to fix this issue.'.format(decode_utf8(ex.args[0]))
@@ -306,6 +345,110 @@ class TorrentSyncer(object):
 
         return torrent_info, torrent_content
 
+    def fetch_torrent(self, url, conditional=True):
+        """Download the torrent file from the url and return its contents.
+        If a copy of the file is present in the file cache, the request is
+        conditional and the cached copy is used if the server did not modify
+        the file.
+        Raise PrepareParametersException on error.
+        """
+
+        headers = filecache.get_conditional_headers(url) if conditional else {}
+
+        try:
+            Logger.info('TorrentSyncer: Fetching torrent: {}'.format(url))
+            res = requests_wrapper.download_url(None, url, timeout=5, headers=headers,
+                                                session=requests_wrapper.get_session())
+        except requests_wrapper.DownloadException as ex:
+            error_message = 'Downloading metadata: {}'.format(ex.args[0])
+            raise PrepareParametersException(error_message)
+
+        if res.status_code == 304:
+            torrent_content = filecache.get_file(url)
+            if torrent_content is not None:
+                Logger.info('TorrentSyncer: Torrent not modified. Using cached copy: {}'.format(url))
+                return torrent_content
+
+            return self.fetch_torrent(url, conditional=False)
+
+        if res.status_code == 404:
+            message = textwrap.dedent('''\
+                Torrent file could not be downloaded from the master server.
+                Reason: file not found on the server (HTTP 404).
+
+                This may be because the mods are updated on the server right now.
+                Please try again in a few minutes.
+                ''')
+            raise PrepareParametersException(message)
+
+        elif res.status_code != 200:
+            message = textwrap.dedent('''\
+                Torrent file could not be downloaded from the master server.
+                HTTP error code: {}
+
+                Contact the master server owner to fix this issue.
+                '''.format(unicode(res.status_code)))
+            raise PrepareParametersException(message)
+
+        try:
+            filecache.save_file(url, res.content, res.headers)
+        except (IOError, OSError) as ex:
+            Logger.error('TorrentSyncer: Could not cache torrent {}: {}'.format(url, repr(ex)))
+
+        return res.content
+
+    def get_torrent_content(self, url):
+        """Return the contents of the torrent file, using the result of
+        prefetch_torrents() if available.
+        """
+
+        result = self.prefetched_torrents.pop(url, None)
+        if result is None:
+            return self.fetch_torrent(url)
+
+        if isinstance(result, PrepareParametersException):
+            raise result
+
+        return result
+
+    def prefetch_torrents(self, mods, force_sync=False):
+        """Download all the torrent files not cached in the metadata files
+        concurrently, reusing connections to the server.
+        The results are used by get_mod_torrent_metadata().
+        """
+
+        urls = []
+        for mod in mods:
+            if mod.torrent_url.startswith('file://') or mod.torrent_url in urls:
+                continue
+
+            if not force_sync:
+                metadata_file = MetadataFile(mod.foldername)
+                metadata_file.read_data(ignore_open_errors=True)
+
+                if metadata_file.get_torrent_url() == mod.torrent_url and metadata_file.get_torrent_content():
+                    continue
+
+            urls.append(mod.torrent_url)
+
+        if not urls:
+            return
+
+        def fetch(url):
+            try:
+                return url, self.fetch_torrent(url)
+            except PrepareParametersException as ex:
+                return url, ex
+
+        pool = ThreadPool(processes=min(len(urls), self._metadata_download_workers))
+
+        try:
+            for url, result in pool.imap_unordered(fetch, urls):
+                self.prefetched_torrents[url] = result
+
+        finally:
+            pool.terminate()
+
     def prepare_libtorrent_params(self, mod, force_sync=False, just_seed=False):
         """Prepare mod for download over bittorrent.
         This effectively downloads the .torrent file if its contents are not
@@ -315,12 +458,19 @@ class TorrentSyncer(object):
 
         # TODO: Add the check: mod name == torrent directory name
 
+        # Index the files of all the mods when the first mod that needs
+        # downloading is found, before its metadata gets updated, so that the
+        # files of its previous version can be reused as well
+        if self.content_index_wanted and self.content_index is None and not just_seed and not mod.is_complete():
+            self.content_index = ContentIndex.build()
+
         # === Metadata handling ===
         metadata_file = MetadataFile(mod.foldername)
         metadata_file.read_data(ignore_open_errors=True)  # In case the mod does not exist, we would get an error
 
         # Clear the force clean flag
         metadata_file.set_force_creator_complete(False)
+        was_dirty = metadata_file.get_dirty()
 
         # A little bit of a workaround. If we intend to seed, we can assume the data is all right.
         # This way, if the torrent is closed before checking_resume_data is finished, and the post-
@@ -329,8 +479,15 @@ class TorrentSyncer(object):
             metadata_file.set_dirty(True)  # Set as dirty in case this process is not terminated cleanly
 
         # If the torrent url changed, invalidate the resume data
+        # Keep the previous torrent data to reuse the files of the old version
+        old_torrent_content = None
+        old_resume_data = None
         old_torrent_url = metadata_file.get_torrent_url()
         if old_torrent_url != mod.torrent_url or force_sync:
+            if old_torrent_url and not force_sync and not was_dirty and not just_seed:
+                old_torrent_content = metadata_file.get_torrent_content()
+                old_resume_data = metadata_file.get_torrent_resume_data()
+
             metadata_file.set_torrent_resume_data('')
             metadata_file.set_torrent_content('')
             # print "Setting torrent url to {}".format(mod.torrent_url)
@@ -353,10 +510,26 @@ class TorrentSyncer(object):
         metadata_file.set_torrent_content(torrent_content)
         metadata_file.write_data()
 
+        # Move the files that have been renamed in the new version of the mod
+        if old_torrent_content and old_resume_data:
+            resume_data = self.reconcile_torrent(mod, old_torrent_content, old_resume_data, torrent_info)
+            if resume_data:
+                metadata_file.set_torrent_resume_data(resume_data)
+                metadata_file.write_data()
+
+        # Create the missing files from identical files already on disk
+        if self.content_index and not just_seed:
+            self.content_index.reuse_files(torrent_info, mod.parent_location,
+                                           use_hardlinks=devmode.get_reuse_files_hardlinks(default=False),
+                                           message_queue=self.result_queue)
+
         # Add optional resume data
         resume_data = metadata_file.get_torrent_resume_data()
         if resume_data:  # Quick resume torrent from data saved last time the torrent was run
-            params['resume_data'] = resume_data
+            # Only verify the pieces of files that changed since the resume
+            # data was saved instead of letting libtorrent recheck everything
+            params['resume_data'] = piece_verifier.patch_resume_data(
+                resume_data, torrent_info, mod.parent_location, self.result_queue)
 
         mod.libtorrent_params = params
 
@@ -366,6 +539,24 @@ class TorrentSyncer(object):
             # hurt to do that again in case something changed in the meantime.
             torrent_utils.prepare_mod_directory(mod.get_full_path())
 
+    def reconcile_torrent(self, mod, old_torrent_content, old_resume_data, torrent_info):
+        """Reuse the files of the previous version of the mod.
+        Return the resume data for the new torrent or None.
+        """
+
+        try:
+            old_torrent_info = torrent_utils.get_torrent_info_from_bytestring(old_torrent_content)
+
+        except RuntimeError as ex:  # Raised by libtorrent.torrent_info()
+            Logger.error('TorrentSyncer: could not parse the previous torrent of {}: {}'.format(
+                mod.foldername, decode_utf8(ex.args[0])))
+            return None
+
+        self.result_queue.progress({'msg': 'Updating mod {}...'.format(mod.foldername),
+                                    'log': []}, 0)
+
+        return reconciler.reconcile(old_torrent_info, old_resume_data, torrent_info, mod.parent_location)
+
     def get_torrents_status(self):
         """Get the status of all torrents with valid handles and cache them in
         the TorrentSyncer class.
@@ -384,23 +575,21 @@ class TorrentSyncer(object):
     def pause_all_torrents(self):
         """Pause all torrents with valid handles."""
         for mod in self.mods:
-            if not mod.torrent_handle.is_valid():
-                continue
-
-            mod.torrent_handle.auto_managed(False)
-            mod.torrent_handle.pause()
+            self.pause_torrent(mod)
 
     def pause_torrent(self, mod):
         """Pause a torrent paired with a mod."""
-        if mod.torrent_handle.is_valid():
+        if mod.torrent_handle.is_valid() and not mod.status.paused:
             mod.torrent_handle.auto_managed(False)
             mod.torrent_handle.pause()
+            mod.status = mod.torrent_handle.status()
 
     def resume_torrent(self, mod):
         """Resume a torrent paired with a mod."""
         if mod.torrent_handle.is_valid():
             mod.torrent_handle.auto_managed(True)
             mod.torrent_handle.resume()
+            mod.status = mod.torrent_handle.status()
 
     def is_syncing_finished(self):
         """Check whether all torrents are in a state where every torrent has been synced.
@@ -423,7 +612,7 @@ class TorrentSyncer(object):
                 # print "mod {} not mod.finished_hook_ran".format(mod.foldername)
                 return False
 
-            if not mod.torrent_handle.is_paused():
+            if not mod.status.paused:
                 # print "mod {} not paused".format(mod.foldername)
                 return False
 
@@ -462,6 +651,106 @@ class TorrentSyncer(object):
 
             self.session.set_settings(session_settings)
 
+        elif command == 'progress_keyframe':
+            self.progress_encoder.request_keyframe()
+
+        elif command == 'update_mods':
+            if self.force_termination:
+                Logger.info('TorrentSyncer: Terminating. Ignoring the mods update.')
+                return
+
+            self.update_mods(params['mods'])
+
+    def remove_mod_torrent(self, mod):
+        """Remove the torrent of the mod from the session, saving its resume
+        data first so that the files can be reused by a new version of the mod.
+        """
+
+        if mod.torrent_handle.is_valid():
+            if self.save_resume_data(mod):
+                self.wait_for_resume_data()
+
+            # The handle is not valid anymore when the alert arrives
+            self.removal_pending.add(str(mod.torrent_handle.info_hash()))
+            self.session.remove_torrent(mod.torrent_handle)
+
+        self.mods.remove(mod)
+
+    def wait_for_removed_torrents(self):
+        """Wait until libtorrent has removed all the torrents passed to
+        remove_mod_torrent() and released their files.
+        """
+
+        deadline = time.time() + self._torrent_removal_timeout
+
+        while self.removal_pending and time.time() < deadline:
+            self.process_alerts()
+
+        if self.removal_pending:
+            Logger.error('TorrentSyncer: Timed out waiting for the removal of torrents: {}'.format(
+                ', '.join(self.removal_pending)))
+            self.removal_pending = set()
+
+    def update_mods(self, mods):
+        """Update the session to synchronize a new list of mods, without
+        stopping the torrents of the mods that did not change.
+
+        The mods are matched by their folder name. The torrents of the mods
+        that are gone or whose torrent_url has changed are removed, and the
+        torrents of the new mods are added and downloaded.
+
+        Return False if the new torrents could not be added.
+        """
+
+        current_urls = {mod.foldername: mod.torrent_url for mod in self.mods}
+        new_urls = {mod.foldername: mod.torrent_url for mod in mods}
+
+        removed = [mod for mod in self.mods if new_urls.get(mod.foldername) != mod.torrent_url]
+        added = [mod for mod in mods if current_urls.get(mod.foldername) != mod.torrent_url]
+
+        if not removed and not added:
+            Logger.info('TorrentSyncer: Mods update requested but nothing has changed')
+            return True
+
+        Logger.info('TorrentSyncer: Updating mods. Removing: {}. Adding: {}'.format(
+            ', '.join(mod.foldername for mod in removed), ', '.join(mod.foldername for mod in added)))
+
+        for mod in removed:
+            self.remove_mod_torrent(mod)
+
+        if not added:
+            return True
+
+        # A new version of a removed mod may reuse and move its files, which
+        # must not be opened by libtorrent anymore
+        self.wait_for_removed_torrents()
+
+        for mod in added:
+            mod.finished_hook_ran = False
+            mod.can_save_resume_data = False
+
+        self.prefetch_torrents(added)
+
+        for mod in added:
+            try:
+                self.prepare_libtorrent_params(mod)
+            except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
+                self.result_queue.reject({'msg': ex.args[0]})
+                self.force_termination = True
+                return False
+
+        for mod in added:
+            Logger.info('Sync: Downloading {} to {}'.format(mod.torrent_url, mod.parent_location))
+            mod.torrent_handle = self.session.add_torrent(mod.libtorrent_params)
+            mod.status = mod.torrent_handle.status()
+            self.mods.append(mod)
+
+        # The new mods are downloaded so stop when they are done, even if the
+        # session was only seeding
+        self.just_seed = False
+
+        return True
+
     def sync(self, force_sync=False, just_seed=False):
         """
         Synchronize the mod directory contents to contain exactly the files that
@@ -480,18 +769,31 @@ class TorrentSyncer(object):
         """
 
         sync_success = True
+        self.just_seed = just_seed
 
         self.result_queue.progress({'msg': 'Downloading metadata...',
                                     'log': [],
                                     }, 0)
 
-        for mod in self.mods:
-            try:
-                self.prepare_libtorrent_params(mod, force_sync, just_seed)
-            except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
-                self.result_queue.reject({'msg': ex.args[0]})
-                sync_success = False
-                return sync_success
+        self.prefetch_torrents(self.mods, force_sync)
+
+        # The content index is only built if a mod needs downloading
+        self.content_index_wanted = not just_seed
+
+        try:
+            for mod in self.mods:
+                try:
+                    self.prepare_libtorrent_params(mod, force_sync, just_seed)
+                except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
+                    self.result_queue.reject({'msg': ex.args[0]})
+                    sync_success = False
+                    return sync_success
+
+        finally:
+            self.content_index_wanted = False
+            if self.content_index:
+                self.content_index.save_hash_caches()
+                self.content_index = None
 
         if self.force_termination:
             Logger.info('Sync: Downloading process was requested to stop before starting the download.')
@@ -507,12 +809,18 @@ class TorrentSyncer(object):
         self.get_torrents_status()
 
         self.eta = Eta()
+        self.progress_encoder = progressrecord.ProgressEncoder()
+
+        self.last_resume_data_checkpoint = time.time()
 
         # Loop until state (5). All torrents finished and paused
+        # The loop is woken up by libtorrent alerts, at least every _update_interval
         while not self.is_syncing_finished():
             self.handle_messages()
 
-            self.log_session_progress()
+            status_refreshed = self.process_alerts()
+            if status_refreshed:
+                self.log_session_progress()
 
             for mod in self.mods:
                 if not mod.torrent_handle.is_valid():
@@ -521,7 +829,8 @@ class TorrentSyncer(object):
                     continue
 
                 # It is assumed that all torrents below have a valid torrent_handle
-                self.log_torrent_progress(mod.status, mod.foldername)
+                if status_refreshed:
+                    self.log_torrent_progress(mod.status, mod.foldername)
 
                 if mod.status.error:
                     Logger.info('Sync: Torrent {} in error state. Terminating. Error string: {}'.format(mod.foldername, decode_utf8(mod.status.error)))
@@ -538,18 +847,18 @@ class TorrentSyncer(object):
 
                 # Shut the torrent if we are terminating
                 if self.force_termination:
-                    if not mod.torrent_handle.is_paused():  # Don't spam logs
+                    if not mod.status.paused:  # Don't spam logs
                         Logger.info('Sync: Pausing torrent {} for termination'.format(mod.foldername))
                     self.pause_torrent(mod)
 
                 # If state (2). Request pausing the torrent to synchronize data to disk
-                if not mod.finished_hook_ran and mod.torrent_handle.is_seed():
-                    if not mod.torrent_handle.is_paused():
+                if not mod.finished_hook_ran and mod.status.is_seeding:
+                    if not mod.status.paused:
                         Logger.info('Sync: Pausing torrent {} for disk syncing'.format(mod.foldername))
                     self.pause_torrent(mod)
 
                 # If state (3). Run the hooks and maybe start waiting-seed
-                if not mod.finished_hook_ran and mod.torrent_handle.is_seed() and mod.torrent_handle.is_paused():
+                if not mod.finished_hook_ran and mod.status.is_seeding and mod.status.paused:
                     Logger.info('Sync: Torrent {} paused. Running finished_hook'.format(mod.foldername))
 
                     hook_successful = self.torrent_finished_hook(mod)
@@ -569,12 +878,12 @@ class TorrentSyncer(object):
                         self.resume_torrent(mod)
 
             # If all are in state (4)
-            if self.all_torrents_ran_finished_hooks() and not just_seed:
-                Logger.info('Sync: Pausing all torrents for syncing end.')
+            if self.all_torrents_ran_finished_hooks() and not self.just_seed:
+                if not all(mod.status.paused for mod in self.mods_with_valid_handle()):
+                    Logger.info('Sync: Pausing all torrents for syncing end.')
                 self.pause_all_torrents()
 
-            sleep(self._update_interval)
-            self.get_torrents_status()
+            self.checkpoint_resume_data()
 
         Logger.info('Sync: Main loop exited')
 
@@ -591,31 +900,97 @@ class TorrentSyncer(object):
                 self.result_queue.reject({'details': 'An error occured: Libtorrent error: {}'.format(decode_utf8(mod.status.error))})
                 sync_success = False
 
+        self.wait_for_resume_data()
+
         return sync_success
 
     def save_resume_data(self, mod):
-        """Save the resume data of the mod that will allow a faster restart in the future."""
+        """Request the resume data of the mod that will allow a faster restart in the future.
+        The data is generated asynchronously by libtorrent and written to the
+        metadata files by flush_resume_data() once all the requested data has
+        been received.
+        Return whether the data has been requested.
+        """
         if not mod.torrent_handle.is_valid():
             Logger.error('save_resume_data: mod is not valid')
-            return
+            return False
 
-        if not mod.torrent_handle.has_metadata():
+        if not mod.status.has_metadata:
             Logger.error('save_resume_data: mod has no metadata')
-            return
+            return False
 
         if not mod.can_save_resume_data:
             Logger.error('save_resume_data: mod cannot save resume data')
-            return
+            return False
+
+        if mod in self.resume_data_pending:
+            return True
 
         Logger.info('Sync: saving fast-resume metadata for mod {}'.format(mod.foldername))
 
-        # Save data that could come in handy in the future to a metadata file
-        # Set resume data for quick checksum check
-        resume_data = libtorrent.bencode(mod.torrent_handle.write_resume_data())
-        metadata_file = MetadataFile(mod.foldername)
-        metadata_file.read_data(ignore_open_errors=False)
-        metadata_file.set_torrent_resume_data(resume_data)
-        metadata_file.write_data()
+        mod.torrent_handle.save_resume_data()
+        self.resume_data_pending.add(mod)
+
+        return True
+
+    def on_resume_data_received(self, handle, resume_data):
+        """Store the resume data received from libtorrent (None on failure) and
+        write all of it once there is no more data to wait for."""
+
+        mod = self.get_mod_for_handle(handle)
+        if mod is None or mod not in self.resume_data_pending:
+            return
+
+        self.resume_data_pending.discard(mod)
+
+        if resume_data is None:
+            Logger.error('save_resume_data: Could not get resume data for mod {}'.format(mod.foldername))
+        else:
+            self.resume_data_received[mod] = resume_data
+
+        if not self.resume_data_pending:
+            self.flush_resume_data()
+
+    def flush_resume_data(self):
+        """Write all the received resume data to the metadata files at once."""
+
+        with batch_updates():
+            for mod, resume_data in self.resume_data_received.iteritems():
+                metadata_file = MetadataFile(mod.foldername)
+                metadata_file.read_data(ignore_open_errors=False)
+                metadata_file.set_torrent_resume_data(resume_data)
+                metadata_file.write_data()
+
+        self.resume_data_received = {}
+
+    def checkpoint_resume_data(self):
+        """Periodically request the resume data of the torrents that changed
+        so a crash does not require rechecking everything on the next start."""
+
+        if time.time() - self.last_resume_data_checkpoint < self._resume_data_checkpoint_interval:
+            return
+
+        self.last_resume_data_checkpoint = time.time()
+        Logger.info('Sync: Checkpointing fast-resume metadata')
+
+        for mod in self.mods_with_valid_handle():
+            if mod.can_save_resume_data and mod.status.need_save_resume:
+                self.save_resume_data(mod)
+
+    def wait_for_resume_data(self):
+        """Wait until all the requested resume data has been received and written."""
+
+        deadline = time.time() + self._resume_data_timeout
+
+        while self.resume_data_pending and time.time() < deadline:
+            self.process_alerts()
+
+        if self.resume_data_pending:
+            Logger.error('save_resume_data: Timed out waiting for resume data of mods: {}'.format(
+                ', '.join(mod.foldername for mod in self.resume_data_pending)))
+            self.resume_data_pending = set()
+
+        self.flush_resume_data()
 
     def torrent_finished_hook(self, mod):
         """Hook that is called when a torrent has been successfully and fully downloaded.
@@ -634,8 +1009,10 @@ class TorrentSyncer(object):
 
         # Remove unused files
         torrent_info = mod.torrent_handle.get_torrent_info()
-        files_list = [entry.path.decode('utf-8') for entry in torrent_info.files()]
-        cleanup_successful = check_mod_directories(files_list, mod.parent_location, on_superfluous='remove')
+        file_index = get_file_index(torrent_info)
+        files_list = list(file_index.files)
+        cleanup_successful = check_mod_directories(files_list, mod.parent_location, on_superfluous='remove',
+                                                   file_index=file_index, message_queue=self.result_queue)
 
         # Workaround. This should be moved to some kind of Mod class method or something...
         mod.files_list = files_list
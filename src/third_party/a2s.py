@@ -0,0 +1,242 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import select
+import socket
+import struct
+import time
+
+from kivy.logger import Logger
+
+
+# https://developer.valvesoftware.com/wiki/Server_queries
+SIMPLE_RESPONSE_HEADER = b'\xFF\xFF\xFF\xFF'
+A2S_INFO_REQUEST = SIMPLE_RESPONSE_HEADER + b'TSource Engine Query\x00'
+A2S_INFO_RESPONSE = b'I'
+S2C_CHALLENGE = b'A'
+
+MAX_PACKET_SIZE = 65535
+MAX_ATTEMPTS_TIMEOUT = 10  # Never wait longer than that for a single attempt
+POLL_INTERVAL = 0.1  # Check should_stop() at least that often
+
+
+class A2SParseError(Exception):
+    pass
+
+
+def _read_string(data, offset):
+    end = data.find(b'\x00', offset)
+    if end == -1:
+        raise A2SParseError('Unterminated string')
+
+    return data[offset:end].decode('utf-8', 'replace'), end + 1
+
+
+def parse_info(data):
+    """Parse the payload of an A2S_INFO response (after the header and the
+    response type byte). Return a dictionary.
+    """
+
+    try:
+        protocol = struct.unpack_from(b'<B', data, 0)[0]
+        name, offset = _read_string(data, 1)
+        map_name, offset = _read_string(data, offset)
+        folder, offset = _read_string(data, offset)
+        game, offset = _read_string(data, offset)
+        app_id, player_count, max_players, bot_count = struct.unpack_from(b'<hBBB', data, offset)
+
+    except struct.error as ex:
+        raise A2SParseError('Truncated A2S_INFO response: {}'.format(ex))
+
+    return {
+        'protocol': protocol,
+        'server_name': name,
+        'map': map_name,
+        'folder': folder,
+        'game': game,
+        'app_id': app_id,
+        'player_count': player_count,
+        'max_players': max_players,
+        'bot_count': bot_count,
+    }
+
+
+class _PendingQuery(object):
+    def __init__(self, keys, address):
+        self.keys = keys
+        self.address = address
+        self.attempts = 0
+        self.challenge = b''
+        self.sent_at = 0
+        self.deadline = 0
+
+
+class A2SQueryEngine(object):
+    """Query the A2S_INFO of many servers at once using a single UDP socket.
+
+    All the requests are sent at once and the replies are matched to the
+    servers by their source address, so querying many servers takes a single
+    round trip plus the timeout of the servers that don't respond.
+
+    A server that does not respond is queried again, up to `attempts` times,
+    waiting twice as long after each attempt.
+
+    Usage:
+        engine = A2SQueryEngine(timeout=1, attempts=3)
+        results = engine.query({'server1': ('1.2.3.4', 2303)}, callback=on_result)
+        # results == {'server1': {'player_count': 12, ..., 'rtt': 0.042}}
+    """
+
+    def __init__(self, timeout=1.0, attempts=3, backoff=2.0):
+        super(A2SQueryEngine, self).__init__()
+
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff = backoff
+
+    def _resolve(self, addresses):
+        """Return {(ip, port): [keys]} for the addresses that could be resolved."""
+
+        resolved = {}
+
+        for key, (host, port) in addresses.iteritems():
+            try:
+                resolved.setdefault((socket.gethostbyname(host), int(port)), []).append(key)
+
+            except (socket.error, ValueError) as ex:
+                Logger.error('A2SQueryEngine: Could not resolve {}: {}'.format(host, repr(ex)))
+
+        return resolved
+
+    def _send(self, sock, query, now):
+        """(Re)send the request of a query and set its next deadline."""
+
+        try:
+            sock.sendto(A2S_INFO_REQUEST + query.challenge, query.address)
+
+        except socket.error as ex:
+            Logger.error('A2SQueryEngine: Could not send to {}: {}'.format(query.address, repr(ex)))
+
+        query.attempts += 1
+        query.sent_at = now
+        query.deadline = now + min(self.timeout * self.backoff ** (query.attempts - 1), MAX_ATTEMPTS_TIMEOUT)
+
+    def _handle_packet(self, sock, query, data, now):
+        """Handle a packet received from the server of the query.
+        Return the parsed info when the query is complete, None otherwise.
+        """
+
+        if not data.startswith(SIMPLE_RESPONSE_HEADER) or len(data) < 5:
+            return None  # Split packets are not expected for A2S_INFO
+
+        response_type = data[4:5]
+
+        if response_type == S2C_CHALLENGE:
+            # A new challenge is not a failed attempt. The same one again is
+            if query.challenge != data[5:9]:
+                query.challenge = data[5:9]
+                query.attempts -= 1
+
+            self._send(sock, query, now)
+            return None
+
+        if response_type == A2S_INFO_RESPONSE:
+            info = parse_info(data[5:])
+            info['rtt'] = now - query.sent_at
+            return info
+
+        return None
+
+    def query(self, addresses, callback=None, should_stop=None):
+        """Query the servers.
+
+        addresses: {key: (host, port)}
+        callback: optional function called with (key, info) as soon as a server
+                  responds or (key, None) when it has been given up on.
+        should_stop: optional function returning True to abort the queries
+
+        Return {key: info or None}
+        """
+
+        results = {key: None for key in addresses}
+        pending = {}
+
+        for address, keys in self._resolve(addresses).iteritems():
+            pending[address] = _PendingQuery(keys, address)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+
+        try:
+            now = time.time()
+            for query in pending.itervalues():
+                self._send(sock, query, now)
+
+            while pending:
+                if should_stop and should_stop():
+                    Logger.info('A2SQueryEngine: Stopping on request')
+                    break
+
+                wait = min(query.deadline for query in pending.itervalues()) - time.time()
+                readable, _, _ = select.select([sock], [], [], max(0, min(wait, POLL_INTERVAL)))
+
+                if readable:
+                    try:
+                        data, address = sock.recvfrom(MAX_PACKET_SIZE)
+
+                    except socket.error as ex:
+                        # Windows reports ICMP port unreachable as ECONNRESET
+                        if ex.errno not in (errno.ECONNRESET, errno.EWOULDBLOCK, errno.ECONNREFUSED,
+                                            getattr(errno, 'WSAECONNRESET', None)):
+                            Logger.error('A2SQueryEngine: Receive error: {}'.format(repr(ex)))
+                        continue
+
+                    query = pending.get(address)
+                    if query is None:
+                        continue
+
+                    try:
+                        info = self._handle_packet(sock, query, data, time.time())
+
+                    except A2SParseError as ex:
+                        Logger.error('A2SQueryEngine: Bad response from {}: {}'.format(address, ex))
+                        continue
+
+                    if info is not None:
+                        del pending[address]
+                        for key in query.keys:
+                            results[key] = info
+                            if callback:
+                                callback(key, info)
+
+                now = time.time()
+                for address, query in pending.items():
+                    if query.deadline > now:
+                        continue
+
+                    if query.attempts >= self.attempts:
+                        Logger.info('A2SQueryEngine: No response from {}'.format(address))
+                        del pending[address]
+                        for key in query.keys:
+                            if callback:
+                                callback(key, None)
+                        continue
+
+                    self._send(sock, query, now)
+
+        finally:
+            sock.close()
+
+        return results
@@ -12,21 +12,15 @@
 
 from __future__ import unicode_literals
 
-import random
-import time
-import valve.source.a2s
-
 from kivy.logger import Logger
-from multiprocessing.pool import ThreadPool
+from third_party.a2s import A2SQueryEngine
 
 
 RESPONSE_UNKNOWN = '?/?'
 RESPONSE_DOWN = '-/-'
 
 CONNECTIONS_ATTEMPTS = 3
-CONNECTION_TIMEOUT = 2
-MAX_SLEEP_TIMEOUT = 0.5
-POOL_PROCESSES = 10
+CONNECTION_TIMEOUT = 1
 
 
 def format_response(answers):
@@ -39,31 +33,10 @@ def format_response_final(answers):
     return [answer if answer != RESPONSE_UNKNOWN else RESPONSE_DOWN for answer in answers]
 
 
-def query_server((server_id, server)):
-    """Query a server for its player count.
-    This function is run in a separate thread.
-    """
-
-    # Sleep to prevent flooding the network
-    time.sleep(random.random() * MAX_SLEEP_TIMEOUT)
-
-    Logger.info('query_server: [{}] Querying server {} at {}:{}'.format(
-        server_id, server.name, server.ip, int(server.port) + 1))
-
-    address = (server.ip, int(server.port) + 1)
-
-    try:
-        server = valve.source.a2s.ServerQuerier(address, timeout=CONNECTION_TIMEOUT)
-        info = server.get_info()
-        answer = '{}/{}'.format(info['player_count'], info['max_players'])
-
-    except Exception as ex:  # valve.source.a2s.NoResponseError:
-        Logger.error('query_server: [{}] Exception encountered: {}'.format(server_id, ex))
-        Logger.error('query_server: [{}] Exception details: {}'.format(server_id, repr(ex)))
+def get_query_address(server):
+    """Return the (host, port) the server answers the A2S queries on."""
+    return server.ip, int(server.port) + 1
 
-        return server_id, RESPONSE_UNKNOWN
-
-    return server_id, answer
 
 # TODO: Move all of this into a class
 force_termination = False
@@ -96,49 +69,28 @@ def query_servers(message_queue, servers):
     Logger.info('query_servers: Querying servers: {}'.format(servers))
 
     answers = [RESPONSE_UNKNOWN for _ in servers]
-    pool = ThreadPool(processes=POOL_PROCESSES)
-
-    message_queue.progress({'msg': 'progress', 'server_data': format_response(answers)}, 0)
-
-    # Check the failed servers 3 times
-    for iteration in range(CONNECTIONS_ATTEMPTS):
-        # Get all the servers that have not yet responded
-        servers_to_check = [(i, server) for i, server in enumerate(servers) if answers[i] == RESPONSE_UNKNOWN]
-
-        if servers_to_check and iteration > 0:
-            # Wait a bit in case the network was the culprit of previous failures
-            time.sleep(MAX_SLEEP_TIMEOUT)
-
-        pool_generator = pool.imap_unordered(query_server, servers_to_check)
-
-        # This is an overly complicated `for i in pool.imap_unordered`
-        # That allows catching (and ignoring) exceptions in the workers
-        while True:
-            handle_messages(message_queue)
-            if force_termination:
-                Logger.info('query_servers: Received termination request. Stopping...')
-                break
-
-            try:
-                server_id, response = pool_generator.next()
+    infos = [None for _ in servers]
+    message_queue.progress({'msg': 'progress', 'server_data': format_response(answers), 'server_info': infos}, 0)
 
-            except StopIteration:
-                break
+    def on_result(server_id, info):
+        if info is None:
+            return
 
-            except Exception:
-                raise
-                # print "Got Exception: {}, continuing...".format(type(ex))
-                # continue
+        answers[server_id] = '{}/{}'.format(info['player_count'], info['max_players'])
+        infos[server_id] = info
+        Logger.info('query_servers: [{}] Players: {}'.format(server_id, answers[server_id]))
+        message_queue.progress({'msg': 'progress', 'server_data': format_response(answers),
+                                'server_info': infos}, 0)
 
-            Logger.info('query_servers: Players: {}'.format(response))
-            answers[server_id] = response
-            message_queue.progress({'msg': 'progress', 'server_data': format_response(answers)}, 0)
+    def should_stop():
+        handle_messages(message_queue)
+        return force_termination
 
-        if force_termination:
-            Logger.info('query_servers: Received termination request. Stopping... (2)')
-            break
+    addresses = {server_id: get_query_address(server) for server_id, server in enumerate(servers)}
+    engine = A2SQueryEngine(timeout=CONNECTION_TIMEOUT, attempts=CONNECTIONS_ATTEMPTS)
+    engine.query(addresses, callback=on_result, should_stop=should_stop)
 
-    message_queue.resolve({'msg': 'Done', 'server_data': format_response_final(answers)})
+    if force_termination:
+        Logger.info('query_servers: Received termination request. Stopping...')
 
-    pool.close()
-    pool.join()
+    message_queue.resolve({'msg': 'Done', 'server_data': format_response_final(answers), 'server_info': infos})
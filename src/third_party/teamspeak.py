@@ -15,6 +15,7 @@ from __future__ import unicode_literals
 import ConfigParser
 import os
 import textwrap
+import threading
 import urllib
 import zipfile
 
@@ -26,7 +27,7 @@ from utils import system_processes
 from utils import walker
 from utils.admin import run_admin
 from utils.devmode import devmode
-from utils.hashes import sha1
+from utils.hashes import hash_files_parallel, sha1
 from utils.registry import Registry
 
 
@@ -325,11 +326,13 @@ def install_unpackaged_plugin(path):
     return install_ts3_plugin(tfr_package)
 
 
-def compute_checksums_for_ts3_plugin(zip_filename):
+def compute_checksums_for_ts3_plugin(zip_filename, message_queue=None):
     """Create a dictionary of file paths (with separators matching the OS
     separator) along with SHA1 checksums of those files.
+    The hashing progress is reported to message_queue, if given.
     """
     checksums = {}
+    members = []
 
     with zipfile.ZipFile(zip_filename) as zip_handle:
         for file_info in zip_handle.infolist():
@@ -341,16 +344,38 @@ def compute_checksums_for_ts3_plugin(zip_filename):
             if file_info.filename.endswith('/'):
                 continue
 
-            handle = zip_handle.open(file_info)
-            try:
-                checksum = sha1(handle)
-            finally:
-                handle.close()
+            members.append(file_info.filename)
 
+    # The files are hashed in parallel. Each worker thread opens the zip file
+    # once and reads all its members from its own handle
+    thread_data = threading.local()
+    zip_handles = []
+
+    def hash_member(member_name):
+        zip_handle = getattr(thread_data, 'zip_handle', None)
+        if zip_handle is None:
+            zip_handle = thread_data.zip_handle = zipfile.ZipFile(zip_filename)
+            zip_handles.append(zip_handle)
+
+        handle = zip_handle.open(member_name)
+        try:
+            return sha1(handle)
+        finally:
+            handle.close()
+
+    results = hash_files_parallel(members, hash_function=hash_member, message_queue=message_queue)
+
+    try:
+        for member_name, checksum in results:
             # The separator for zip files is always '/' internally
-            filename_os = file_info.filename.replace('/', os.path.sep)
+            filename_os = member_name.replace('/', os.path.sep)
             checksums[filename_os] = checksum
 
+    finally:
+        results.close()  # Stop the workers before closing their zip files
+        for zip_handle in zip_handles:
+            zip_handle.close()
+
     return checksums
 
 
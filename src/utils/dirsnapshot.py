@@ -0,0 +1,219 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import stat
+import struct
+
+from kivy.logger import Logger
+from utils import context
+from utils import paths
+
+
+class DirectorySnapshot(object):
+    """Persistent snapshot of the state of the files and directories of a mod
+    taken after the mod has been successfully checked.
+
+    Each entry stores the size, the modification time and the file id (inode)
+    of a file or directory. Comparing the snapshot with the current state of
+    the disk tells which entries have changed since then.
+    A directory modification time changes whenever an entry is added, removed
+    or renamed inside it so unchanged directories mean no superfluous files
+    have appeared.
+
+    The snapshot is stored in a compact binary format:
+    header, sorted utf-8 paths separated by NUL bytes, then the packed arrays
+    of the flags, sizes, modification times and file ids.
+
+    Usage:
+        snapshot = DirectorySnapshot(mod.foldername, mod.torrent_url)
+        snapshot.load()
+        changed_files, changed_dirs = snapshot.get_changed_entries(mod.parent_location)
+        ...
+        snapshot.update(mod.parent_location, files, directories)
+        snapshot.save()
+    """
+
+    file_extension = '.snapshot'
+    file_directory = 'dir_snapshots'
+    _magic = b'BALS'
+    _version = 1
+    _header = struct.Struct(b'<4sHII')  # magic, version, url length, entries count
+    _flag_directory = 1
+
+    def __init__(self, name, torrent_url):
+        super(DirectorySnapshot, self).__init__()
+
+        file_name = '{}{}'.format(name, self.file_extension)
+        self.file_path = paths.get_launcher_directory(self.file_directory, file_name)
+        self.torrent_url = torrent_url
+
+        self.entries = []  # Sorted list of (relative_path, is_directory, size, mtime, file_id)
+
+    def get_file_name(self):
+        """Returns the full path to the snapshot file"""
+        return self.file_path
+
+    def is_valid(self):
+        """Return True if the snapshot holds any data."""
+        return bool(self.entries)
+
+    def load(self):
+        """Read the snapshot from the disk.
+        A missing, corrupted or outdated snapshot is treated as an empty one.
+        """
+
+        self.entries = []
+
+        try:
+            with open(self.get_file_name(), 'rb') as file_handle:
+                data = file_handle.read()
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                Logger.error('DirectorySnapshot: Could not read {}: {}'.format(self.get_file_name(), repr(ex)))
+            return
+
+        try:
+            entries = self._unpack(data)
+
+        except (struct.error, ValueError, UnicodeDecodeError) as ex:
+            Logger.error('DirectorySnapshot: Corrupted snapshot file {}: {}'.format(self.get_file_name(), repr(ex)))
+            return
+
+        if entries is None:
+            Logger.info('DirectorySnapshot: Snapshot {} is outdated. Ignoring.'.format(self.get_file_name()))
+            return
+
+        self.entries = entries
+
+    def _unpack(self, data):
+        """Parse the binary data. Return None if the snapshot is for another
+        torrent url or another format version.
+        """
+
+        magic, version, url_length, count = self._header.unpack_from(data, 0)
+        if magic != self._magic:
+            raise ValueError('Bad magic value')
+
+        if version != self._version:
+            return None
+
+        offset = self._header.size
+        torrent_url = data[offset:offset + url_length].decode('utf-8')
+        offset += url_length
+
+        if torrent_url != self.torrent_url:
+            return None
+
+        paths_length = struct.unpack_from(b'<I', data, offset)[0]
+        offset += 4
+        paths_blob = data[offset:offset + paths_length]
+        offset += paths_length
+
+        relative_paths = paths_blob.decode('utf-8').split('\0') if count else []
+        if len(relative_paths) != count:
+            raise ValueError('Bad entries count')
+
+        arrays_format = b'<{0}B{0}q{0}d{0}Q'.format(count)
+        values = struct.unpack_from(arrays_format, data, offset)
+        flags = values[0:count]
+        sizes = values[count:2 * count]
+        mtimes = values[2 * count:3 * count]
+        file_ids = values[3 * count:4 * count]
+
+        return [(relative_path, bool(flag & self._flag_directory), size, mtime, file_id)
+                for relative_path, flag, size, mtime, file_id
+                in zip(relative_paths, flags, sizes, mtimes, file_ids)]
+
+    def _pack(self):
+        """Serialize the snapshot to a binary string."""
+
+        count = len(self.entries)
+        torrent_url = self.torrent_url.encode('utf-8')
+        paths_blob = '\0'.join(entry[0] for entry in self.entries).encode('utf-8')
+
+        flags = [self._flag_directory if entry[1] else 0 for entry in self.entries]
+        sizes = [entry[2] for entry in self.entries]
+        mtimes = [entry[3] for entry in self.entries]
+        file_ids = [entry[4] for entry in self.entries]
+
+        return b''.join([
+            self._header.pack(self._magic, self._version, len(torrent_url), count),
+            torrent_url,
+            struct.pack(b'<I', len(paths_blob)),
+            paths_blob,
+            struct.pack(b'<{0}B{0}q{0}d{0}Q'.format(count), *(flags + sizes + mtimes + file_ids)),
+        ])
+
+    def save(self):
+        """Write the snapshot to the disk."""
+
+        with paths.atomic_write(self.get_file_name()) as file_handle:
+            file_handle.write(self._pack())
+
+    def clear(self):
+        """Remove all the entries and the file on the disk."""
+
+        self.entries = []
+
+        with context.ignore_nosuchfile_exception():
+            os.unlink(self.get_file_name())
+
+    @staticmethod
+    def _get_entry(base_directory, relative_path):
+        """Return the snapshot entry for the given path or None if it does not exist."""
+
+        try:
+            file_stat = os.lstat(os.path.join(base_directory, relative_path))
+        except OSError:
+            return None
+
+        is_directory = stat.S_ISDIR(file_stat.st_mode)
+        size = 0 if is_directory else file_stat.st_size
+
+        return (relative_path, is_directory, size, file_stat.st_mtime, file_stat.st_ino)
+
+    def update(self, base_directory, files, directories):
+        """Take a new snapshot of the given relative paths."""
+
+        entries = []
+
+        for relative_path in sorted(set(files) | set(directories)):
+            entry = self._get_entry(base_directory, relative_path)
+            if entry:
+                entries.append(entry)
+
+        self.entries = entries
+
+    def get_changed_entries(self, base_directory):
+        """Compare the snapshot with the disk.
+        Return a tuple: (changed_files, changed_directories) containing the
+        relative paths of the entries that differ from the snapshot.
+        """
+
+        changed_files = []
+        changed_directories = []
+
+        for entry in self.entries:
+            relative_path, is_directory = entry[0], entry[1]
+
+            if self._get_entry(base_directory, relative_path) != entry:
+                if is_directory:
+                    changed_directories.append(relative_path)
+                else:
+                    changed_files.append(relative_path)
+
+        return changed_files, changed_directories
@@ -85,18 +85,23 @@ class Eta(object):
 
     def stringify(self, secs):
         """Format the seconds value to a human-readable form."""
-        if secs is None:
-            return self.no_eta
+        return format_eta(secs)
 
-        secs = int(secs)
-        mins, secs = divmod(secs, 60)
-        hours, mins = divmod(mins, 60)
+    def calculate_eta_secs(self, speed, total_size, downloaded_size):
+        """Return how many seconds are left or None if it can't be computed
+        yet. See calculate_eta().
+        """
+
+        self.update_speed(speed, total_size, downloaded_size)
+
+        # Don't show an ETA if at least one of the last measurements is below
+        # the minimal value. This mitigates the problem with astronomical ETA
+        # values when the torrent is just starting
+        if any(value < self.min_rate * 1024 for value in self.values):
+            return None
 
-        if hours > 0:
-            ETA = '{:d}:{:02d}:{:02d}'.format(hours, mins, secs)
-        else:
-            ETA = '{:d}:{:02d}'.format(mins, secs)
-        return ETA
+        self.update_pretend_secs()
+        return self.get_pretended_secs()
 
     def calculate_eta(self, speed, total_size, downloaded_size):
         """Return a string showing how much time is left.
@@ -108,14 +113,21 @@ class Eta(object):
         correct itself every once in a while.
         """
 
-        self.update_speed(speed, total_size, downloaded_size)
+        secs = self.calculate_eta_secs(speed, total_size, downloaded_size)
+        return self.stringify(secs)
 
-        # Don't show an ETA if at least one of the last measurements is below
-        # the minimal value. This mitigates the problem with astronomical ETA
-        # values when the torrent is just starting
-        if any(value < self.min_rate * 1024 for value in self.values):
-            return self.no_eta
 
-        self.update_pretend_secs()
-        secs = self.get_pretended_secs()
-        return self.stringify(secs)
+def format_eta(secs):
+    """Format the seconds value to a human-readable form."""
+    if secs is None:
+        return Eta.no_eta
+
+    secs = int(secs)
+    mins, secs = divmod(secs, 60)
+    hours, mins = divmod(mins, 60)
+
+    if hours > 0:
+        ETA = '{:d}:{:02d}:{:02d}'.format(hours, mins, secs)
+    else:
+        ETA = '{:d}:{:02d}'.format(mins, secs)
+    return ETA
@@ -14,12 +14,39 @@ from __future__ import unicode_literals
 
 import errno
 import hashlib
+import json
 import os
 
+from kivy.logger import Logger
 from utils import paths
 from utils import context
 
 
+# Response headers allowing to perform conditional requests later
+VALIDATOR_HEADERS = {
+    'ETag': 'If-None-Match',
+    'Last-Modified': 'If-Modified-Since',
+}
+
+
+def get_validators(response_headers):
+    """Return the validators (ETag, Last-Modified) present in the response
+    headers.
+    """
+
+    return {header: response_headers[header]
+            for header in VALIDATOR_HEADERS if response_headers.get(header)}
+
+
+def get_request_headers(validators):
+    """Return the request headers (If-None-Match, If-Modified-Since) that let
+    the server answer with 304 Not Modified if the resource has not changed.
+    """
+
+    return {VALIDATOR_HEADERS[header]: value
+            for header, value in validators.iteritems() if header in VALIDATOR_HEADERS}
+
+
 def get_cache_directory():
     return paths.get_launcher_directory('filecache')
 
@@ -31,6 +58,12 @@ def map_file(url):
     return os.path.join(get_cache_directory(), file_name)
 
 
+def map_validators_file(url):
+    """Get the path where the validators of the file should be stored."""
+
+    return map_file(url) + '.validators'
+
+
 def get_file(url):
     """Get the file contents from the cache or None if the file is not present
     in the cache.
@@ -54,24 +87,66 @@ def get_file(url):
             f.close()
 
 
-def save_file(url, data):
+def save_file(url, data, response_headers=None):
     """Save the file contents to the cache.
     The contents of the file are saved to a temporary file and then moved to
     ensure that no truncated file is present in the cache.
+    If response_headers are given, the validators they contain are saved to
+    allow conditional requests for that file.
     """
 
     # Ensure the directory exists
     paths.mkdir_p(get_cache_directory())
 
-    path = map_file(url)
-    tmp_path = path + '_tmp'
+    # The old validators must not be used with the new contents
+    with context.ignore_nosuchfile_exception():
+        os.unlink(map_validators_file(url))
 
-    f = open(tmp_path, 'wb')
-    f.write(data)
-    f.close()
+    with paths.atomic_write(map_file(url)) as f:
+        f.write(data)
 
-    # Ensure the file does not exist (would raise an exception on Windows
-    with context.ignore_nosuchfile_exception():
-        os.unlink(path)
+    save_validators(url, response_headers or {})
+
+
+def save_validators(url, response_headers):
+    """Save the ETag and Last-Modified headers of the response that returned
+    the cached file.
+    """
+
+    validators = get_validators(response_headers)
+    path = map_validators_file(url)
+
+    if not validators:
+        with context.ignore_nosuchfile_exception():
+            os.unlink(path)
+
+        return
+
+    paths.mkdir_p(get_cache_directory())
+
+    with open(path, 'wb') as f:
+        json.dump(validators, f)
+
+
+def get_conditional_headers(url):
+    """Return the request headers (If-None-Match, If-Modified-Since) that let
+    the server answer with 304 Not Modified if the cached file is up to date.
+    Return an empty dict if the file is not cached.
+    """
+
+    if not os.path.isfile(map_file(url)):
+        return {}
+
+    try:
+        with open(map_validators_file(url), 'rb') as f:
+            validators = json.load(f)
+
+    except IOError as ex:
+        if ex.errno != errno.ENOENT:
+            Logger.error('filecache: Could not read validators for {}: {}'.format(url, repr(ex)))
+        return {}
+
+    except ValueError:
+        return {}
 
-    os.rename(tmp_path, path)
+    return get_request_headers(validators)
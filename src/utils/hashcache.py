@@ -0,0 +1,162 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import errno
+import json
+import os
+
+from kivy.logger import Logger
+from utils import context
+from utils import paths
+from utils import walker
+from utils.hashes import sha1
+
+
+class HashCache(object):
+    """Persistent cache of the SHA1 checksums of files.
+
+    An entry is only valid as long as the size, the modification time and the
+    file id of the file are the same as when the checksum was computed.
+    The whole cache is discarded if the torrent url it was created for differs
+    from the one passed to the constructor.
+
+    Usage:
+        hash_cache = HashCache(mod.foldername, mod.torrent_url)
+        hash_cache.load()
+        checksum = hash_cache.sha1(path)
+        hash_cache.save()
+    """
+
+    file_extension = '.hash_cache'
+    file_directory = 'hash_cache'
+    max_entries = 200000  # Keep the file size bounded
+    _encoding = 'utf-8'
+
+    def __init__(self, name, torrent_url):
+        super(HashCache, self).__init__()
+
+        file_name = '{}{}'.format(name, self.file_extension)
+        self.file_path = paths.get_launcher_directory(self.file_directory, file_name)
+        self.torrent_url = torrent_url
+
+        self.entries = {}  # path: [size, mtime, file_id, sha1 hex digest]
+        self.used = set()  # Paths queried since the cache has been loaded
+        self.modified = False
+
+    def get_file_name(self):
+        """Returns the full path to the cache file"""
+        return self.file_path
+
+    def load(self):
+        """Read the cache from the disk.
+        A missing or corrupted cache file is treated as an empty cache.
+        """
+
+        self.entries = {}
+        self.used = set()
+        self.modified = False
+
+        try:
+            with open(self.get_file_name(), 'rb') as file_handle:
+                data = json.load(file_handle, encoding=HashCache._encoding)
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                Logger.error('HashCache: Could not read {}: {}'.format(self.get_file_name(), repr(ex)))
+            return
+
+        except ValueError:
+            Logger.error('HashCache: Corrupted cache file {}. Ignoring.'.format(self.get_file_name()))
+            return
+
+        if data.get('torrent_url') != self.torrent_url:
+            Logger.info('HashCache: Torrent url changed for {}. Invalidating the cache.'.format(self.get_file_name()))
+            self.modified = True
+            return
+
+        self.entries = data.get('entries', {})
+
+    def save(self):
+        """Write the cache to the disk if it has been modified.
+        Entries used since load() are always kept. Stale entries are kept only
+        as long as the cache does not exceed max_entries.
+        """
+
+        if not self.modified and len(self.entries) <= self.max_entries:
+            return
+
+        entries = {path: self.entries[path] for path in self.used if path in self.entries}
+        for path, entry in self.entries.iteritems():
+            if len(entries) >= self.max_entries:
+                break
+
+            entries.setdefault(path, entry)
+
+        self.entries = entries
+
+        data = {
+            'torrent_url': self.torrent_url,
+            'entries': self.entries,
+        }
+
+        with paths.atomic_write(self.get_file_name()) as file_handle:
+            json.dump(data, file_handle, encoding=HashCache._encoding)
+        self.modified = False
+
+    def clear(self):
+        """Remove all the entries and the file on the disk."""
+
+        self.entries = {}
+        self.used = set()
+        self.modified = False
+
+        with context.ignore_nosuchfile_exception():
+            os.unlink(self.get_file_name())
+
+    @staticmethod
+    def _get_file_key(path):
+        """Return the stat data that has to match for a cache entry to be valid."""
+
+        file_stat = os.stat(path)
+        file_id = walker._get_file_id(path, False)
+
+        if isinstance(file_id, tuple):
+            file_id = list(file_id)  # Make it comparable with the JSON data
+
+        return file_stat.st_size, file_stat.st_mtime, file_id
+
+    def sha1(self, path):
+        """Return the SHA1 digest of the file, just like utils.hashes.sha1.
+        The checksum is computed only if the file changed since the last time.
+        """
+
+        try:
+            size, mtime, file_id = self._get_file_key(path)
+
+        except Exception as ex:
+            # Let sha1() raise the error if the file is not readable at all
+            Logger.debug('HashCache: Could not get the file key of {}: {}'.format(path, repr(ex)))
+            return sha1(path)
+
+        self.used.add(path)
+
+        entry = self.entries.get(path)
+        if entry and entry[:3] == [size, mtime, file_id]:
+            return entry[3].decode('hex')
+
+        checksum = sha1(path)
+        self.entries[path] = [size, mtime, file_id, checksum.encode('hex')]
+        self.modified = True
+
+        return checksum
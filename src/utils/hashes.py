@@ -13,6 +13,16 @@
 from __future__ import unicode_literals
 
 import hashlib
+import io
+import multiprocessing
+import time
+
+from multiprocessing.pool import ThreadPool
+
+
+# Parallel hashing settings
+LARGE_BLOCK_SIZE = 1024 * 1024  # Multiple of the 4096 bytes NTFS and ext4 block size
+PROGRESS_INTERVAL = 0.5  # Don't flood the message queue with progress messages
 
 
 def _hash_for_file(handle, algorithm=hashlib.algorithms[0], block_size=256 * 128, human_readable=True):
@@ -68,3 +78,83 @@ def md5(handle, human_readable=False):
 
 def sha1(handle, human_readable=False):
     return hash_for_file(handle, 'sha1', human_readable=human_readable)
+
+
+def _hash_file_large_blocks(path, algorithm='sha1', block_size=LARGE_BLOCK_SIZE):
+    """Return the binary digest of the file, reading it in large blocks into
+    a single preallocated buffer.
+    """
+
+    hash_algo = hashlib.new(algorithm)
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+
+    with io.open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buf)
+            if not read:
+                break
+
+            hash_algo.update(view[:read])
+
+    return hash_algo.digest()
+
+
+def get_default_workers_count():
+    """Return the number of hashing threads to use by default."""
+
+    try:
+        return multiprocessing.cpu_count()
+
+    except NotImplementedError:
+        return 4
+
+
+def hash_files_parallel(items, algorithm='sha1', hash_function=None,
+                        message_queue=None, workers=None):
+    """Compute the digests of many files at once, on a pool of threads.
+    Both hashlib and file reads release the GIL, so using threads allows the
+    hashing to be limited by the disk speed instead of by the interpreter.
+
+    This is a generator yielding (item, digest) tuples as soon as a file has
+    been hashed, in no particular order. The digests are binary, just like
+    the ones returned by sha1().
+
+    items: the file paths to hash (or anything hash_function accepts)
+    hash_function: optional function computing the digest of an item. By
+                   default, items are treated as file paths.
+    message_queue: optional Para message queue to report progress to
+    workers: the number of threads to use. Defaults to the number of CPUs.
+
+    Exceptions raised while hashing are propagated to the caller.
+    If the generator is closed before it is exhausted, no new files will be
+    hashed.
+    """
+
+    items = list(items)
+    if not items:
+        return
+
+    if hash_function is None:
+        hash_function = lambda path: _hash_file_large_blocks(path, algorithm)
+
+    if workers is None:
+        workers = get_default_workers_count()
+
+    workers = max(1, min(workers, len(items)))
+    pool = ThreadPool(processes=workers)
+    last_progress = 0
+
+    try:
+        results = pool.imap_unordered(lambda item: (item, hash_function(item)), items)
+
+        for counter, result in enumerate(results, 1):
+            if message_queue and (time.time() - last_progress > PROGRESS_INTERVAL or counter == len(items)):
+                last_progress = time.time()
+                message_queue.progress({'msg': 'Checking files: {}/{}'.format(counter, len(items))},
+                                       float(counter) / len(items))
+
+            yield result
+
+    finally:
+        pool.terminate()
@@ -16,24 +16,98 @@ import base64
 import errno
 import json
 import os
+import struct
+import uuid
 
+from contextlib import contextmanager
 from kivy import Logger
-from utils.paths import get_launcher_directory
+from utils import context
+from utils.metadatastore import get_store
+from utils.paths import atomic_write, get_launcher_directory
+
+
+@contextmanager
+def batch_updates():
+    """Commit all the MetadataFile writes done inside the block at once, if
+    the shared MetadataStore is enabled. Otherwise, this does nothing."""
+
+    store = get_store()
+    if store is None:
+        yield
+        return
+
+    with store.transaction():
+        yield
+
+
+def get_mods_names():
+    """Return the names of all the mods that have metadata."""
+
+    names = set()
+    store = get_store()
+    if store:
+        names.update(store.get_mods_states())
+
+    directory = os.path.join(get_launcher_directory(), MetadataFile.file_directory)
+
+    try:
+        file_names = os.listdir(directory)
+
+    except OSError as ex:
+        if ex.errno != errno.ENOENT:
+            raise
+
+        file_names = []
+
+    for file_name in file_names:
+        for extension in (MetadataFile.file_extension, MetadataFile.legacy_file_extension):
+            if file_name.endswith(extension):
+                names.add(file_name[:-len(extension)])
+
+    return sorted(names)
 
 
 class MetadataFile(object):
-    """File that contains metadata about mods and is located in the root directory of each mod"""
-    """TODO: Maybe screw the whole json part and just bencode everything?"""
-    file_extension = '.launcher_meta'
+    """File that contains metadata about mods and is located in the root directory of each mod
+
+    The file is a binary container:
+        header: magic, version, index length
+        index: utf-8 JSON with the small values and the positions of the blobs
+        blobs: raw torrent content and resume data
+
+    The blobs are only read from the disk when they are accessed.
+    Files in the legacy JSON+base64 format are converted when read.
+
+    If the shared MetadataStore is enabled, the data is kept in its database
+    instead and existing files are imported into it when read.
+    """
+    file_extension = '.launcher_metadata'
+    legacy_file_extension = '.launcher_meta'
     file_directory = 'mods_metadata'
     _encoding = 'utf-8'
+    _magic = b'BALM'
+    _version = 1
+    _header = struct.Struct(b'<4sHI')  # magic, version, index length
+    _blob_keys = ('torrent_content', 'torrent_resume_data')
 
     def __init__(self, mod_name):
         super(MetadataFile, self).__init__()
 
+        self.mod_name = mod_name
+        self.store = get_store()
         file_name = '{}{}'.format(mod_name, self.file_extension)
+        legacy_file_name = '{}{}'.format(mod_name, self.legacy_file_extension)
         self.file_path = os.path.join(get_launcher_directory(), self.file_directory, file_name)
+        self.legacy_file_path = os.path.join(get_launcher_directory(), self.file_directory, legacy_file_name)
+        self._reset()
+
+    def _reset(self):
         self.data = {}
+        self.blobs = {}  # key: value of the blobs already read or set
+        self._blob_positions = {}  # key: (offset, length) of the blobs not read yet
+        self._modified_blobs = set()
+        self._generation = None
+        self._modified = True
 
     def get_file_name(self):
         """Returns the full path to the metadata file"""
@@ -45,16 +119,199 @@ class MetadataFile(object):
         If ignore_open_errors is set to True, it will ignore errors while opening the file
         (which may not exist along with the whole directory if the torrent is downloaded for the first time)"""
 
-        self.data = {}
+        self._reset()
+        if self.store and self._read_from_store():
+            return
+
         try:
-            with open(self.get_file_name(), 'rb') as file_handle:
-                self.data = json.load(file_handle, encoding=MetadataFile._encoding)
-        except (IOError, ValueError):
+            try:
+                self._read_index()
+
+            except IOError as ex:
+                if ex.errno != errno.ENOENT or not os.path.exists(self.legacy_file_path):
+                    raise
+
+                self._migrate_legacy_file()
+
+        except (IOError, ValueError, struct.error) as ex:
+            self._reset()
+
             if ignore_open_errors:
-                pass
+                return
             else:
+                if isinstance(ex, struct.error):
+                    raise ValueError('Corrupted metadata file: {}'.format(ex))
                 raise
 
+        if self.store:
+            self._import_to_store()
+
+    def _read_from_store(self):
+        """Read the data from the MetadataStore, leaving the blobs in the database.
+        Return False if the mod is not present in the database."""
+
+        entry = self.store.read(self.mod_name)
+        if entry is None:
+            return False
+
+        self._generation, self.data, available_blobs = entry
+        self._blob_positions = {key_name: None for key_name in available_blobs}
+        self._modified = False
+        return True
+
+    def _import_to_store(self):
+        """Move the data read from the metadata file to the MetadataStore."""
+
+        Logger.info('MetadataFile: Importing {} to the metadata store'.format(self.get_file_name()))
+
+        try:
+            self._fetch_unread_blobs()
+
+        except (IOError, ValueError, struct.error) as ex:
+            Logger.error('MetadataFile: Could not import {}: {}'.format(self.get_file_name(), repr(ex)))
+            return
+
+        self._modified = True
+        self._modified_blobs = set(self.blobs)
+        self.write_data()
+
+        for file_path in (self.get_file_name(), self.legacy_file_path):
+            with context.ignore_nosuchfile_exception():
+                os.unlink(file_path)
+
+    def _read_index_from(self, file_handle):
+        """Read the header and the index from the beginning of the opened file.
+        Return the index and the positions of the blobs in the file.
+        """
+
+        magic, version, index_length = self._header.unpack(file_handle.read(self._header.size))
+        if magic != self._magic or version != self._version:
+            raise ValueError('Unknown metadata file format: {}'.format(self.get_file_name()))
+
+        index = json.loads(file_handle.read(index_length), encoding=MetadataFile._encoding)
+
+        data_offset = self._header.size + index_length
+        blob_positions = {key: (data_offset + offset, length)
+                          for key, (offset, length) in index['blobs'].iteritems()}
+
+        return index, blob_positions
+
+    def _read_index(self):
+        """Read the header and the index of the file, leaving the blobs on disk."""
+
+        with open(self.get_file_name(), 'rb') as file_handle:
+            index, self._blob_positions = self._read_index_from(file_handle)
+
+        self.data = index['data']
+        self._generation = index['generation']
+        self._modified = False
+
+    def _read_blob(self, key_name):
+        if not self.store:
+            return self._read_blob_from_file(key_name)
+
+        self._blob_positions.pop(key_name)
+        value = self.store.read_blob(self.mod_name, key_name, self._generation)
+        self.blobs[key_name] = value
+        return value
+
+    def _read_blob_from_file(self, key_name):
+        """Read a blob from the disk.
+        If the file has been rewritten in the meantime, the blob of its new
+        version is used, as in _fetch_unread_blobs(). None is returned if the
+        new version does not contain the blob anymore.
+        """
+
+        try:
+            with open(self.get_file_name(), 'rb') as file_handle:
+                index, blob_positions = self._read_index_from(file_handle)
+
+                if index['generation'] != self._generation:
+                    Logger.warning('MetadataFile: {} changed on disk. Reading {} from its new version'.format(
+                        self.get_file_name(), key_name))
+
+                    if key_name not in blob_positions:
+                        del self._blob_positions[key_name]  # Removed by the new version
+                        return None
+                else:
+                    blob_positions = self._blob_positions
+
+                offset, length = blob_positions[key_name]
+                file_handle.seek(offset)
+                value = file_handle.read(length)
+
+        except (IOError, ValueError, KeyError, struct.error) as ex:
+            Logger.error('MetadataFile: Could not read {} from {}: {}'.format(
+                key_name, self.get_file_name(), repr(ex)))
+            return None
+
+        if len(value) != length:
+            Logger.error('MetadataFile: {} is truncated in {}'.format(key_name, self.get_file_name()))
+            return None
+
+        del self._blob_positions[key_name]
+        self.blobs[key_name] = value
+        return value
+
+    def _fetch_unread_blobs(self):
+        """Read all the blobs that have not been read yet, so that the file can
+        be rewritten without losing them.
+
+        If the file has been rewritten in the meantime, the blobs of its new
+        version are used. Raise an exception if the blobs can't be read.
+        """
+
+        if not self._blob_positions:
+            return
+
+        with open(self.get_file_name(), 'rb') as file_handle:
+            index, blob_positions = self._read_index_from(file_handle)
+
+            if index['generation'] != self._generation:
+                Logger.warning('MetadataFile: {} changed on disk. Keeping its {}'.format(
+                    self.get_file_name(), ', '.join(sorted(self._blob_positions))))
+            else:
+                blob_positions = self._blob_positions
+
+            for key_name in self._blob_positions:
+                if key_name not in blob_positions:
+                    continue  # Removed by the new version
+
+                offset, length = blob_positions[key_name]
+                file_handle.seek(offset)
+                value = file_handle.read(length)
+
+                if len(value) != length:
+                    raise ValueError('Corrupted metadata file: {} is truncated in {}'.format(
+                        key_name, self.get_file_name()))
+
+                self.blobs[key_name] = value
+
+        self._blob_positions = {}
+
+    def _migrate_legacy_file(self):
+        """Read the legacy JSON file and convert it to the binary format."""
+
+        Logger.info('MetadataFile: Converting {} to the binary format'.format(self.legacy_file_path))
+
+        with open(self.legacy_file_path, 'rb') as file_handle:
+            self.data = json.load(file_handle, encoding=MetadataFile._encoding)
+
+        for key_name in self._blob_keys:
+            value = self.data.pop(key_name, None)
+            if value:
+                try:
+                    self.blobs[key_name] = base64.b64decode(value)
+                except TypeError:
+                    pass
+
+        try:
+            self.write_data()
+            os.unlink(self.legacy_file_path)
+
+        except (IOError, OSError) as ex:
+            Logger.error('MetadataFile: Could not convert {}: {}'.format(self.legacy_file_path, repr(ex)))
+
     def _create_missing_directories(self, dirpath):
         """Creates missing directories. Does not raise exceptions if the path already exists
 
@@ -66,56 +323,101 @@ class MetadataFile(object):
                 raise
 
     def write_data(self):
-        """Open the file and write the contents of the internal data variable to the file"""
+        """Open the file and write the contents of the internal data variable to the file.
+        Nothing is written if the data has not been modified since it was read.
+        The file is replaced atomically so it is never left half-written."""
+
+        if not self._modified:
+            return
+
+        if self.store:
+            generation = uuid.uuid4().hex
+            blobs = {key_name: self.blobs[key_name] for key_name in self._modified_blobs}
+            self.store.write(self.mod_name, generation, self.data, blobs)
+
+            self._generation = generation
+            self._modified = False
+            self._modified_blobs = set()
+            return
+
         self._create_missing_directories(os.path.dirname(self.get_file_name()))
 
-        json_string = json.dumps(self.data, encoding=MetadataFile._encoding, indent=2)
-        with open(self.get_file_name(), 'wb') as file_handle:
-            file_handle.write(json_string)
+        # Fetch the blobs that have not been read yet before the file is replaced
+        self._fetch_unread_blobs()
 
-    def set_base64_key(self, key_name, value):
-        self.data[key_name] = base64.b64encode(value)
+        blobs_index = {}
+        blobs = []
+        offset = 0
+        for key_name, value in sorted(self.blobs.iteritems()):
+            if value is None:
+                continue
 
-    def get_base64_key(self, key_name):
-        data = self.data.setdefault(key_name, None)
-        if data:
-            try:
-                data = base64.b64decode(data)
-            except TypeError:
-                data = None
+            blobs_index[key_name] = (offset, len(value))
+            blobs.append(value)
+            offset += len(value)
+
+        generation = uuid.uuid4().hex
+        index = json.dumps({'generation': generation, 'data': self.data, 'blobs': blobs_index},
+                           encoding=MetadataFile._encoding).encode(MetadataFile._encoding)
+
+        with atomic_write(self.get_file_name(), fsync=True) as file_handle:
+            file_handle.write(self._header.pack(self._magic, self._version, len(index)))
+            file_handle.write(index)
+            for value in blobs:
+                file_handle.write(value)
+
+        self._generation = generation
+        self._modified = False
+
+    def _set_key(self, key_name, value):
+        if key_name not in self.data or self.data[key_name] != value:
+            self.data[key_name] = value
+            self._modified = True
+
+    def set_blob_key(self, key_name, value):
+        self._blob_positions.pop(key_name, None)
+
+        if key_name not in self.blobs or self.blobs[key_name] != value:
+            self.blobs[key_name] = value
+            self._modified_blobs.add(key_name)
+            self._modified = True
+
+    def get_blob_key(self, key_name):
+        if key_name in self._blob_positions:
+            return self._read_blob(key_name)
 
-        return data
+        return self.blobs.get(key_name)
 
     # Accessors and mutators below
 
     def set_torrent_url(self, url):
-        self.data['torrent_url'] = url
+        self._set_key('torrent_url', url)
 
     def get_torrent_url(self):
         return self.data.setdefault('torrent_url', '')
 
     def set_torrent_resume_data(self, data):
-        self.set_base64_key('torrent_resume_data', data)
+        self.set_blob_key('torrent_resume_data', data)
 
     def get_torrent_resume_data(self):
-        return self.get_base64_key('torrent_resume_data')
+        return self.get_blob_key('torrent_resume_data')
 
     def set_torrent_content(self, torrent_content):
-        self.set_base64_key('torrent_content', torrent_content)
+        self.set_blob_key('torrent_content', torrent_content)
 
     def get_torrent_content(self):
-        return self.get_base64_key('torrent_content')
+        return self.get_blob_key('torrent_content')
 
     def set_dirty(self, is_dirty):
         """Mark the torrent as dirty - in an inconsistent state (download started, we don't know what's exactly on disk)"""
-        self.data['dirty'] = bool(is_dirty)
+        self._set_key('dirty', bool(is_dirty))
         Logger.info('set_dirty: Mod {}: {}'.format(self.get_file_name(), is_dirty))
 
     def get_dirty(self):
         return self.data.setdefault('dirty', False)
 
     def set_force_creator_complete(self, complete):
-        self.data['force_creator_complete'] = complete
+        self._set_key('force_creator_complete', complete)
 
     def get_force_creator_complete(self):
         return self.data.setdefault('force_creator_complete', False)
@@ -0,0 +1,216 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from kivy.logger import Logger
+from utils import paths
+from utils.devmode import devmode
+
+
+class MetadataStore(object):
+    """Single SQLite database holding the metadata of all the mods.
+
+    This is an alternative to keeping one metadata file per mod. It is used
+    by MetadataFile when enabled with "metadata_store": "sqlite" in devmode.
+
+    Writes done inside a transaction() block are committed all at once.
+    """
+
+    file_directory = 'mods_metadata'
+    file_name = 'metadata.sqlite'
+    _blob_keys = ('torrent_content', 'torrent_resume_data')
+
+    def __init__(self, file_path=None):
+        super(MetadataStore, self).__init__()
+
+        self.file_path = file_path or paths.get_launcher_directory(self.file_directory, self.file_name)
+        self._connection = None
+        self._transaction_depth = 0
+        self._lock = threading.RLock()
+
+    def get_file_name(self):
+        """Returns the full path to the database file"""
+        return self.file_path
+
+    def _get_connection(self):
+        if self._connection is None:
+            paths.mkdir_p(os.path.dirname(self.get_file_name()))
+            self._connection = sqlite3.connect(self.get_file_name(), timeout=30, check_same_thread=False)
+            self._connection.text_factory = unicode
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS mods (
+                    name TEXT PRIMARY KEY,
+                    generation TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    torrent_url TEXT NOT NULL DEFAULT '',
+                    dirty INTEGER NOT NULL DEFAULT 0,
+                    force_creator_complete INTEGER NOT NULL DEFAULT 0,
+                    torrent_content BLOB,
+                    torrent_resume_data BLOB
+                )''')
+            self._connection.commit()
+
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @contextmanager
+    def transaction(self):
+        """Group all the writes done inside the block in a single commit.
+        Blocks can be nested. Changes are rolled back on exception.
+        """
+
+        with self._lock:
+            connection = self._get_connection()
+            self._transaction_depth += 1
+
+            try:
+                yield
+
+            except Exception:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    connection.rollback()
+                raise
+
+            else:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    connection.commit()
+
+    def read(self, name):
+        """Return a tuple (generation, data, available_blobs) for the mod or
+        None if the mod is not in the database.
+        The blobs themselves are not read. Use read_blob() to get them.
+        """
+
+        with self._lock:
+            row = self._get_connection().execute(
+                'SELECT generation, data, torrent_content IS NOT NULL, torrent_resume_data IS NOT NULL '
+                'FROM mods WHERE name = ?', (name,)).fetchone()
+
+        if row is None:
+            return None
+
+        generation, data, has_content, has_resume_data = row
+        available_blobs = [key for key, present in zip(self._blob_keys, (has_content, has_resume_data)) if present]
+
+        return generation, json.loads(data), available_blobs
+
+    def read_blob(self, name, key_name, generation):
+        """Return the blob or None if the entry has been changed since it was
+        read with the given generation.
+        """
+
+        if key_name not in self._blob_keys:
+            raise KeyError(key_name)
+
+        with self._lock:
+            row = self._get_connection().execute(
+                'SELECT generation, {} FROM mods WHERE name = ?'.format(key_name), (name,)).fetchone()
+
+        if row is None or row[0] != generation:
+            Logger.warning('MetadataStore: {} changed in the database. Discarding {}'.format(name, key_name))
+            return None
+
+        return bytes(row[1]) if row[1] is not None else None
+
+    def write(self, name, generation, data, blobs):
+        """Insert or update the mod entry.
+        Only the blobs contained in the blobs dictionary are modified.
+        """
+
+        for key_name in blobs:
+            if key_name not in self._blob_keys:
+                raise KeyError(key_name)
+
+        columns = {
+            'generation': generation,
+            'data': json.dumps(data),
+            'torrent_url': data.get('torrent_url', ''),
+            'dirty': bool(data.get('dirty', False)),
+            'force_creator_complete': bool(data.get('force_creator_complete', False)),
+        }
+
+        for key_name, value in blobs.iteritems():
+            columns[key_name] = sqlite3.Binary(value) if value is not None else None
+
+        names = sorted(columns)
+        values = [columns[column] for column in names]
+
+        with self.transaction():
+            connection = self._get_connection()
+            connection.execute('INSERT OR IGNORE INTO mods (name, generation, data) VALUES (?, ?, ?)',
+                               (name, generation, columns['data']))
+            connection.execute('UPDATE mods SET {} WHERE name = ?'.format(
+                               ', '.join('{} = ?'.format(column) for column in names)), values + [name])
+
+    def delete(self, name):
+        with self.transaction():
+            self._get_connection().execute('DELETE FROM mods WHERE name = ?', (name,))
+
+    def get_mods_states(self):
+        """Return the state of all the mods without reading the blobs.
+        {name: {'torrent_url': url, 'dirty': bool, 'force_creator_complete': bool,
+                'has_resume_data': bool}}
+        """
+
+        with self._lock:
+            rows = self._get_connection().execute(
+                'SELECT name, torrent_url, dirty, force_creator_complete, '
+                'IFNULL(LENGTH(torrent_resume_data), 0) > 0 FROM mods').fetchall()
+
+        return {name: {'torrent_url': torrent_url,
+                       'dirty': bool(dirty),
+                       'force_creator_complete': bool(force_creator_complete),
+                       'has_resume_data': bool(has_resume_data)}
+                for name, torrent_url, dirty, force_creator_complete, has_resume_data in rows}
+
+    def get_dirty_mods(self):
+        """Return the names of the mods marked as dirty."""
+        return sorted(name for name, state in self.get_mods_states().iteritems() if state['dirty'])
+
+    def get_complete_mods(self):
+        """Return the names of the mods that were last marked as fully synced.
+        The files on disk still need to be checked to be sure they are complete.
+        """
+
+        return sorted(name for name, state in self.get_mods_states().iteritems()
+                      if not state['dirty'] and (state['has_resume_data'] or state['force_creator_complete']))
+
+
+_store = None
+
+
+def get_store():
+    """Return the shared MetadataStore if it is enabled or None otherwise."""
+
+    global _store
+
+    if devmode.get_metadata_store() != 'sqlite':
+        return None
+
+    if _store is None:
+        _store = MetadataStore()
+
+    return _store
@@ -19,6 +19,9 @@ import platform
 import sys
 import unicode_helpers
 
+from contextlib import contextmanager
+from utils import context
+
 
 def is_pyinstaller_bundle():
     """Is the program ran as a PyInstaller bundle? (as opposed to a simple python script)."""
@@ -287,3 +290,45 @@ def mkdir_p(path):
             pass
         else:
             raise
+
+
+def replace_file(source, destination):
+    """Rename source to destination, replacing destination if it exists."""
+
+    # Ensure the file does not exist (would raise an exception on Windows)
+    with context.ignore_nosuchfile_exception():
+        os.unlink(destination)
+
+    os.rename(source, destination)
+
+
+@contextmanager
+def atomic_write(path, fsync=False):
+    """Write the file through a temporary file that replaces path only once
+    the with block has completed, so that no truncated file is ever present.
+
+    Usage:
+    with atomic_write(path) as file_handle:
+        file_handle.write(data)
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        mkdir_p(directory)
+
+    tmp_path = path + '_tmp'
+
+    try:
+        with open(tmp_path, 'wb') as file_handle:
+            yield file_handle
+
+            if fsync:
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+
+    except Exception:
+        with context.ignore_nosuchfile_exception():
+            os.unlink(tmp_path)
+        raise
+
+    replace_file(tmp_path, path)
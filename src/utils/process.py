@@ -108,9 +108,11 @@ class ConnectionWrapper(object):
         ) = state
 
     def _send_message(self, msg):
-        '''Send message through the pipe and note the pipe is broken on error.'''
+        '''Send message through the pipe and note the pipe is broken on error.
+        The message may be sent from several threads at once (hashing workers).'''
         try:
-            self.con.send(msg)
+            with self.lock:
+                self.con.send(msg)
         except (EOFError, IOError):
             Logger.error('ConnectionWrapper: _send_message({}): Broken pipe! The remote process has probably terminated.'.format(self.action_name))
             self.broken_pipe = True
@@ -199,12 +201,187 @@ class ConnectionWrapper(object):
             return None
 
 
+def _worker_host_main(con):
+    """Main loop of the WorkerHost process.
+    Run the requested actions one after another, using the same connection
+    to communicate with the Para of each action.
+    """
+
+    lock = Lock()
+    Logger.info('WorkerHost: Started')
+
+    while True:
+        try:
+            if not con.poll(1):
+                if not system_processes.is_parent_running(retval_on_error=True):
+                    break
+
+                continue
+
+            message = con.recv()
+
+        except (EOFError, IOError):
+            break
+
+        command = message.get('command')
+        if command == '__exit__':
+            break
+
+        if command != '__run__':
+            continue  # A message sent to an action that has already finished
+
+        params = message['params']
+        messagequeue = ConnectionWrapper(params['action_name'], lock, con, use_threads=False)
+
+        try:
+            params['func'](messagequeue, *params['args'])
+
+        except Exception:
+            stacktrace = "".join(_format_exc_info(*sys.exc_info()))
+            Logger.error('WorkerHost: Action {} raised an exception:\n{}'.format(params['action_name'], stacktrace))
+
+        finally:
+            messagequeue._send_message({'action': params['action_name'], 'status': '__finished__'})
+
+        if messagequeue.broken_pipe:
+            break
+
+    Logger.info('WorkerHost: Exiting')
+
+
+class WorkerHost(object):
+    """Long-lived process running Para actions one at a time.
+    The modules imported by the actions (Kivy, libtorrent, etc...) stay
+    loaded between actions so starting an action is almost instantaneous.
+
+    Use get_worker_host() to get the shared instance.
+    """
+
+    def __init__(self):
+        super(WorkerHost, self).__init__()
+
+        self.parent_conn, child_conn = Pipe()
+        self.process = Process(target=_worker_host_main, args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        self.busy = False
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def start_action(self, func, args, action_name):
+        """Run the action in the host process.
+        Return a HostedAction standing for the child process of the action.
+        """
+
+        self.busy = True
+        self.parent_conn.send({'command': '__run__',
+                               'params': {'func': func, 'args': args, 'action_name': action_name}})
+
+        return HostedAction(self)
+
+    def stop(self, timeout=5):
+        try:
+            self.parent_conn.send({'command': '__exit__'})
+        except (EOFError, IOError):
+            pass
+
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class HostedAction(object):
+    """Replacement for the child process of a Para whose action is run by a
+    WorkerHost. The action is considered alive until the host reports it has
+    finished or until the host process dies.
+    """
+
+    def __init__(self, host):
+        super(HostedAction, self).__init__()
+        self.host = host
+        self.finished = False
+
+    @property
+    def exitcode(self):
+        if self.finished:
+            return 0
+
+        return self.host.process.exitcode
+
+    def is_alive(self):
+        return not self.finished and self.host.is_alive()
+
+    def join(self, timeout=None):
+        """Wait for the action to finish. Messages sent by the action in the
+        meantime are discarded."""
+
+        deadline = time.time() + (timeout or 0)
+
+        while self.is_alive():
+            remaining = deadline - time.time()
+
+            try:
+                if remaining <= 0 or not self.host.parent_conn.poll(remaining):
+                    break
+
+                message = self.host.parent_conn.recv()
+
+            except (EOFError, IOError):
+                break
+
+            if message.get('status') == '__finished__':
+                self.finished = True
+
+    def release(self):
+        """Let the host run other actions."""
+
+        if self.finished:
+            self.host.busy = False
+
+
+_worker_host = None
+
+
+def get_worker_host():
+    """Return the WorkerHost, (re)starting it if needed.
+    Return None if the host is busy running another action.
+    """
+
+    global _worker_host
+
+    if _worker_host is None or not _worker_host.is_alive():
+        if _worker_host is not None:
+            Logger.error('WorkerHost: The worker host process has died. Restarting it.')
+
+        _worker_host = WorkerHost()
+
+    if _worker_host.busy:
+        return None
+
+    return _worker_host
+
+
+def stop_worker_host():
+    """Stop the WorkerHost process if it is running."""
+
+    global _worker_host
+
+    if _worker_host is not None:
+        _worker_host.stop()
+        _worker_host = None
+
+
 class Para(object):
 
     JOIN_TIMEOUT_GRANULATION = 0.1
     HANDLE_MESSAGES_INTERVAL = 0.1
+    MAX_MESSAGES_PER_TICK = 10000  # Don't freeze the GUI if the child floods the pipe
+    # Progress messages holding only these keys are status updates that a
+    # newer update fully replaces. Any other progress message is always handled
+    STATUS_PROGRESS_KEYS = frozenset(('msg', 'mods', 'log', 'progress_record'))
 
-    def __init__(self, func, args, action_name, use_threads=False):
+    def __init__(self, func, args, action_name, use_threads=False, use_host=False):
         """
         constructor of the Para
 
@@ -213,6 +390,9 @@ class Para(object):
             args: the args which are passed to the function func contains
             action_name: identifier which is used in the messagequeue. Actually
                          this is optional.
+            use_threads: run the function in a thread instead of a process
+            use_host: run the function in the shared WorkerHost process if
+                      it is not busy, instead of spawning a new process
 
         Returns:
             The Para
@@ -223,6 +403,8 @@ class Para(object):
         self.args = copy.deepcopy(args)
         self.action_name = action_name
         self.use_threads = use_threads
+        self.use_host = use_host
+        self.hosted = False
         self.current_child_process = None
         self.progress_handler = []
         self.resolve_handler = []
@@ -234,6 +416,16 @@ class Para(object):
         self.lastdata = None  # cached data from the last resolve or reject
         self.lastprogress = None  # cached progress data from the last resolve or reject
 
+        # Message pump statistics
+        self.stats = {
+            'queue_depth': 0,  # Messages read during the last tick
+            'max_queue_depth': 0,
+            'messages_received': 0,
+            'messages_dropped': 0,  # Progress messages replaced by a newer one
+            'tick_latency': 0.0,  # How late was the last tick, in seconds
+            'max_tick_latency': 0.0,
+        }
+
     def is_open(self):
         """simple method which queries whenever the para is still in processing."""
         return not (self.state == 'resolved' or self.state == 'rejected')
@@ -307,7 +499,12 @@ class Para(object):
 
     def _reset(self):
         # self.current_child_process.join()
-        self.parent_conn.close()
+        if self.hosted:
+            # The connection belongs to the worker host
+            self.current_child_process.release()
+        else:
+            self.parent_conn.close()
+
         self.current_child_process = None
         Clock.unschedule(self.handle_messagequeue)
         Logger.debug('Para: {} joined process'.format(self))
@@ -318,6 +515,11 @@ class Para(object):
         if params:
             msg['params'] = params
 
+        if self.hosted and self.current_child_process is None:
+            # The worker host may be running another action by now
+            Logger.debug('Para: {} Not sending {} to a finished action'.format(self, command))
+            return
+
         self.parent_conn.send(msg)
 
     def request_termination(self):
@@ -336,6 +538,17 @@ class Para(object):
         self.reject_handler = []
 
     def run(self):
+        if self.use_host and not self.use_threads:
+            host = get_worker_host()
+
+            if host:
+                Logger.debug('Para: {} running in the worker host'.format(self))
+                self.hosted = True
+                self.parent_conn = host.parent_conn
+                self.current_child_process = host.start_action(self.func, self.args, self.action_name)
+                Clock.schedule_interval(self.handle_messagequeue, self.HANDLE_MESSAGES_INTERVAL)
+                return
+
         self.lock = Lock()
         self.parent_conn, child_conn = Pipe()
         self.messagequeue = ConnectionWrapper(self.action_name, self.lock, child_conn, use_threads=self.use_threads)
@@ -350,30 +563,88 @@ class Para(object):
         self.current_child_process = p
         Clock.schedule_interval(self.handle_messagequeue, self.HANDLE_MESSAGES_INTERVAL)
 
-    def handle_messagequeue(self, dt):
-        con = self.parent_conn
-        progress = None
+    def _handle_closing(self):
+        """Try to join the child process if it has resolved or rejected.
+        Return True if the para is in a closing phase."""
 
-        # handle closing phases first
-        # try to join the child process
         if self.state == 'closingforreject':
             self.current_child_process.join(self.JOIN_TIMEOUT_GRANULATION)
             if not self.current_child_process.is_alive():
                 self._call_reject_handler(self.lastprogress)
 
-            return
+            return True
 
         if self.state == 'closingforresolve':
             self.current_child_process.join(self.JOIN_TIMEOUT_GRANULATION)
             if not self.current_child_process.is_alive():
                 self._call_resolve_handler(self.lastprogress)
 
+            return True
+
+        return False
+
+    def _is_status_update(self, message):
+        """Return True if the message is a progress message that only updates
+        the status shown to the user.
+        """
+
+        if message['status'] != 'progress':
+            return False
+
+        data = message.get('data')
+        if not isinstance(data, dict):
+            return data is None
+
+        return self.STATUS_PROGRESS_KEYS.issuperset(data)
+
+    def _receive_messages(self):
+        """Read all the messages waiting in the pipe.
+        Only the last status update of each action is kept, all the other
+        messages are kept. Reading stops at the first resolve or reject message.
+        Return the list of messages to handle, in order.
+        """
+
+        con = self.parent_conn
+        messages = []
+        last_progress = {}  # action: index in messages
+        received = 0
+
+        while received < self.MAX_MESSAGES_PER_TICK and con.poll():
+            message = con.recv()
+            received += 1
+
+            if self._is_status_update(message):
+                action = message.get('action')
+                if action in last_progress:
+                    messages[last_progress[action]] = None
+                    self.stats['messages_dropped'] += 1
+
+                last_progress[action] = len(messages)
+
+            messages.append(message)
+
+            if message['status'] in ('resolve', 'reject', '__finished__'):
+                break
+
+        self.stats['queue_depth'] = received
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], received)
+        self.stats['messages_received'] += received
+
+        return [message for message in messages if message is not None]
+
+    def handle_messagequeue(self, dt):
+        latency = max(0.0, dt - self.HANDLE_MESSAGES_INTERVAL)
+        self.stats['tick_latency'] = latency
+        self.stats['max_tick_latency'] = max(self.stats['max_tick_latency'], latency)
+
+        # handle closing phases first
+        # try to join the child process
+        if self._handle_closing():
             return
 
-        if con.poll():
-            progress = con.recv()
+        messages = self._receive_messages()
 
-        if progress:
+        for progress in messages:
             if progress['status'] == 'progress':
                 self._call_progress_handler(progress)
 
@@ -393,6 +664,15 @@ class Para(object):
 
             elif progress['status'] == '__ping__':
                 self.send_message('__pong__')
+
+            elif progress['status'] == '__finished__':
+                # The worker host finished running the action
+                self.current_child_process.finished = True
+
+        if messages:
+            # Don't wait for the next tick to start joining the child
+            self._handle_closing()
+
         else:
             if not self.current_child_process.is_alive():
 
@@ -437,12 +717,13 @@ def _protected_call(messagequeue, function, action_name, *args, **kwargs):
         Logger.info('Para: Closing thread/process for: {}'.format(action_name))
 
 
-def protected_para(func, args, action_name, then=None, use_threads=False):
+def protected_para(func, args, action_name, then=None, use_threads=False, use_host=False):
     """Wrap a function with a catch-all try/except clause.
     On error a reject() is sent.
     """
 
-    para = Para(_protected_call, (func, action_name) + args, action_name, use_threads=use_threads)
+    para = Para(_protected_call, (func, action_name) + args, action_name,
+                use_threads=use_threads, use_host=use_host)
 
     # Optionally bind events before running the Para
     if then:
@@ -19,6 +19,7 @@ if __name__ == '__main__':
     site.addsitedir(os.path.abspath(os.path.join(file_directory, '..')))
 
 
+import errno
 import os
 import paramiko
 import posixpath
@@ -26,13 +27,17 @@ import random
 import socket
 
 from kivy.logger import Logger
-from paramiko.sftp import CMD_EXTENDED
-from utils.context import ignore_nosuchfile_ioerror
+from multiprocessing.pool import ThreadPool
+from paramiko.sftp import CMD_EXTENDED, CMD_REMOVE, CMD_STATUS
 
 
 # The remote is using a posix style paths ('/')
 join = posixpath.join
 
+# Let the server send more data before waiting for the acknowledgements
+SFTP_WINDOW_SIZE = 16 * 1024 * 1024
+UPLOAD_CONNECTIONS = 4
+
 
 class RemoteMissingKeyPolicy(paramiko.client.MissingHostKeyPolicy):
     def __init__(self, *args, **kwargs):
@@ -52,6 +57,59 @@ class RemoteMissingKeyPolicy(paramiko.client.MissingHostKeyPolicy):
         return
 
 
+class _ResponseCollector(object):
+    """Stands for the file object of pipelined requests. Paramiko hands it the
+    responses to its requests, whenever they are read.
+    """
+
+    def __init__(self):
+        self.responses = {}  # request number: (type, message)
+
+    def _async_response(self, t, msg, num):
+        self.responses[num] = (t, msg)
+
+
+class PipeliningSFTPClient(paramiko.SFTPClient):
+    """SFTP client able to send several requests before reading their
+    responses.
+    """
+
+    def pipeline_requests(self, requests):
+        """Send all the requests at once and only then wait for the responses,
+        so that they cost a single round trip instead of one per request.
+
+        The SFTP protocol lets the server process the requests and send the
+        responses in any order, so a request must not depend on the result of
+        another one. The responses are matched to the requests by their number
+        and stored as soon as they are read, so none of them is ever discarded.
+
+        requests: list of (command, args) tuples
+        Return a list containing, for each request, None if it succeeded or
+        the IOError it failed with.
+        """
+
+        collector = _ResponseCollector()
+        numbers = [self._async_request(collector, command, *args) for command, args in requests]
+
+        while any(number not in collector.responses for number in numbers):
+            self._read_response()
+
+        results = []
+        for number in numbers:
+            t, msg = collector.responses[number]
+
+            try:
+                if t == CMD_STATUS:
+                    self._convert_status(msg)
+
+                results.append(None)
+
+            except IOError as ex:
+                results.append(ex)
+
+        return results
+
+
 class RemoteConection(object):
     """The class that allows talking to an SFTP server and execute commands
     remotely. Maybe it can be replaced by a more generic class with more
@@ -149,7 +207,7 @@ class RemoteConection(object):
             self.client = client
 
             Logger.info('RemoteConection.connect: Opening SFTP connection.')
-            self.sftp = client.open_sftp()
+            self.sftp = self._open_sftp()
             client = None
 
             Logger.info('RemoteConection.connect: All done!')
@@ -158,6 +216,29 @@ class RemoteConection(object):
             if client is not None:
                 client.close()
 
+    def _open_sftp(self):
+        """Open a new SFTP channel on the existing SSH connection."""
+
+        return PipeliningSFTPClient.from_transport(self.client.get_transport(), window_size=SFTP_WINDOW_SIZE)
+
+    def rename_overwrite_many(self, renames):
+        """Move files atomically using a single round trip.
+        The renames may be done in any order.
+        renames: list of (old_path, new_path) tuples
+        Return a list containing None or the IOError raised, for each rename.
+        """
+
+        Logger.info('RemoteConection.rename_overwrite_many: Moving {} files'.format(len(renames)))
+
+        requests = [(CMD_EXTENDED, ('posix-rename@openssh.com',
+                                    self.sftp._adjust_cwd(old_path),
+                                    self.sftp._adjust_cwd(new_path)))
+                    for old_path, new_path in renames]
+        results = self.sftp.pipeline_requests(requests)
+
+        Logger.info('RemoteConection.rename_overwrite_many: Done')
+        return results
+
     def rename_overwrite(self, old_path, new_path):
         """Move a file atomically, just like with the mv command."""
 
@@ -190,22 +271,63 @@ class RemoteConection(object):
             path, tmp_path))
 
         with self.sftp.file(tmp_path, 'wb') as f:
+            f.set_pipelined(True)
             f.write(contents)
 
         if keep_backups:
-            format_backup = lambda x: path + '_bak{}'.format('' if x == 0 else x)
+            try:
+                self._rotate_backups(path, keep_backups)
 
-            # Rotate the backups
-            for i in range(keep_backups - 1, 0, -1):
-                with ignore_nosuchfile_ioerror():
-                    self.rename_overwrite(format_backup(i - 1), format_backup(i))
+            except IOError as ex:
+                Logger.error('RemoteConection.save_file: Could not rotate the backups: {}'.format(repr(ex)))
+                try:
+                    self.remove_file(tmp_path)
+                except IOError:
+                    pass
 
-            with ignore_nosuchfile_ioerror():
-                self.rename_overwrite(path, format_backup(0))
+                raise
 
         self.rename_overwrite(tmp_path, path)
+
         Logger.info('RemoteConection.save_file: Saved.')
 
+    def _rotate_backups(self, path, keep_backups):
+        """Shift the backups of the file and move the file to the first backup.
+
+        The renames are pipelined, so they must not depend on each other. The
+        backups are moved to temporary names first and then to their final
+        names, so that a backup is never overwritten by another one before it
+        has been moved away.
+        Raise the first IOError other than a missing backup. The file stays in
+        place in that case.
+        """
+
+        format_backup = lambda x: path + '_bak{}'.format('' if x == 0 else x)
+        suffix = '.rot{}'.format(self._random_str())
+
+        backups = [(format_backup(i - 1), format_backup(i)) for i in range(keep_backups - 1, 0, -1)]
+        results = self.rename_overwrite_many([(source, destination + suffix) for source, destination in backups])
+
+        # Missing backups are fine
+        moved = [backup for backup, error in zip(backups, results) if error is None]
+        errors = [error for error in results if error and error.errno != errno.ENOENT]
+
+        if errors:
+            self.rename_overwrite_many([(destination + suffix, source) for source, destination in moved])
+            raise errors[0]
+
+        renames = [(destination + suffix, destination) for _, destination in moved]
+        renames.append((path, format_backup(0)))
+        results = self.rename_overwrite_many(renames)
+
+        errors = [error for error in results if error and error.errno != errno.ENOENT]
+        if errors:
+            # Put the file back in place before giving up
+            if results[-1] is None:
+                self.rename_overwrite(format_backup(0), path)
+
+            raise errors[0]
+
     def put_file(self, local_file_path, remote_file_path):
         """Save a local file to the remote path, atomically.
         The file will be saved to a temporary name and when it is fully
@@ -215,19 +337,71 @@ class RemoteConection(object):
         remote_file_path_tmp = '{}.tmp{}'.format(remote_file_path, self._random_str())
         Logger.info('RemoteConection.put_file: Saving local file {} to {} using temporary name {}'.format(
             local_file_path, remote_file_path, remote_file_path_tmp))
-        local_stat = os.stat(local_file_path)
 
         # Put the file to a temporary name so it doesn't trigger any scripts
         # while it is uploading and in case the transfer fails mid-upload
-        remote_stat = self.sftp.put(local_file_path, remote_file_path_tmp, confirm=True)
-
-        if local_stat.st_size != remote_stat.st_size:
-            raise Exception("Uploaded file size differs from local file size. Upload failed.")
+        self._upload_file(self.sftp, local_file_path, remote_file_path_tmp)
 
         # Rename the file to the requested name
         self.rename_overwrite(remote_file_path_tmp, remote_file_path)
         Logger.info('RemoteConection.put_file: Saved.')
 
+    def _upload_file(self, sftp, local_file_path, remote_file_path):
+        local_stat = os.stat(local_file_path)
+
+        # The writes are pipelined by paramiko
+        remote_stat = sftp.put(local_file_path, remote_file_path, confirm=True)
+
+        if local_stat.st_size != remote_stat.st_size:
+            raise Exception("Uploaded file size differs from local file size. Upload failed.")
+
+    def _upload_files_group(self, uploads):
+        """Upload the files one after another on a separate SFTP channel."""
+
+        sftp = self._open_sftp()
+
+        try:
+            for local_file_path, _, remote_file_path_tmp in uploads:
+                self._upload_file(sftp, local_file_path, remote_file_path_tmp)
+
+        finally:
+            sftp.close()
+
+    def put_files(self, files, connections=UPLOAD_CONNECTIONS):
+        """Save local files to the remote paths, atomically, several files at
+        a time.
+        files: list of (local_file_path, remote_file_path) tuples
+
+        The files are uploaded to temporary names using several SFTP channels
+        sharing the same SSH connection. When all the uploads are done, all the
+        files are renamed to the requested names at once.
+        """
+
+        if not files:
+            return
+
+        uploads = [(local_file_path, remote_file_path, '{}.tmp{}'.format(remote_file_path, self._random_str()))
+                   for local_file_path, remote_file_path in files]
+        connections = max(1, min(connections, len(uploads)))
+
+        Logger.info('RemoteConection.put_files: Saving {} files using {} connections'.format(
+            len(uploads), connections))
+
+        pool = ThreadPool(processes=connections)
+
+        try:
+            pool.map(self._upload_files_group, [uploads[i::connections] for i in range(connections)])
+
+        finally:
+            pool.terminate()
+
+        results = self.rename_overwrite_many([(tmp_path, remote_file_path)
+                                              for _, remote_file_path, tmp_path in uploads])
+        for error in results:
+            if error:
+                raise error
+
+        Logger.info('RemoteConection.put_files: Saved.')
 
     def list_files(self, path):
         """Return the list of files in the path, just like os.listdir()."""
@@ -241,6 +415,18 @@ class RemoteConection(object):
         self.sftp.unlink(path)
         Logger.info('RemoteConection.remove_file: Removed.')
 
+    def remove_files(self, paths):
+        """Unlink remote files using a single round trip."""
+
+        Logger.info('RemoteConection.remove_files: Removing {}'.format(', '.join(paths)))
+
+        results = self.sftp.pipeline_requests([(CMD_REMOVE, (self.sftp._adjust_cwd(path),)) for path in paths])
+        for error in results:
+            if error:
+                raise error
+
+        Logger.info('RemoteConection.remove_files: Removed.')
+
 
 if __name__ == '__main__':
     pass
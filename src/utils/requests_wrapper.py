@@ -13,14 +13,38 @@
 from __future__ import unicode_literals
 
 import requests
+import threading
 
 from kivy.logger import Logger
 
 
+_session = None
+_session_lock = threading.Lock()
+SESSION_POOL_SIZE = 16
+
+
 class DownloadException(Exception):
     pass
 
 
+def get_session():
+    """Return a requests.Session shared by the whole process.
+    Using it allows reusing connections (keep-alive) between requests, even
+    when they are made from multiple threads.
+    """
+
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=SESSION_POOL_SIZE,
+                                                    pool_maxsize=SESSION_POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+
+    return _session
+
 
 def download_url(*args, **kwargs):
     """Helper function that adds our error handling to requests.get.
@@ -47,13 +71,16 @@ def _download_url(domain, *args, **kwargs):
     """
     Helper function that adds our error handling to requests.get.
     Feel free to refactor it.
+    Pass session=get_session() to reuse connections.
     """
 
     if not domain:
         domain = "the domain"
 
+    session = kwargs.pop('session', None) or requests
+
     try:
-        res = requests.get(*args, **kwargs)
+        res = session.get(*args, **kwargs)
     except requests.exceptions.ConnectionError as ex:
         try:
             reason_errno = ex.message.reason.errno
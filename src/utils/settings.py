@@ -74,10 +74,13 @@ class Settings(Model):
         {'name': 'launcher_basedir'},
         {'name': 'launcher_moddir'},
         {'name': 'mod_data_cache', 'defaultValue': None},
+        {'name': 'mod_data_digest', 'defaultValue': None},
+        {'name': 'mod_data_validators', 'defaultValue': {}},
         {'name': 'max_upload_speed', 'defaultValue': 0},
         {'name': 'max_download_speed', 'defaultValue': 0},
         {'name': 'seeding_type', 'defaultValue': 'while_not_playing'},
         {'name': 'selected_server', 'defaultValue': False},
+        {'name': 'sort_servers_by_latency', 'defaultValue': False},
         {'name': 'run_trackir', 'defaultValue': True},
         {'name': 'run_opentrack', 'defaultValue': True},
         {'name': 'run_facetracknoir', 'defaultValue': True},
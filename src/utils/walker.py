@@ -14,6 +14,17 @@ from __future__ import unicode_literals
 
 import os
 import platform
+import stat
+
+try:
+    from os import scandir
+
+except ImportError:
+    try:
+        from scandir import scandir
+
+    except ImportError:
+        scandir = None
 
 
 if platform.system() == 'Windows':
@@ -24,15 +35,21 @@ else:
     pass
 
 
+FILE_READ_ATTRIBUTES = 0x80
+
+
 def _get_file_id_windows(filename, is_directory):
     """Get the data that identifies a windows file.
     This is done by returning a tuple containing the drive serial unmber, and
     two file indexes.
+    The file is only opened to read its attributes, which is cheaper than
+    opening it for reading and works even if the file is opened by someone else.
     """
 
     try:
-        hFile = win32file.CreateFile(filename, win32file.GENERIC_READ,
-            win32file.FILE_SHARE_READ, None, win32file.OPEN_EXISTING,
+        hFile = win32file.CreateFile(filename, FILE_READ_ATTRIBUTES,
+            win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE | win32file.FILE_SHARE_DELETE,
+            None, win32file.OPEN_EXISTING,
             win32file.FILE_FLAG_BACKUP_SEMANTICS if is_directory else 0,
             None)
 
@@ -50,14 +67,12 @@ def _get_file_id_windows(filename, is_directory):
 
 def _get_file_id_unix(filename, is_directory):
     """Get the data that identifies a unix file.
-    This is done by returning the inode number. Maybe returning a drive ID as
-    well would be good.
+    This is done by returning the device and the inode number of the file.
+    Symlinks are followed.
     """
 
-    # TODO: TEST THIS!!!
-    # Especially how this behaves with symlinks
-    # and with files on different drives that might get the same inode number
-    return os.lstat(filename).st_ino
+    file_stat = os.stat(filename)
+    return file_stat.st_dev, file_stat.st_ino
 
 
 # Select the right function depending on the operating system
@@ -66,26 +81,100 @@ if platform.system() == 'Windows':
 
 else:
     _get_file_id = _get_file_id_unix
-    raise NotImplementedError('Linux support for the walking directories has not yet been tested!')
 
 
-def walk(top, topdown=True, onerror=None, followlinks=False):
+class _ListdirEntry(object):
+    """Minimal replacement for scandir's DirEntry, used when scandir is not
+    available. The stat data is cached just like DirEntry does.
+    """
+
+    __slots__ = ('name', 'path', '_lstat', '_stat')
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._lstat = None
+        self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+
+        if not follow_symlinks or not stat.S_ISLNK(self._lstat.st_mode):
+            return self._lstat
+
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+
+        return self._stat
+
+    def inode(self):
+        return self.stat(follow_symlinks=False).st_ino
+
+    def is_symlink(self):
+        try:
+            return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+        except OSError:
+            return False
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def __repr__(self):
+        return '<_ListdirEntry {}>'.format(self.name)
+
+
+def _list_directory(path):
+    """Return the entries of the directory, with their stat data cached."""
+
+    if scandir is not None:
+        return list(scandir(path))
+
+    return [_ListdirEntry(path, name) for name in os.listdir(path)]
+
+
+def _get_directory_id(path, entry):
+    """Return the identifier of the directory. On POSIX systems, the stat data
+    already present in the entry is reused.
+    """
+
+    if _get_file_id is _get_file_id_unix and entry is not None:
+        directory_stat = entry.stat()
+        return directory_stat.st_dev, directory_stat.st_ino
+
+    return _get_file_id(path, True)
+
+
+def walk_entries(top, onerror=None, followlinks=False):
     """A junction aware walker that keeps traversed inodes and will NOT get into
     an infinite loop.
-    """
 
-    if topdown == False:
-        raise Exception('You can\'t use topdown=False in this walker!')
+    Yield (dirpath, dir_entries, file_entries) tuples, top-down. The entries
+    provide name, path, is_dir(), is_symlink() and stat(), and keep their
+    stat data so it can be reused without querying the disk again.
+    Removing entries from dir_entries prevents descending into them.
+    """
 
     visited = set()
+    stack = [(top, None)]
+
+    while stack:
+        dirpath, directory_entry = stack.pop()
 
-    for entry in os.walk(top, topdown, onerror, followlinks):
         try:
-            file_id = _get_file_id(entry[0], True)
+            file_id = _get_directory_id(dirpath, directory_entry)
 
             if file_id in visited:
                 # Already visited, skip it!
-                del entry[1][:]  # Clear the directory so we don't descend into it
                 continue
 
             visited.add(file_id)
@@ -95,4 +184,73 @@ def walk(top, topdown=True, onerror=None, followlinks=False):
         except Exception:
             pass
 
-        yield entry
+        try:
+            entries = _list_directory(dirpath)
+
+        except OSError as ex:
+            if onerror is not None:
+                onerror(ex)
+
+            continue
+
+        dir_entries = []
+        file_entries = []
+
+        for entry in entries:
+            if entry.is_dir():
+                dir_entries.append(entry)
+            else:
+                file_entries.append(entry)
+
+        yield dirpath, dir_entries, file_entries
+
+        for entry in reversed(dir_entries):
+            if followlinks or not entry.is_symlink():
+                stack.append((entry.path, entry))
+
+
+def walk(top, topdown=True, onerror=None, followlinks=False):
+    """A junction aware walker that keeps traversed inodes and will NOT get into
+    an infinite loop.
+    This is a drop-in replacement for os.walk(). See walk_entries().
+    """
+
+    if topdown == False:
+        raise Exception('You can\'t use topdown=False in this walker!')
+
+    for dirpath, dir_entries, file_entries in walk_entries(top, onerror, followlinks):
+        dirnames = [entry.name for entry in dir_entries]
+        yield dirpath, dirnames, [entry.name for entry in file_entries]
+
+        # Honor the changes made to dirnames by the caller
+        if len(dirnames) != len(dir_entries) or \
+           any(entry.name != name for entry, name in zip(dir_entries, dirnames)):
+            kept = set(dirnames)
+            dir_entries[:] = [entry for entry in dir_entries if entry.name in kept]
+
+
+def stat_files(top, base_directory=None, followlinks=True):
+    """Return the stat data of all the files below top, without following
+    symlinks, as a dictionary {relative_path: stat_result}. The paths are
+    relative to base_directory, which defaults to top.
+    The data comes from walking the directories so no additional query is
+    needed for each file.
+    """
+
+    if base_directory is None:
+        base_directory = top
+
+    files_stats = {}
+
+    for dirpath, _, file_entries in walk_entries(top, followlinks=followlinks):
+        relative_dirpath = os.path.relpath(dirpath, base_directory)
+
+        for entry in file_entries:
+            try:
+                files_stats[os.path.normpath(os.path.join(relative_dirpath, entry.name))] = \
+                    entry.stat(follow_symlinks=False)
+
+            except OSError:
+                pass
+
+    return files_stats
@@ -13,14 +13,18 @@
 
 from __future__ import unicode_literals
 
+import kivy.app
 
+from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.logger import Logger
-from kivy.properties import ListProperty, ObjectProperty
+from kivy.properties import BooleanProperty, ListProperty, ObjectProperty
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.boxlayout import BoxLayout
+from sync import serverstatus
 from sync.modmanager import ModManager
 from sync.server import Server
+from utils.devmode import devmode
 from view.behaviors import HoverBehavior
 from view.errorpopup import ErrorPopup, DEFAULT_ERROR_MESSAGE
 
@@ -73,28 +77,86 @@ class ServerListScrolled(ScrollView, HoverBehavior):
     selection_callback = ObjectProperty(None)
     servers = ListProperty()
     server_widgets = []
+    sort_by_latency = BooleanProperty(False)
+
+    refresh_check_interval = 5
 
     def hover(self, *args):
         if self.refresh_widget:
             self.refresh_widget.opacity = int(self.mouse_hover)
 
+        if self.mouse_hover:
+            self.status_store.mark_viewed()
+
     def __init__(self, *args, **kwargs):
         super(ServerListScrolled, self).__init__(**kwargs)
 
         self.bind(servers=self.set_servers)
         self.bind(mouse_hover=self.hover)
         self.para = None
+        self.queried_servers = ()
         self.refresh_widget = None
+        self.status_store = serverstatus.get_store()
+
+        settings = kivy.app.App.get_running_app().settings
+        self.sort_by_latency = devmode.get_sort_servers_by_latency(default=settings.get('sort_servers_by_latency'))
+        settings.bind(on_change=self.on_settings_change)
+
+        Clock.schedule_interval(self.refresh_if_needed, self.refresh_check_interval)
+
+    def show_status(self):
+        """Show the last known status of the servers."""
+
+        for widget in self.server_widgets:
+            if widget.server.name is None:
+                continue  # The "just run Arma" entry
+
+            players = self.status_store.format_players(widget.server)
+            widget.ids.server_players.text = players
+
+            if widget.server.selected:
+                self.text = '{} ({})'.format(widget.server.name, players)
+
+    def update_status(self, data, final):
+        """Store the A2S info received from the servers and show it.
+        Servers that did not respond yet keep showing their last known status
+        until the query is finished.
+        """
+
+        for server, info in zip(self.queried_servers, data.get('server_info', [])):
+            if info is not None or final:
+                self.status_store.update(server, info)
+
+        self.show_status()
+
+    def on_settings_change(self, instance, key, old_value, value):
+        if key != 'sort_servers_by_latency':
+            return
+
+        self.sort_by_latency = value
+        if self.server_widgets:
+            self.order_widgets()
+
+    def refresh_if_needed(self, dt):
+        if self.para is None and self.servers and self.status_store.should_refresh(self.servers):
+            Logger.info('ServerListScrolled: Refreshing the servers status in the background')
+            self.query_servers()
 
     def on_query_servers_resolve(self, data):
         Logger.info('on_query_servers_resolve: {}'.format(data))
         self.para = None
 
-        for server, widget, data in zip(self.servers, self.server_widgets, data.get('server_data', [])):
-            widget.ids.server_players.text = data
+        self.update_status(data, final=True)
+
+        try:
+            self.status_store.save()
 
-            if server.selected:
-                self.text = '{} ({})'.format(server.name, data)
+        except (IOError, OSError) as ex:
+            Logger.error('on_query_servers_resolve: Could not save the servers status: {}'.format(repr(ex)))
+
+        # Don't move the entries under the mouse cursor
+        if self.sort_by_latency and not self.mouse_hover:
+            self.order_widgets()
 
         if self.refresh_widget:
             self.refresh_widget.enable()
@@ -110,12 +172,7 @@ class ServerListScrolled(ScrollView, HoverBehavior):
 
     def on_query_servers_progress(self, data, progress):
         Logger.info('on_query_servers_progress: {}'.format(data))
-
-        for server, widget, data in zip(self.servers, self.server_widgets, data.get('server_data', [])):
-            widget.ids.server_players.text = data
-
-            if server.selected:
-                self.text = '{} ({})'.format(server.name, data)
+        self.update_status(data, final=False)
 
     def query_servers(self):
         if self.refresh_widget:
@@ -125,7 +182,10 @@ class ServerListScrolled(ScrollView, HoverBehavior):
         if self.para:
             self.para.request_termination_and_break_promises()
 
-        self.para = ModManager.query_servers((tuple(server for server in self.servers),))
+        self.status_store.refresh_started()
+        self.queried_servers = tuple(server for server in self.servers)
+
+        self.para = ModManager.query_servers((self.queried_servers,))
         self.para.then(self.on_query_servers_resolve,
                        self.on_query_servers_reject,
                        self.on_query_servers_progress)
@@ -140,29 +200,48 @@ class ServerListScrolled(ScrollView, HoverBehavior):
         if self.selection_callback:
             self.selection_callback(selected.server.name)
 
-    def set_servers(self, instance, servers):
+    def order_widgets(self):
+        """Add the entries to the list, sorted by latency if requested."""
+
         self.ids.servers_list.clear_widgets()
+        self.ids.servers_list.add_widget(self.refresh_widget)
+
+        servers = self.servers
+        if self.sort_by_latency:
+            servers = self.status_store.sort_by_latency(servers)
+
+        widgets = {id(widget.server): widget for widget in self.server_widgets}
+        for server in servers:
+            self.ids.servers_list.add_widget(widgets[id(server)])
+
+        # The "just run Arma" entry is always the last one
+        self.ids.servers_list.add_widget(self.server_widgets[-1])
+
+    def set_servers(self, instance, servers):
         self.server_widgets = []
 
         # Refresh widget
         self.refresh_widget = ServerListRefresh(self)
-        self.ids.servers_list.add_widget(self.refresh_widget)
 
         # All the servers
         for server in self.servers:
             server_entry = ServerListEntry(self, server)
             self.server_widgets.append(server_entry)
-            self.ids.servers_list.add_widget(server_entry)
 
         # Add the "just run Arma" entry
         dummy_server = Server(None, None, None)
         dummy_server.selected = not any(s.selected for s in  self.servers)
         dummy_server_entry = ServerListEntry(self, dummy_server)
         self.server_widgets.append(dummy_server_entry)
-        self.ids.servers_list.add_widget(dummy_server_entry)
 
-        # Check people on the servers
-        self.query_servers()
+        self.order_widgets()
+
+        # Show the cached data right away and check people on the servers
+        self.show_status()
+        self.status_store.mark_viewed()
+
+        if not all(self.status_store.is_fresh(server) for server in self.servers):
+            self.query_servers()
 
 
 Builder.load_file('kv/serverlist.kv')
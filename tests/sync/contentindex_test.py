@@ -0,0 +1,144 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from sync import contentindex
+from sync.contentindex import ContentIndex
+from tests.sync.faketorrent import FakeTorrentInfo, write_files
+from utils import hashcache
+
+OLD_FILES = [
+    ('@old/addons/a.pbo', b'a' * 100),
+    ('@old/addons/b.pbo', b'b' * 50),
+    ('@old/empty.txt', b''),
+]
+
+NEW_FILES = [
+    ('@new/addons/renamed_a.pbo', b'a' * 100),
+    ('@new/addons/c.pbo', b'c' * 70),
+    ('@new/empty.txt', b''),
+]
+
+
+class ContentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.mods_directory = os.path.join(self.directory, 'mods')
+
+        self.patcher = patch.object(hashcache.paths, 'get_launcher_directory',
+                                    lambda *relative: os.path.join(self.directory, 'launcher', *relative))
+        self.patcher.start()
+
+        write_files(self.mods_directory, OLD_FILES)
+        self.content_index = ContentIndex()
+        self.content_index.add_torrent(FakeTorrentInfo(OLD_FILES, 64), self.mods_directory, '@old', 'old_url')
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def get_path(self, relative_path):
+        return os.path.join(self.mods_directory, relative_path)
+
+    def read_file(self, relative_path):
+        with open(self.get_path(relative_path), 'rb') as f:
+            return f.read()
+
+    def test_empty_files_are_not_indexed(self):
+        self.assertEqual(len(self.content_index.entries), 2)
+
+    def test_find_file(self):
+        checksum = FakeTorrentInfo(OLD_FILES, 64).files()[0].filehash.to_bytes()
+
+        self.assertEqual(self.content_index.find_file(checksum, 100), self.get_path('@old/addons/a.pbo'))
+        self.assertIsNone(self.content_index.find_file(checksum, 99))
+        self.assertIsNone(self.content_index.find_file(checksum, 100, exclude_path=self.get_path('@old/addons/a.pbo')))
+
+    def test_modified_file_is_not_found(self):
+        checksum = FakeTorrentInfo(OLD_FILES, 64).files()[0].filehash.to_bytes()
+        write_files(self.mods_directory, [('@old/addons/a.pbo', b'x' * 100)])
+
+        self.assertIsNone(self.content_index.find_file(checksum, 100))
+
+    def test_reuse_files_copies(self):
+        message_queue = Mock()
+
+        reused = self.content_index.reuse_files(FakeTorrentInfo(NEW_FILES, 64), self.mods_directory,
+                                                message_queue=message_queue)
+
+        self.assertEqual(reused, 100)
+        self.assertEqual(self.read_file('@new/addons/renamed_a.pbo'), b'a' * 100)
+        self.assertFalse(os.path.exists(self.get_path('@new/addons/c.pbo')))
+        self.assertFalse(os.path.exists(self.get_path('@new/addons/renamed_a.pbo.reuse_tmp')))
+        self.assertEqual(message_queue.progress.call_count, 1)
+
+        # The source is left untouched and is not linked to the copy
+        self.assertEqual(self.read_file('@old/addons/a.pbo'), b'a' * 100)
+        write_files(self.mods_directory, [('@new/addons/renamed_a.pbo', b'x' * 100)])
+        self.assertEqual(self.read_file('@old/addons/a.pbo'), b'a' * 100)
+
+    def test_reuse_files_skips_files_with_the_right_size(self):
+        write_files(self.mods_directory, [('@new/addons/renamed_a.pbo', b'x' * 100)])
+
+        reused = self.content_index.reuse_files(FakeTorrentInfo(NEW_FILES, 64), self.mods_directory)
+
+        self.assertEqual(reused, 0)
+        self.assertEqual(self.read_file('@new/addons/renamed_a.pbo'), b'x' * 100)
+
+    def test_reuse_files_replaces_files_with_a_wrong_size(self):
+        write_files(self.mods_directory, [('@new/addons/renamed_a.pbo', b'x' * 10)])
+
+        reused = self.content_index.reuse_files(FakeTorrentInfo(NEW_FILES, 64), self.mods_directory)
+
+        self.assertEqual(reused, 100)
+        self.assertEqual(self.read_file('@new/addons/renamed_a.pbo'), b'a' * 100)
+
+    def test_reuse_files_swapped_files(self):
+        swapped_files = [
+            ('@old/addons/a.pbo', b'b' * 50),
+            ('@old/addons/b.pbo', b'a' * 100),
+        ]
+
+        reused = self.content_index.reuse_files(FakeTorrentInfo(swapped_files, 64), self.mods_directory)
+
+        self.assertEqual(reused, 150)
+        self.assertEqual(self.read_file('@old/addons/a.pbo'), b'b' * 50)
+        self.assertEqual(self.read_file('@old/addons/b.pbo'), b'a' * 100)
+
+    @unittest.skipUnless(hasattr(os, 'link'), 'Hard links are created with win32file on Windows')
+    def test_reuse_files_hardlinks(self):
+        reused = self.content_index.reuse_files(FakeTorrentInfo(NEW_FILES, 64), self.mods_directory,
+                                                use_hardlinks=True)
+
+        self.assertEqual(reused, 100)
+        self.assertEqual(os.stat(self.get_path('@new/addons/renamed_a.pbo')).st_ino,
+                         os.stat(self.get_path('@old/addons/a.pbo')).st_ino)
+
+    def test_reuse_files_copies_when_hardlinks_fail(self):
+        with patch.object(contentindex, '_link_file', Mock(side_effect=OSError('Not supported'))) as link_file:
+            reused = self.content_index.reuse_files(FakeTorrentInfo(NEW_FILES, 64), self.mods_directory,
+                                                    use_hardlinks=True)
+
+        link_file.assert_called_once_with(self.get_path('@old/addons/a.pbo'),
+                                          self.get_path('@new/addons/renamed_a.pbo.reuse_tmp'))
+        self.assertEqual(reused, 100)
+        self.assertEqual(self.read_file('@new/addons/renamed_a.pbo'), b'a' * 100)
+        self.assertNotEqual(os.stat(self.get_path('@new/addons/renamed_a.pbo')).st_ino,
+                            os.stat(self.get_path('@old/addons/a.pbo')).st_ino)
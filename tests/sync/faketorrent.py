@@ -0,0 +1,123 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+
+from collections import namedtuple
+
+FileSlice = namedtuple('FileSlice', ['file_index', 'offset', 'size'])
+
+
+class FakeHash(object):
+    def __init__(self, digest):
+        self.digest = digest
+
+    def is_all_zeros(self):
+        return self.digest == b'\0' * 20
+
+    def to_bytes(self):
+        return self.digest
+
+
+class FakeFileEntry(object):
+    def __init__(self, path, offset, size, filehash):
+        self.path = path.encode('utf-8')
+        self.offset = offset
+        self.size = size
+        self.pad_file = False
+        self.filehash = FakeHash(filehash)
+
+
+class FakeFiles(list):
+    def at(self, index):
+        return self[index]
+
+
+class FakeTorrentInfo(object):
+    """Mimics the parts of libtorrent.torrent_info used by the mod syncing
+    code, for a torrent of the given files.
+
+    files: [(relative path, contents), ...]
+    """
+
+    def __init__(self, files, piece_length):
+        self.piece_length_value = piece_length
+        self.entries = FakeFiles()
+        data = b''
+
+        for path, contents in files:
+            self.entries.append(FakeFileEntry(path, len(data), len(contents), hashlib.sha1(contents).digest()))
+            data += contents
+
+        self.total_size = len(data)
+        self.piece_hashes = [hashlib.sha1(data[offset:offset + piece_length]).digest()
+                             for offset in range(0, len(data), piece_length)]
+        self.info_hash_value = hashlib.sha1(b''.join(self.piece_hashes)).digest()
+
+    def files(self):
+        return self.entries
+
+    def piece_length(self):
+        return self.piece_length_value
+
+    def num_pieces(self):
+        return len(self.piece_hashes)
+
+    def piece_size(self, piece):
+        return min(self.piece_length_value, self.total_size - piece * self.piece_length_value)
+
+    def hash_for_piece(self, piece):
+        return self.piece_hashes[piece]
+
+    def info_hash(self):
+        return FakeHash(self.info_hash_value)
+
+    def map_block(self, piece, offset, size):
+        start = piece * self.piece_length_value + offset
+        end = start + size
+        slices = []
+
+        for index, entry in enumerate(self.entries):
+            slice_start = max(start, entry.offset)
+            slice_end = min(end, entry.offset + entry.size)
+
+            if slice_start < slice_end:
+                slices.append(FileSlice(index, slice_start - entry.offset, slice_end - slice_start))
+
+        return slices
+
+
+def write_files(base_directory, files):
+    """Write the files of a FakeTorrentInfo to the disk."""
+
+    for path, contents in files:
+        full_path = os.path.join(base_directory, path)
+
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+
+        with open(full_path, 'wb') as f:
+            f.write(contents)
+
+
+def get_file_sizes(torrent_info, base_directory):
+    """Return the 'file sizes' resume data entry for the files on the disk."""
+
+    file_sizes = []
+    for entry in torrent_info.files():
+        file_stat = os.stat(os.path.join(base_directory, entry.path.decode('utf-8')))
+        file_sizes.append([file_stat.st_size, int(file_stat.st_mtime)])
+
+    return file_sizes
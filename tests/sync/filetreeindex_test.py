@@ -0,0 +1,112 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from collections import OrderedDict
+from mock import Mock, patch
+from sync import filetreeindex
+from sync.filetreeindex import FileTreeIndex
+from sync.integrity import check_mod_directories
+
+
+class FileTreeIndexTest(unittest.TestCase):
+    files_list = [os.path.join('@mod', 'Addons', 'File.pbo'),
+                  os.path.join('@mod', 'mod.cpp'),
+                  os.path.join('@mod', '.sync', 'state')]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.patcher = patch.object(filetreeindex.paths, 'get_launcher_directory',
+                                    lambda *relative: os.path.join(self.directory, 'launcher', *relative))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_sets(self):
+        file_index = FileTreeIndex.from_files_list(self.files_list)
+
+        self.assertEqual(file_index.top_dirs_nocase, {'@mod'})
+        self.assertEqual(file_index.dirs, {'@mod', os.path.join('@mod', 'Addons'), os.path.join('@mod', '.sync')})
+        self.assertEqual(file_index.files_nocase, {os.path.join('@mod', 'addons', 'file.pbo'),
+                                                   os.path.join('@mod', 'mod.cpp')})
+
+    def test_save_and_load(self):
+        file_index = FileTreeIndex.from_files_list(self.files_list)
+        file_index.save('abcd')
+
+        loaded = FileTreeIndex.load('abcd')
+        for section in FileTreeIndex._sections:
+            self.assertEqual(getattr(loaded, section), getattr(file_index, section))
+
+        self.assertIsNone(FileTreeIndex.load('missing'))
+
+    def test_used_index_is_not_stale(self):
+        FileTreeIndex.from_files_list(self.files_list).save('used')
+        FileTreeIndex.from_files_list(self.files_list).save('unused')
+
+        old_time = time.time() - FileTreeIndex.max_age - 60
+        for infohash in ('used', 'unused'):
+            os.utime(FileTreeIndex.get_file_name(infohash), (old_time, old_time))
+
+        self.assertIsNotNone(FileTreeIndex.load('used'))
+        FileTreeIndex.from_files_list(self.files_list).save('new')
+
+        self.assertIsNotNone(FileTreeIndex.load('used'))
+        self.assertIsNone(FileTreeIndex.load('unused'))
+
+    def test_corrupted_index_is_ignored(self):
+        FileTreeIndex.from_files_list(self.files_list).save('abcd')
+
+        with open(FileTreeIndex.get_file_name('abcd'), 'r+b') as f:
+            f.truncate(20)
+
+        self.assertIsNone(FileTreeIndex.load('abcd'))
+
+    def test_check_mod_directories(self):
+        mod_directory = os.path.join(self.directory, 'mods')
+        os.makedirs(os.path.join(mod_directory, '@mod', 'Addons'))
+        for file_path in self.files_list[:2]:
+            open(os.path.join(mod_directory, file_path), 'wb').close()
+
+        file_index = FileTreeIndex.from_files_list(self.files_list)
+        self.assertTrue(check_mod_directories(file_index.files, mod_directory, file_index=file_index))
+
+        open(os.path.join(mod_directory, '@mod', 'superfluous'), 'wb').close()
+        self.assertFalse(check_mod_directories(file_index.files, mod_directory, file_index=file_index))
+        self.assertFalse(check_mod_directories(file_index.files, mod_directory))
+
+    def test_cached_indexes_are_bounded(self):
+        for infohash in ('a', 'b', 'c'):
+            FileTreeIndex.from_files_list(self.files_list).save(infohash)
+
+        torrents = {infohash: Mock(**{'info_hash.return_value': infohash}) for infohash in ('a', 'b', 'c')}
+
+        with patch.object(filetreeindex, '_indexes', OrderedDict()), \
+             patch.object(filetreeindex, '_max_indexes', 2):
+            index_a = filetreeindex.get_file_index(torrents['a'])
+            filetreeindex.get_file_index(torrents['b'])
+
+            # 'a' is used again so 'b' is the least recently used one
+            self.assertIs(filetreeindex.get_file_index(torrents['a']), index_a)
+            filetreeindex.get_file_index(torrents['c'])
+
+            self.assertEqual(list(filetreeindex._indexes), ['a', 'c'])
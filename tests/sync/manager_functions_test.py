@@ -0,0 +1,132 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+from mock import Mock, patch
+from sync import manager_functions
+from sync import mod as mod_module
+from sync.mod import Mod
+
+METADATA = {'mods': [], 'servers': []}
+CONTENTS = json.dumps(METADATA).encode('utf-8')
+DIGEST = manager_functions.get_metadata_digest(CONTENTS)
+VALIDATORS = {'ETag': '"abcd"', 'Last-Modified': 'Sat, 17 Oct 2026 10:00:00 GMT'}
+
+
+def make_response(status_code, content=b'', headers=None):
+    response = Mock(status_code=status_code, content=content, headers=headers or {})
+    response.json.side_effect = lambda: json.loads(content)
+    return response
+
+
+class CheckModDescriptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.para = Mock()
+        self.session = Mock()
+
+        self.patcher = patch.object(manager_functions, 'get_session', return_value=self.session)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def check(self, response, digest=DIGEST, validators=VALIDATORS):
+        self.session.get.return_value = response
+        manager_functions._check_mod_descriptions(self.para, None, None, digest, validators)
+
+    def test_conditional_headers_are_sent(self):
+        self.check(make_response(304))
+
+        headers = self.session.get.call_args[1]['headers']
+        self.assertEqual(headers, {'If-None-Match': '"abcd"',
+                                   'If-Modified-Since': 'Sat, 17 Oct 2026 10:00:00 GMT'})
+
+    def test_no_validators(self):
+        self.check(make_response(200, CONTENTS), validators=None)
+
+        self.assertEqual(self.session.get.call_args[1]['headers'], {})
+
+    def test_not_modified(self):
+        self.check(make_response(304))
+
+        self.para.resolve.assert_called_once_with({'msg': 'Metadata not modified', 'changed': False})
+        self.assertFalse(self.para.reject.called)
+
+    def test_same_digest(self):
+        self.check(make_response(200, CONTENTS, {'ETag': '"efgh"'}))
+
+        self.para.resolve.assert_called_once_with({'msg': 'Metadata checked',
+                                                   'changed': False,
+                                                   'digest': DIGEST,
+                                                   'validators': {'ETag': '"efgh"'}})
+
+    def test_changed_digest(self):
+        new_metadata = {'mods': [], 'servers': [{'name': 'New server'}]}
+        new_contents = json.dumps(new_metadata).encode('utf-8')
+
+        self.check(make_response(200, new_contents, VALIDATORS))
+
+        self.para.resolve.assert_called_once_with({'msg': 'Metadata checked',
+                                                   'changed': True,
+                                                   'digest': manager_functions.get_metadata_digest(new_contents),
+                                                   'validators': VALIDATORS,
+                                                   'data': new_metadata})
+
+    def test_changed_digest_with_bad_contents(self):
+        self.check(make_response(200, b'not json'))
+
+        self.assertFalse(self.para.resolve.called)
+        self.assertEqual(self.para.reject.call_count, 1)
+
+    def test_http_error(self):
+        self.check(make_response(500))
+
+        self.assertFalse(self.para.resolve.called)
+        self.para.reject.assert_called_once_with({'msg': 'Checking metadata: HTTP error code: 500'})
+
+
+class CheckModsCompletenessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.messagequeue = Mock()
+        self.mods = [Mod(foldername='@a', parent_location='/mods', torrent_url='a-1.torrent'),
+                     Mod(foldername='@b', parent_location='/mods', torrent_url='b-1.torrent'),
+                     Mod(foldername='@b', parent_location='/mods', torrent_url='b-1.torrent')]
+
+        self.patcher = patch.object(mod_module, 'is_complete_quick', return_value=False)
+        self.is_complete_quick = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_known_mods_are_not_checked(self):
+        known_states = {manager_functions.get_mod_key(self.mods[0]): True}
+
+        manager_functions.check_mods_completeness(self.messagequeue, self.mods, known_states=known_states)
+
+        self.is_complete_quick.assert_called_once_with(self.mods[1], self.messagequeue)
+        self.assertEqual([mod.up_to_date for mod in self.mods], [True, False, False])
+        self.assertEqual(self.messagequeue.progress.call_count, 2)
+        self.assertEqual(self.messagequeue.progress.call_args[0][1], 1.0)
+
+    def test_all_mods_known(self):
+        known_states = {manager_functions.get_mod_key(mod): True for mod in self.mods}
+
+        manager_functions.check_mods_completeness(self.messagequeue, self.mods, known_states=known_states)
+
+        self.assertFalse(self.is_complete_quick.called)
+        self.assertTrue(all(mod.up_to_date for mod in self.mods))
@@ -0,0 +1,133 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from collections import namedtuple
+from sync.piece_hasher import PieceHasher, PreviousTorrent
+
+FileEntry = namedtuple('FileEntry', ['path', 'offset', 'size', 'pad_file'])
+
+
+class FakeCreateTorrent(object):
+    """Mimics the parts of libtorrent.create_torrent used by PieceHasher"""
+
+    def __init__(self, files, piece_length):
+        self.entries = []
+        self.piece_length_value = piece_length
+        self.hashes = {}
+        self.file_hashes = {}
+
+        offset = 0
+        for path, size in files:
+            self.entries.append(FileEntry(path.encode('utf-8'), offset, size, False))
+            offset += size
+
+        self.total_size = offset
+
+    def files(self):
+        return self.entries
+
+    def piece_length(self):
+        return self.piece_length_value
+
+    def num_pieces(self):
+        return (self.total_size + self.piece_length_value - 1) // self.piece_length_value
+
+    def set_hash(self, piece, digest):
+        self.hashes[piece] = digest
+
+    def set_file_hash(self, index, digest):
+        self.file_hashes[index] = digest
+
+
+class PieceHasherTest(unittest.TestCase):
+
+    piece_length = 16
+
+    def setUp(self):
+        self.base_directory = tempfile.mkdtemp()
+        self.files = [('@mod/a.pbo', b'a' * 40), ('@mod/empty.txt', b''), ('@mod/b.pbo', b'b' * 5),
+                      ('@mod/c.pbo', b'c' * 30)]
+
+        os.mkdir(os.path.join(self.base_directory, '@mod'))
+        for path, contents in self.files:
+            self.write_file(path, contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_directory)
+
+    def write_file(self, path, contents):
+        with open(os.path.join(self.base_directory, path), 'wb') as f:
+            f.write(contents)
+
+    def create_torrent(self):
+        return FakeCreateTorrent([(path, len(contents)) for path, contents in self.files], self.piece_length)
+
+    def expected_hashes(self):
+        data = b''.join(contents for _, contents in self.files)
+        return {piece: hashlib.sha1(data[offset:offset + self.piece_length]).digest()
+                for piece, offset in enumerate(xrange(0, len(data), self.piece_length))}
+
+    def make_previous(self, torrent, changed_paths=()):
+        files = {entry.path.decode('utf-8'): (entry.offset, entry.size, torrent.file_hashes.get(index))
+                 for index, entry in enumerate(torrent.files())
+                 if entry.size and entry.path.decode('utf-8') not in changed_paths}
+
+        piece_hashes = [torrent.hashes[piece] for piece in xrange(torrent.num_pieces())]
+        return PreviousTorrent(self.piece_length, torrent.total_size, piece_hashes, files)
+
+    def test_hashes_all_pieces_and_files(self):
+        torrent = self.create_torrent()
+        hashed, reused = PieceHasher(torrent, self.base_directory, workers=3).run()
+
+        self.assertEqual((hashed, reused), (5, 0))
+        self.assertEqual(torrent.hashes, self.expected_hashes())
+        self.assertEqual(torrent.file_hashes, {
+            0: hashlib.sha1(b'a' * 40).digest(),
+            2: hashlib.sha1(b'b' * 5).digest(),
+            3: hashlib.sha1(b'c' * 30).digest(),
+        })
+
+    def test_reuses_unchanged_pieces(self):
+        previous_torrent = self.create_torrent()
+        PieceHasher(previous_torrent, self.base_directory).run()
+
+        self.files[3] = ('@mod/c.pbo', b'd' * 30)
+        self.write_file('@mod/c.pbo', b'd' * 30)
+        previous = self.make_previous(previous_torrent, changed_paths=['@mod/c.pbo'])
+
+        torrent = self.create_torrent()
+        hashed, reused = PieceHasher(torrent, self.base_directory, previous=previous).run()
+
+        # c.pbo starts at offset 45 so only the pieces 2, 3 and 4 have changed
+        self.assertEqual((hashed, reused), (3, 2))
+        self.assertEqual(torrent.hashes, self.expected_hashes())
+        self.assertEqual(torrent.file_hashes[3], hashlib.sha1(b'd' * 30).digest())
+        self.assertEqual(torrent.file_hashes[0], hashlib.sha1(b'a' * 40).digest())
+
+    def test_ignores_previous_with_other_piece_length(self):
+        previous_torrent = self.create_torrent()
+        PieceHasher(previous_torrent, self.base_directory).run()
+        previous = self.make_previous(previous_torrent)._replace(piece_length=32)
+
+        torrent = self.create_torrent()
+        hashed, reused = PieceHasher(torrent, self.base_directory, previous=previous).run()
+
+        self.assertEqual((hashed, reused), (5, 0))
+        self.assertEqual(torrent.hashes, self.expected_hashes())
@@ -0,0 +1,110 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import libtorrent
+
+from sync import piece_verifier
+from tests.sync.faketorrent import FakeTorrentInfo, get_file_sizes, write_files
+
+FILES = [
+    ('@mod/a.pbo', b'a' * 100),
+    ('@mod/b.pbo', b'b' * 50),
+    ('@mod/c.pbo', b'c' * 70),
+]
+
+
+class PieceVerifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        write_files(self.directory, FILES)
+        self.torrent_info = FakeTorrentInfo(FILES, 64)
+
+        # Resume data saved by libtorrent while all the files were complete
+        self.resume_data = libtorrent.bencode({
+            'file sizes': get_file_sizes(self.torrent_info, self.directory),
+            'pieces': b'\x01' * self.torrent_info.num_pieces(),
+            'seed': 1,
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def modify_file(self, path, contents):
+        full_path = os.path.join(self.directory, path)
+        with open(full_path, 'wb') as f:
+            f.write(contents)
+
+        # Ensure the mtime differs from the one in the resume data
+        file_stat = os.stat(full_path)
+        os.utime(full_path, (file_stat.st_atime, file_stat.st_mtime + 3600))
+
+    def test_file_changed(self):
+        full_path = os.path.join(self.directory, '@mod/a.pbo')
+        mtime = int(os.stat(full_path).st_mtime)
+
+        self.assertFalse(piece_verifier.file_changed(full_path, 100, mtime))
+        self.assertTrue(piece_verifier.file_changed(full_path, 99, mtime))
+        self.assertTrue(piece_verifier.file_changed(full_path, 100, mtime - 3600))
+        self.assertTrue(piece_verifier.file_changed(full_path + 'missing', 100, mtime))
+
+    def test_get_pieces_for_files(self):
+        # a: 0-99, b: 100-149, c: 150-219 with 64 bytes pieces
+        self.assertEqual(piece_verifier.get_pieces_for_files(self.torrent_info, [0]), [0, 1])
+        self.assertEqual(piece_verifier.get_pieces_for_files(self.torrent_info, [1]), [1, 2])
+        self.assertEqual(piece_verifier.get_pieces_for_files(self.torrent_info, [2]), [2, 3])
+
+    def test_unchanged_files_are_not_patched(self):
+        patched = piece_verifier.patch_resume_data(self.resume_data, self.torrent_info, self.directory)
+
+        self.assertEqual(patched, self.resume_data)
+
+    def test_corrupted_file(self):
+        self.modify_file('@mod/b.pbo', b'b' * 10 + b'x' + b'b' * 39)
+
+        patched = libtorrent.bdecode(
+            piece_verifier.patch_resume_data(self.resume_data, self.torrent_info, self.directory))
+
+        # Byte 110 of the torrent is in piece 1. Piece 2 is still good
+        self.assertEqual(bytearray(patched['pieces']), bytearray([1, 0, 1, 1]))
+        self.assertEqual(patched['seed'], 0)
+        self.assertEqual(patched['file sizes'], get_file_sizes(self.torrent_info, self.directory))
+
+    def test_touched_file(self):
+        self.modify_file('@mod/c.pbo', b'c' * 70)
+
+        patched = libtorrent.bdecode(
+            piece_verifier.patch_resume_data(self.resume_data, self.torrent_info, self.directory))
+
+        # The data is the same, only the mtime has to be updated
+        self.assertEqual(bytearray(patched['pieces']), bytearray([1, 1, 1, 1]))
+        self.assertEqual(patched['file sizes'], get_file_sizes(self.torrent_info, self.directory))
+
+    def test_pieces_count_mismatch(self):
+        resume_data = libtorrent.bencode({
+            'file sizes': [[0, 0]] * 3,
+            'pieces': b'\x01' * 2,
+        })
+
+        self.assertEqual(piece_verifier.patch_resume_data(resume_data, self.torrent_info, self.directory),
+                         resume_data)
+
+    def test_invalid_resume_data(self):
+        self.assertEqual(piece_verifier.patch_resume_data(b'garbage', self.torrent_info, self.directory),
+                         b'garbage')
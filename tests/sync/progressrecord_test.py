@@ -0,0 +1,96 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import unittest
+
+from sync import progressrecord
+from sync.progressrecord import ProgressDecoder, ProgressEncoder, ProgressState
+
+
+def make_state(done, phase=progressrecord.PHASE_SYNCING):
+    names = ['@mod1', '@mod2', '@mod3']
+    rows = []
+    for name, mod_done in zip(names, done):
+        rows.extend((100, mod_done, 10, 20, 3, 3))
+
+    return ProgressState(phase, 2048, 1024, 4096, None, names, rows)
+
+
+class ProgressRecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = ProgressEncoder()
+        self.decoder = ProgressDecoder()
+
+    def test_full_record(self):
+        state = self.decoder.decode(self.encoder.encode(make_state([100, 50, 0])))
+
+        self.assertEqual(state.names, ['@mod1', '@mod2', '@mod3'])
+        self.assertEqual(state.get_totals(), (300, 150, 9))
+        self.assertEqual(state.get_unfinished(), ['@mod2', '@mod3'])
+        self.assertIsNone(state.eta_secs)
+
+    def test_delta_contains_only_changed_torrents(self):
+        full = self.encoder.encode(make_state([100, 50, 0]))
+        delta = self.encoder.encode(make_state([100, 60, 0]))
+
+        self.assertLess(len(delta), len(full))
+
+        self.decoder.decode(full)
+        state = self.decoder.decode(delta)
+        self.assertEqual(state.get_field(1, 'total_wanted_done'), 60)
+        self.assertEqual(state.get_totals(), (300, 160, 9))
+
+    def test_skipped_deltas(self):
+        self.decoder.decode(self.encoder.encode(make_state([0, 0, 0])))
+        self.encoder.encode(make_state([50, 0, 0]))
+
+        state = self.decoder.decode(self.encoder.encode(make_state([60, 10, 0])))
+        self.assertEqual(state.get_totals(), (300, 70, 9))
+
+    def test_delta_without_base_is_ignored(self):
+        self.encoder.encode(make_state([0, 0, 0]))
+        self.assertIsNone(self.decoder.decode(self.encoder.encode(make_state([10, 0, 0]))))
+
+    def test_keyframe_is_requested_once_per_missing_base(self):
+        self.encoder.encode(make_state([0, 0, 0]))
+
+        self.assertIsNone(self.decoder.decode(self.encoder.encode(make_state([10, 0, 0]))))
+        self.assertTrue(self.decoder.keyframe_needed)
+
+        self.assertIsNone(self.decoder.decode(self.encoder.encode(make_state([20, 0, 0]))))
+        self.assertFalse(self.decoder.keyframe_needed)
+
+        self.encoder.request_keyframe()
+        state = self.decoder.decode(self.encoder.encode(make_state([30, 0, 0])))
+        self.assertEqual(state.get_totals(), (300, 30, 9))
+        self.assertFalse(self.decoder.keyframe_needed)
+
+        state = self.decoder.decode(self.encoder.encode(make_state([40, 0, 0])))
+        self.assertEqual(state.get_totals(), (300, 40, 9))
+
+    def test_format_progress(self):
+        message, mods, fraction = progressrecord.format_progress(make_state([100, 50, 0]))
+        self.assertEqual(message, 'Syncing: 50.00% complete (2.00 KB/s) ')
+        self.assertEqual(mods, ['@mod2', '@mod3'])
+        self.assertEqual(fraction, 0.5)
+
+        message, mods, fraction = progressrecord.format_progress(make_state([100, 100, 100]))
+        self.assertEqual(message, 'Ready to play. Seeding mods: 9 connections (1.00 KB/s). Total: 0 MB')
+        self.assertEqual(mods, [])
+        self.assertEqual(fraction, 1)
+
+    def test_bad_version_raises(self):
+        record = self.encoder.encode(make_state([0, 0, 0]))
+        self.assertRaises(ValueError, self.decoder.decode, record[:4] + b'\xff' + record[5:])
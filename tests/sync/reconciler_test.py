@@ -0,0 +1,148 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import libtorrent
+
+from sync import reconciler
+from tests.sync.faketorrent import FakeTorrentInfo, get_file_sizes, write_files
+
+PIECE_LENGTH = 16 * 1024
+
+OLD_FILES = [
+    ('@mod/addons/a.pbo', b'a' * 20000),
+    ('@mod/addons/b.pbo', b'b' * 5000),
+    ('@mod/mod.cpp', b'name = "mod";'),
+]
+
+
+class ReconcilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        write_files(self.directory, OLD_FILES)
+        self.old_torrent_info = FakeTorrentInfo(OLD_FILES, PIECE_LENGTH)
+
+        # Resume data saved by libtorrent while all the files were complete
+        self.old_resume_data = libtorrent.bencode({
+            'file-format': 'libtorrent resume file',
+            'info-hash': self.old_torrent_info.info_hash().to_bytes(),
+            'blocks per piece': 1,
+            'pieces': b'\x01' * self.old_torrent_info.num_pieces(),
+            'file sizes': get_file_sizes(self.old_torrent_info, self.directory),
+            'save_path': self.directory,
+            'seed': 1,
+            'mapped_files': ['@mod/old_name.pbo'],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reconcile(self, new_torrent_info):
+        resume_data = reconciler.reconcile(self.old_torrent_info, self.old_resume_data,
+                                           new_torrent_info, self.directory)
+        return libtorrent.bdecode(resume_data)
+
+    def read_file(self, relative_path):
+        with open(os.path.join(self.directory, relative_path), 'rb') as f:
+            return f.read()
+
+    def test_unchanged_files(self):
+        new_torrent_info = FakeTorrentInfo(OLD_FILES + [('@mod/new.pbo', b'n' * 100)], PIECE_LENGTH)
+
+        resume_data = self.reconcile(new_torrent_info)
+
+        self.assertEqual(resume_data['info-hash'], new_torrent_info.info_hash().to_bytes())
+        self.assertEqual(resume_data['file sizes'][:3], get_file_sizes(self.old_torrent_info, self.directory))
+        self.assertEqual(resume_data['file sizes'][3], [0, 0])
+        self.assertEqual(resume_data['seed'], 0)
+        self.assertNotIn('mapped_files', resume_data)
+
+        # The last piece overlaps mod.cpp and the new file
+        self.assertEqual(bytearray(resume_data['pieces']), bytearray(b'\x01\x00'))
+
+    def test_moved_file(self):
+        new_files = [
+            ('@mod/addons/renamed_a.pbo', b'a' * 20000),
+            ('@mod/addons/b.pbo', b'b' * 5000),
+            ('@mod/mod.cpp', b'name = "mod";'),
+        ]
+        new_torrent_info = FakeTorrentInfo(new_files, PIECE_LENGTH)
+
+        resume_data = self.reconcile(new_torrent_info)
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '@mod/addons/a.pbo')))
+        self.assertEqual(self.read_file('@mod/addons/renamed_a.pbo'), b'a' * 20000)
+        self.assertEqual(resume_data['file sizes'], get_file_sizes(new_torrent_info, self.directory))
+        self.assertEqual(bytearray(resume_data['pieces']), bytearray(b'\x01\x01'))
+        self.assertEqual(resume_data['seed'], 1)
+
+    def test_copied_file(self):
+        new_files = OLD_FILES + [('@mod/optionals/b.pbo', b'b' * 5000)]
+        new_torrent_info = FakeTorrentInfo(new_files, PIECE_LENGTH)
+
+        resume_data = self.reconcile(new_torrent_info)
+
+        self.assertEqual(self.read_file('@mod/addons/b.pbo'), b'b' * 5000)
+        self.assertEqual(self.read_file('@mod/optionals/b.pbo'), b'b' * 5000)
+        self.assertEqual(resume_data['file sizes'], get_file_sizes(new_torrent_info, self.directory))
+        self.assertEqual(resume_data['seed'], 1)
+
+    def test_swapped_files(self):
+        new_files = [
+            ('@mod/addons/a.pbo', b'b' * 5000),
+            ('@mod/addons/b.pbo', b'a' * 20000),
+            ('@mod/mod.cpp', b'name = "mod";'),
+        ]
+        new_torrent_info = FakeTorrentInfo(new_files, PIECE_LENGTH)
+
+        resume_data = self.reconcile(new_torrent_info)
+
+        self.assertEqual(self.read_file('@mod/addons/a.pbo'), b'b' * 5000)
+        self.assertEqual(self.read_file('@mod/addons/b.pbo'), b'a' * 20000)
+        self.assertEqual(resume_data['seed'], 1)
+
+    def test_modified_file_is_not_reused(self):
+        write_files(self.directory, [('@mod/addons/a.pbo', b'x' * 20000)])
+        os.utime(os.path.join(self.directory, '@mod/addons/a.pbo'), (0, 0))
+
+        new_files = [('@mod/addons/renamed_a.pbo', b'a' * 20000)] + OLD_FILES[1:]
+        resume_data = self.reconcile(FakeTorrentInfo(new_files, PIECE_LENGTH))
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '@mod/addons/renamed_a.pbo')))
+        self.assertEqual(resume_data['file sizes'][0], [0, 0])
+        self.assertEqual(resume_data['seed'], 0)
+
+    def test_piece_size_change(self):
+        new_torrent_info = FakeTorrentInfo(OLD_FILES, 4 * PIECE_LENGTH)
+
+        resume_data = self.reconcile(new_torrent_info)
+
+        self.assertEqual(resume_data['blocks per piece'], 4)
+        self.assertEqual(bytearray(resume_data['pieces']), bytearray(b'\x01'))
+        self.assertEqual(resume_data['seed'], 1)
+
+    def test_small_pieces_have_one_block(self):
+        resume_data = self.reconcile(FakeTorrentInfo(OLD_FILES, 4096))
+
+        self.assertEqual(resume_data['blocks per piece'], 1)
+        self.assertEqual(len(resume_data['pieces']), 7)
+
+    def test_bad_resume_data(self):
+        self.assertIsNone(reconciler.reconcile(self.old_torrent_info, b'garbage',
+                                               FakeTorrentInfo(OLD_FILES, PIECE_LENGTH), self.directory))
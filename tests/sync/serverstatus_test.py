@@ -0,0 +1,90 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sync.server import Server
+from sync.serverstatus import ServerStatusStore
+
+
+def make_info(players, rtt):
+    return {'player_count': players, 'max_players': 64, 'map': 'Altis', 'rtt': rtt}
+
+
+class ServerStatusStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ServerStatusStore(os.path.join(self.directory, 'server_status.json'))
+        self.servers = [Server('Server {}'.format(i), '10.0.0.{}'.format(i), 2302) for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_format_players(self):
+        self.store.update(self.servers[0], make_info(12, 0.05))
+        self.store.update(self.servers[1], None)
+
+        self.assertEqual(self.store.format_players(self.servers[0]), '12/64')
+        self.assertEqual(self.store.format_players(self.servers[1]), '-/-')
+        self.assertEqual(self.store.format_players(self.servers[2]), '?/?')
+
+    def test_persistence(self):
+        self.store.update(self.servers[0], make_info(12, 0.05))
+        self.store.save()
+
+        store = ServerStatusStore(self.store.get_file_name())
+        store.load()
+
+        self.assertEqual(store.format_players(self.servers[0]), '12/64')
+        self.assertEqual(store.get_rtt(self.servers[0]), 0.05)
+
+    def test_ttl(self):
+        now = time.time()
+        self.store.update(self.servers[0], make_info(12, 0.05), now=now)
+
+        self.assertTrue(self.store.is_fresh(self.servers[0], now=now + self.store.ttl - 1))
+        self.assertFalse(self.store.is_fresh(self.servers[0], now=now + self.store.ttl + 1))
+        self.assertFalse(self.store.is_fresh(self.servers[1], now=now))
+
+    def test_sort_by_latency(self):
+        self.store.update(self.servers[0], make_info(1, 0.2))
+        self.store.update(self.servers[2], make_info(1, 0.1))
+
+        self.assertEqual(self.store.sort_by_latency(self.servers),
+                         [self.servers[2], self.servers[0], self.servers[1]])
+
+    def test_refresh_interval_adapts_to_viewing(self):
+        now = 1000000
+        self.store.mark_viewed(now)
+        self.store.refresh_started(now)
+
+        interval = self.store.min_refresh_interval
+        self.assertFalse(self.store.should_refresh(self.servers, now + interval - 1))
+        self.assertTrue(self.store.should_refresh(self.servers, now + interval))
+
+        # Nobody is looking: the refreshes get less and less frequent
+        now += self.store.viewed_window + 1
+        self.store.refresh_started(now)
+        self.assertEqual(self.store.refresh_interval, interval * 2)
+
+        self.store.refresh_started(now + interval * 2)
+        self.assertEqual(self.store.refresh_interval, interval * 4)
+
+        self.store.mark_viewed(now + interval * 2)
+        self.assertEqual(self.store.refresh_interval, interval)
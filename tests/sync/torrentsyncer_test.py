@@ -0,0 +1,149 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import unittest
+
+from mock import Mock, patch
+from sync import torrentsyncer
+from sync.mod import Mod
+from sync.torrentsyncer import PrepareParametersException, TorrentSyncer
+
+
+class FakeRemovedAlert(object):
+    def __init__(self, info_hash):
+        self.info_hash = info_hash
+
+    def message(self):
+        return b'torrent removed'
+
+    def category(self):
+        return 0
+
+
+def make_mod(foldername, torrent_url):
+    mod = Mod(foldername=foldername, parent_location='/mods', torrent_url=torrent_url)
+    mod.torrent_handle = Mock()
+    mod.torrent_handle.info_hash.return_value = 'hash of {}'.format(torrent_url)
+
+    return mod
+
+
+class UpdateModsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.session.pop_alerts.side_effect = self.pop_alerts
+        self.removed_hashes = []
+
+        self.patchers = [patch.object(TorrentSyncer, 'session', self.session),
+                         patch.object(torrentsyncer.libtorrent, 'torrent_removed_alert', FakeRemovedAlert, create=True)]
+        for patcher in self.patchers:
+            patcher.start()
+
+        self.session.remove_torrent.side_effect = \
+            lambda handle: self.removed_hashes.append(handle.info_hash.return_value)
+
+        self.mods = [make_mod('@a', 'a-1.torrent'), make_mod('@b', 'b-1.torrent'), make_mod('@c', 'c-1.torrent')]
+        self.syncer = TorrentSyncer(Mock(), list(self.mods))
+        self.syncer.just_seed = True
+
+        self.syncer.save_resume_data = Mock(return_value=False)
+        self.syncer.prefetch_torrents = Mock()
+        self.syncer.prepare_libtorrent_params = Mock(side_effect=self.prepare_libtorrent_params)
+
+    def tearDown(self):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+
+    def pop_alerts(self):
+        alerts = [FakeRemovedAlert(info_hash) for info_hash in self.removed_hashes]
+        self.removed_hashes = []
+        return alerts
+
+    def prepare_libtorrent_params(self, mod):
+        # The files of the removed torrents must have been released by now
+        self.assertEqual(self.syncer.removal_pending, set())
+        mod.libtorrent_params = {'url': mod.torrent_url}
+
+    def test_nothing_changed(self):
+        new_mods = [make_mod('@a', 'a-1.torrent'), make_mod('@b', 'b-1.torrent'), make_mod('@c', 'c-1.torrent')]
+
+        self.assertTrue(self.syncer.update_mods(new_mods))
+
+        self.assertEqual(self.syncer.mods, self.mods)
+        self.assertFalse(self.session.remove_torrent.called)
+        self.assertFalse(self.session.add_torrent.called)
+        self.assertTrue(self.syncer.just_seed)
+
+    def test_changed_mod(self):
+        new_b = make_mod('@b', 'b-2.torrent')
+        new_mods = [make_mod('@a', 'a-1.torrent'), new_b, make_mod('@c', 'c-1.torrent')]
+
+        self.assertTrue(self.syncer.update_mods(new_mods))
+
+        self.session.remove_torrent.assert_called_once_with(self.mods[1].torrent_handle)
+        self.syncer.prefetch_torrents.assert_called_once_with([new_b])
+        self.syncer.prepare_libtorrent_params.assert_called_once_with(new_b)
+        self.session.add_torrent.assert_called_once_with({'url': 'b-2.torrent'})
+
+        self.assertEqual(self.syncer.mods, [self.mods[0], self.mods[2], new_b])
+        self.assertIs(new_b.torrent_handle, self.session.add_torrent.return_value)
+        self.assertFalse(self.syncer.just_seed)
+
+    def test_removed_mod(self):
+        self.assertTrue(self.syncer.update_mods([make_mod('@a', 'a-1.torrent'), make_mod('@b', 'b-1.torrent')]))
+
+        self.session.remove_torrent.assert_called_once_with(self.mods[2].torrent_handle)
+        self.assertFalse(self.syncer.prefetch_torrents.called)
+        self.assertFalse(self.session.add_torrent.called)
+        self.assertEqual(self.syncer.mods, self.mods[:2])
+
+    def test_added_mod(self):
+        new_d = make_mod('@d', 'd-1.torrent')
+        new_mods = [make_mod('@a', 'a-1.torrent'), make_mod('@b', 'b-1.torrent'), make_mod('@c', 'c-1.torrent'), new_d]
+
+        self.assertTrue(self.syncer.update_mods(new_mods))
+
+        self.assertFalse(self.session.remove_torrent.called)
+        self.syncer.prepare_libtorrent_params.assert_called_once_with(new_d)
+        self.assertEqual(self.syncer.mods, self.mods + [new_d])
+
+    def test_waits_for_the_removal(self):
+        # libtorrent only removes the torrent a while later
+        alerts = [[], []]
+        self.session.pop_alerts.side_effect = lambda: alerts.pop(0) if alerts else self.pop_alerts()
+
+        self.assertTrue(self.syncer.update_mods([make_mod('@a', 'a-2.torrent')]))
+
+        self.assertEqual(self.session.pop_alerts.call_count, 3)
+        self.assertEqual(self.session.remove_torrent.call_count, 3)
+        self.assertEqual(len(self.syncer.mods), 1)
+
+    def test_removal_timeout(self):
+        self.session.pop_alerts.side_effect = lambda: []
+        self.syncer._torrent_removal_timeout = 0
+
+        self.assertTrue(self.syncer.update_mods([make_mod('@a', 'a-2.torrent')]))
+
+        self.assertEqual(self.syncer.removal_pending, set())
+        self.assertEqual(self.session.add_torrent.call_count, 1)
+
+    def test_prepare_failure(self):
+        self.syncer.prepare_libtorrent_params = Mock(side_effect=PrepareParametersException('Bad torrent'))
+
+        self.assertFalse(self.syncer.update_mods([make_mod('@a', 'a-2.torrent')]))
+
+        self.syncer.result_queue.reject.assert_called_once_with({'msg': 'Bad torrent'})
+        self.assertTrue(self.syncer.force_termination)
+        self.assertFalse(self.session.add_torrent.called)
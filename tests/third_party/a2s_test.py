@@ -0,0 +1,149 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import select
+import socket
+import struct
+import threading
+import time
+import unittest
+
+from third_party import a2s
+from third_party.a2s import A2SQueryEngine
+
+
+def make_info_response(name, players, max_players):
+    return (a2s.SIMPLE_RESPONSE_HEADER + a2s.A2S_INFO_RESPONSE + b'\x11' +
+            name.encode('utf-8') + b'\x00' + b'Altis\x00' + b'Arma3\x00' + b'Arma 3\x00' +
+            struct.pack(b'<hBBB', 0, players, max_players, 0) + b'dw\x00\x011.0\x00')
+
+
+class StandInServers(object):
+    """Local UDP servers answering A2S_INFO queries.
+
+    behaviour: 'normal', 'challenge' (requires a challenge first), 'lossy'
+    (ignores the first request) or 'dead' (never answers)
+    """
+
+    challenge = b'\x01\x02\x03\x04'
+
+    def __init__(self, behaviours):
+        self.sockets = []
+        self.behaviours = {}
+        self.requests = {}
+        self.running = True
+
+        for behaviour in behaviours:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', 0))
+            self.sockets.append(sock)
+            self.behaviours[sock] = behaviour
+            self.requests[sock.getsockname()] = 0
+
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def addresses(self):
+        return [sock.getsockname() for sock in self.sockets]
+
+    def serve(self):
+        while self.running:
+            readable, _, _ = select.select(self.sockets, [], [], 0.05)
+
+            for sock in readable:
+                data, address = sock.recvfrom(1400)
+                self.requests[sock.getsockname()] += 1
+                behaviour = self.behaviours[sock]
+                response = make_info_response('Server {}'.format(sock.getsockname()[1]), 5, 64)
+
+                if behaviour == 'dead':
+                    continue
+
+                if behaviour == 'lossy' and self.requests[sock.getsockname()] == 1:
+                    continue
+
+                if behaviour == 'challenge' and not data.endswith(self.challenge):
+                    response = a2s.SIMPLE_RESPONSE_HEADER + a2s.S2C_CHALLENGE + self.challenge
+
+                sock.sendto(response, address)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+
+        for sock in self.sockets:
+            sock.close()
+
+
+class A2SQueryEngineTest(unittest.TestCase):
+
+    def query(self, behaviours, **kwargs):
+        self.servers = StandInServers(behaviours)
+        self.addCleanup(self.servers.close)
+
+        self.addresses = dict(enumerate(self.servers.addresses()))
+        self.callbacks = []
+        engine = A2SQueryEngine(**kwargs)
+
+        start = time.time()
+        results = engine.query(self.addresses, callback=lambda key, info: self.callbacks.append((key, info)))
+        self.duration = time.time() - start
+
+        return results
+
+    def test_parse_info(self):
+        info = a2s.parse_info(make_info_response('Some server', 12, 64)[5:])
+
+        self.assertEqual(info['server_name'], 'Some server')
+        self.assertEqual(info['map'], 'Altis')
+        self.assertEqual((info['player_count'], info['max_players']), (12, 64))
+
+    def test_parse_info_truncated(self):
+        self.assertRaises(a2s.A2SParseError, a2s.parse_info, make_info_response('Server', 12, 64)[5:20])
+
+    def test_queries_all_servers_at_once(self):
+        results = self.query(['normal'] * 100, timeout=2)
+
+        self.assertEqual(len(results), 100)
+        for info in results.values():
+            self.assertEqual((info['player_count'], info['max_players']), (5, 64))
+            self.assertGreaterEqual(info['rtt'], 0)
+
+        self.assertEqual(len(self.callbacks), 100)
+        self.assertTrue(all(count == 1 for count in self.servers.requests.values()))
+        self.assertLess(self.duration, 2)
+
+    def test_challenge_is_answered(self):
+        results = self.query(['challenge', 'normal'], timeout=2)
+
+        self.assertEqual(results[0]['player_count'], 5)
+        self.assertEqual(self.servers.requests[self.addresses[0]], 2)
+        self.assertLess(self.duration, 2)
+
+    def test_retries_each_server_with_backoff(self):
+        results = self.query(['lossy', 'dead', 'normal'], timeout=0.2, attempts=3, backoff=2)
+
+        self.assertEqual(results[0]['player_count'], 5)
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2]['player_count'], 5)
+
+        self.assertEqual(self.servers.requests[self.addresses[0]], 2)
+        self.assertEqual(self.servers.requests[self.addresses[1]], 3)
+        self.assertEqual(self.servers.requests[self.addresses[2]], 1)
+        self.assertIn((1, None), self.callbacks)
+
+        # 0.2 + 0.4 + 0.8 seconds for the dead server
+        self.assertGreaterEqual(self.duration, 1.4)
+        self.assertLess(self.duration, 2)
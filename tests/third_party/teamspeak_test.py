@@ -0,0 +1,68 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from mock import Mock, patch
+from third_party import teamspeak
+from utils import hashes
+
+MEMBERS = {'plugins/plugin_{}.dll'.format(i): b'plugin {}'.format(i) * (i + 1) for i in range(20)}
+
+
+class ComputeChecksumsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.zip_filename = os.path.join(self.directory, 'plugin.ts3_plugin')
+
+        with zipfile.ZipFile(self.zip_filename, 'w') as zip_handle:
+            zip_handle.writestr('package.ini', b'Name = Plugin')
+            zip_handle.writestr('plugins/', b'')
+            for name, contents in MEMBERS.items():
+                zip_handle.writestr(name, contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_checksums(self):
+        checksums = teamspeak.compute_checksums_for_ts3_plugin(self.zip_filename)
+
+        self.assertEqual(checksums, {name.replace('/', os.path.sep): hashlib.sha1(contents).digest()
+                                     for name, contents in MEMBERS.items()})
+
+    def test_zip_file_opened_once_per_worker(self):
+        opened = []
+        zip_file_class = zipfile.ZipFile
+
+        def open_zip(*args, **kwargs):
+            zip_handle = zip_file_class(*args, **kwargs)
+            opened.append(zip_handle)
+            return zip_handle
+
+        message_queue = Mock()
+
+        with patch.object(hashes, 'get_default_workers_count', return_value=2), \
+             patch.object(teamspeak.zipfile, 'ZipFile', side_effect=open_zip):
+            teamspeak.compute_checksums_for_ts3_plugin(self.zip_filename, message_queue=message_queue)
+
+        # The listing of the members and one handle per worker
+        self.assertLessEqual(len(opened), 3)
+        self.assertTrue(all(zip_handle.fp is None for zip_handle in opened))
+        self.assertTrue(message_queue.progress.called)
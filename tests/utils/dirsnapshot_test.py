@@ -0,0 +1,98 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import dirsnapshot
+from utils.dirsnapshot import DirectorySnapshot
+
+
+class DirectorySnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.mods_directory = os.path.join(self.directory, 'mods')
+        os.makedirs(os.path.join(self.mods_directory, '@mod', 'addons'))
+
+        self.files = [os.path.join('@mod', 'mod.cpp'), os.path.join('@mod', 'addons', 'file.pbo')]
+        self.dirs = ['@mod', os.path.join('@mod', 'addons')]
+
+        for file_path in self.files:
+            self._write_file(file_path, b'contents')
+
+        for dir_path in self.dirs:
+            os.utime(os.path.join(self.mods_directory, dir_path), (1000000000, 1000000000))
+
+        self.patcher = patch.object(dirsnapshot.paths, 'get_launcher_directory',
+                                    lambda *relative: os.path.join(self.directory, 'launcher', *relative))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def _write_file(self, relative_path, contents, mtime=1000000000):
+        full_path = os.path.join(self.mods_directory, relative_path)
+
+        with open(full_path, 'wb') as f:
+            f.write(contents)
+
+        os.utime(full_path, (mtime, mtime))
+
+    def _saved_snapshot(self, torrent_url='http://url/mod-1.torrent'):
+        snapshot = DirectorySnapshot('@mod', 'http://url/mod-1.torrent')
+        snapshot.update(self.mods_directory, self.files, self.dirs)
+        snapshot.save()
+
+        snapshot = DirectorySnapshot('@mod', torrent_url)
+        snapshot.load()
+        return snapshot
+
+    def test_save_and_load(self):
+        snapshot = self._saved_snapshot()
+
+        self.assertTrue(snapshot.is_valid())
+        self.assertEqual(len(snapshot.entries), 4)
+        self.assertEqual(snapshot.get_changed_entries(self.mods_directory), ([], []))
+
+    def test_modified_file_is_reported(self):
+        snapshot = self._saved_snapshot()
+        self._write_file(self.files[1], b'modified', mtime=1000000005)
+
+        self.assertEqual(snapshot.get_changed_entries(self.mods_directory), ([self.files[1]], []))
+
+    def test_new_file_changes_the_directory(self):
+        snapshot = self._saved_snapshot()
+        self._write_file(os.path.join('@mod', 'addons', 'superfluous.pbo'), b'contents')
+
+        changed_files, changed_dirs = snapshot.get_changed_entries(self.mods_directory)
+        self.assertEqual(changed_files, [])
+        self.assertEqual(changed_dirs, [os.path.join('@mod', 'addons')])
+
+    def test_torrent_url_change_invalidates_the_snapshot(self):
+        snapshot = self._saved_snapshot(torrent_url='http://url/mod-2.torrent')
+        self.assertFalse(snapshot.is_valid())
+
+    def test_corrupted_snapshot_is_ignored(self):
+        snapshot = self._saved_snapshot()
+
+        with open(snapshot.get_file_name(), 'r+b') as f:
+            f.truncate(20)
+
+        snapshot.load()
+        self.assertFalse(snapshot.is_valid())
@@ -0,0 +1,64 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import filecache
+
+
+class FileCacheTest(unittest.TestCase):
+    url = 'http://url/mod.torrent'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.patcher = patch.object(filecache, 'get_cache_directory', lambda: self.directory)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_save_and_get(self):
+        self.assertIsNone(filecache.get_file(self.url))
+
+        filecache.save_file(self.url, b'contents')
+        self.assertEqual(filecache.get_file(self.url), b'contents')
+
+    def test_conditional_headers(self):
+        filecache.save_file(self.url, b'contents', {'ETag': '"abc"',
+                                                    'Last-Modified': 'Sat, 01 Jul 2017 10:00:00 GMT',
+                                                    'Content-Length': '8'})
+
+        self.assertEqual(filecache.get_conditional_headers(self.url),
+                         {'If-None-Match': '"abc"',
+                          'If-Modified-Since': 'Sat, 01 Jul 2017 10:00:00 GMT'})
+
+    def test_no_conditional_headers_without_validators(self):
+        filecache.save_file(self.url, b'contents', {'ETag': '"abc"'})
+        filecache.save_file(self.url, b'new contents')
+
+        self.assertEqual(filecache.get_conditional_headers(self.url), {})
+
+    def test_no_conditional_headers_without_file(self):
+        self.assertEqual(filecache.get_conditional_headers(self.url), {})
+
+    def test_validators_round_trip(self):
+        validators = filecache.get_validators({'ETag': '"abc"', 'Content-Length': '8', 'Last-Modified': ''})
+
+        self.assertEqual(validators, {'ETag': '"abc"'})
+        self.assertEqual(filecache.get_request_headers(validators), {'If-None-Match': '"abc"'})
@@ -0,0 +1,92 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import hashcache
+from utils.hashcache import HashCache
+
+
+class HashCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'file.pbo')
+        self._write_file(b'contents')
+
+        self.patcher = patch.object(hashcache.paths, 'get_launcher_directory',
+                                    lambda *relative: os.path.join(self.directory, 'launcher', *relative))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def _write_file(self, contents, mtime=1000000000):
+        with open(self.file_path, 'wb') as f:
+            f.write(contents)
+
+        os.utime(self.file_path, (mtime, mtime))
+
+    def _new_cache(self, torrent_url='http://url/mod-1.torrent'):
+        cache = HashCache('@mod', torrent_url)
+        cache.load()
+        return cache
+
+    def test_returns_sha1(self):
+        cache = self._new_cache()
+        self.assertEqual(cache.sha1(self.file_path), hashlib.sha1(b'contents').digest())
+
+    def test_unchanged_file_is_not_hashed_again(self):
+        cache = self._new_cache()
+        cache.sha1(self.file_path)
+        cache.save()
+
+        cache = self._new_cache()
+        with patch.object(hashcache, 'sha1') as sha1_mock:
+            self.assertEqual(cache.sha1(self.file_path), hashlib.sha1(b'contents').digest())
+            self.assertFalse(sha1_mock.called)
+
+    def test_modified_file_is_hashed_again(self):
+        cache = self._new_cache()
+        cache.sha1(self.file_path)
+        cache.save()
+
+        self._write_file(b'modified', mtime=1000000005)
+
+        cache = self._new_cache()
+        self.assertEqual(cache.sha1(self.file_path), hashlib.sha1(b'modified').digest())
+
+    def test_torrent_url_change_invalidates_the_cache(self):
+        cache = self._new_cache()
+        cache.sha1(self.file_path)
+        cache.save()
+
+        cache = self._new_cache(torrent_url='http://url/mod-2.torrent')
+        self.assertEqual(cache.entries, {})
+
+    def test_size_is_bounded(self):
+        cache = self._new_cache()
+        cache.max_entries = 2
+        cache.entries = {'a': [], 'b': [], 'c': []}
+        cache.sha1(self.file_path)
+        cache.save()
+
+        self.assertEqual(len(cache.entries), 2)
+        self.assertIn(self.file_path, cache.entries)
@@ -0,0 +1,64 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+from utils import hashes
+
+
+class HashFilesParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = {}
+
+        for i in range(20):
+            path = os.path.join(self.directory, 'file{}'.format(i))
+            contents = os.urandom(i * 100000)
+
+            with open(path, 'wb') as f:
+                f.write(contents)
+
+            self.files[path] = hashlib.sha1(contents).digest()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_digests_match_sha1(self):
+        results = dict(hashes.hash_files_parallel(self.files.keys(), workers=4))
+        self.assertEqual(results, self.files)
+
+    def test_same_result_as_sha1(self):
+        for path, digest in hashes.hash_files_parallel(self.files.keys()):
+            self.assertEqual(digest, hashes.sha1(path))
+
+    def test_custom_hash_function(self):
+        results = dict(hashes.hash_files_parallel([1, 2, 3], hash_function=lambda x: x * 2))
+        self.assertEqual(results, {1: 2, 2: 4, 3: 6})
+
+    def test_progress_is_reported(self):
+        message_queue = Mock()
+        list(hashes.hash_files_parallel(self.files.keys(), message_queue=message_queue))
+
+        # The last progress message is always sent
+        message_queue.progress.assert_called_with({'msg': 'Checking files: 20/20'}, 1.0)
+
+    def test_exceptions_are_propagated(self):
+        results = hashes.hash_files_parallel([os.path.join(self.directory, 'missing')])
+        self.assertRaises(IOError, list, results)
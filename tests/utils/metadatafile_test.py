@@ -0,0 +1,163 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import base64
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mock import patch
+from utils import metadatafile
+from utils.metadatafile import MetadataFile, get_mods_names
+
+
+class MetadataFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.patcher = patch.object(metadatafile, 'get_launcher_directory', lambda: self.directory)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def _new_metadata_file(self):
+        metadata_file = MetadataFile('@mod')
+        metadata_file.read_data(ignore_open_errors=True)
+        return metadata_file
+
+    def test_write_and_read(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_torrent_url('http://url/mod.torrent')
+        metadata_file.set_torrent_content(b'\x00torrent\xff')
+        metadata_file.set_torrent_resume_data(b'resume')
+        metadata_file.set_dirty(True)
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        self.assertEqual(metadata_file.get_torrent_url(), 'http://url/mod.torrent')
+        self.assertEqual(metadata_file.get_torrent_content(), b'\x00torrent\xff')
+        self.assertEqual(metadata_file.get_torrent_resume_data(), b'resume')
+        self.assertTrue(metadata_file.get_dirty())
+
+    def test_blobs_are_kept_when_not_read(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_torrent_content(b'torrent')
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_dirty(True)
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+
+    def test_blobs_are_kept_when_file_rewritten_in_the_meantime(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_torrent_content(b'torrent')
+        metadata_file.set_torrent_resume_data(b'resume')
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+
+        # Another process updates the file
+        other_metadata_file = self._new_metadata_file()
+        other_metadata_file.set_torrent_resume_data(b'new resume')
+        other_metadata_file.write_data()
+
+        # The blobs are read from the new version...
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+
+        # ...and the others are not lost when writing
+        metadata_file.set_dirty(True)
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        self.assertTrue(metadata_file.get_dirty())
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+        self.assertEqual(metadata_file.get_torrent_resume_data(), b'new resume')
+
+    def test_blob_removed_when_file_rewritten_in_the_meantime(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_torrent_content(b'torrent')
+        metadata_file.set_torrent_resume_data(b'resume')
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+
+        # Another process removes a blob
+        other_metadata_file = self._new_metadata_file()
+        other_metadata_file.set_torrent_resume_data(None)
+        other_metadata_file.write_data()
+
+        self.assertIsNone(metadata_file.get_torrent_resume_data())
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+
+    def test_write_raises_when_blobs_cannot_be_read(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_torrent_content(b'torrent')
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        with open(metadata_file.get_file_name(), 'wb') as f:
+            f.write(b'garbage')
+
+        metadata_file.set_dirty(True)
+        self.assertRaises(struct.error, metadata_file.write_data)
+
+    def test_unmodified_data_is_not_written(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_dirty(False)
+        metadata_file.write_data()
+
+        metadata_file = self._new_metadata_file()
+        metadata_file.set_dirty(False)
+        with patch.object(metadatafile, 'open', create=True) as open_mock:
+            metadata_file.write_data()
+            self.assertFalse(open_mock.called)
+
+    def test_legacy_file_is_migrated(self):
+        legacy_path = os.path.join(self.directory, MetadataFile.file_directory, '@mod.launcher_meta')
+        os.makedirs(os.path.dirname(legacy_path))
+
+        with open(legacy_path, 'wb') as f:
+            json.dump({'torrent_url': 'http://url/mod.torrent',
+                       'torrent_content': base64.b64encode(b'torrent'),
+                       'dirty': False}, f)
+
+        metadata_file = self._new_metadata_file()
+        self.assertEqual(metadata_file.get_torrent_url(), 'http://url/mod.torrent')
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertTrue(os.path.exists(metadata_file.get_file_name()))
+
+    def test_corrupted_file_raises(self):
+        metadata_file = self._new_metadata_file()
+        metadata_file.write_data()
+
+        with open(metadata_file.get_file_name(), 'wb') as f:
+            f.write(b'garbage')
+
+        self.assertRaises(ValueError, MetadataFile('@mod').read_data)
+
+    def test_get_mods_names(self):
+        self.assertEqual(get_mods_names(), [])
+
+        self._new_metadata_file().write_data()
+        self.assertEqual(get_mods_names(), ['@mod'])
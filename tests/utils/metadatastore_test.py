@@ -0,0 +1,112 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import metadatafile
+from utils.metadatafile import MetadataFile, batch_updates
+from utils.metadatastore import MetadataStore
+
+
+class MetadataStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = MetadataStore(os.path.join(self.directory, 'metadata.sqlite'))
+
+        self.patchers = [
+            patch.object(metadatafile, 'get_launcher_directory', lambda: self.directory),
+            patch.object(metadatafile, 'get_store', lambda: self.store),
+        ]
+
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def _write_mod(self, name, dirty=False, resume_data=b'resume'):
+        metadata_file = MetadataFile(name)
+        metadata_file.read_data(ignore_open_errors=True)
+        metadata_file.set_torrent_url('http://url/{}.torrent'.format(name))
+        metadata_file.set_torrent_content(b'torrent')
+        metadata_file.set_torrent_resume_data(resume_data)
+        metadata_file.set_dirty(dirty)
+        metadata_file.write_data()
+
+    def test_write_and_read(self):
+        self._write_mod('@mod')
+
+        metadata_file = MetadataFile('@mod')
+        metadata_file.read_data()
+        self.assertEqual(metadata_file.get_torrent_url(), 'http://url/@mod.torrent')
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+        self.assertEqual(metadata_file.get_torrent_resume_data(), b'resume')
+        self.assertFalse(os.path.exists(metadata_file.get_file_name()))
+
+    def test_missing_mod_raises(self):
+        self.assertRaises(IOError, MetadataFile('@missing').read_data)
+
+    def test_blobs_are_kept_when_not_modified(self):
+        self._write_mod('@mod')
+
+        metadata_file = MetadataFile('@mod')
+        metadata_file.read_data()
+        metadata_file.set_dirty(True)
+        metadata_file.write_data()
+
+        metadata_file = MetadataFile('@mod')
+        metadata_file.read_data()
+        self.assertEqual(metadata_file.get_torrent_content(), b'torrent')
+
+    def test_mods_states(self):
+        self._write_mod('@complete')
+        self._write_mod('@dirty', dirty=True)
+        self._write_mod('@no_resume_data', resume_data=b'')
+
+        self.assertEqual(self.store.get_dirty_mods(), ['@dirty'])
+        self.assertEqual(self.store.get_complete_mods(), ['@complete'])
+
+    def test_batch_is_rolled_back_on_error(self):
+        try:
+            with batch_updates():
+                self._write_mod('@mod1')
+                self._write_mod('@mod2')
+                raise KeyError()
+
+        except KeyError:
+            pass
+
+        self.assertEqual(self.store.get_mods_states(), {})
+
+    def test_existing_file_is_imported(self):
+        with patch.object(metadatafile, 'get_store', lambda: None):
+            self._write_mod('@mod')
+
+        file_path = MetadataFile('@mod').get_file_name()
+        self.assertTrue(os.path.exists(file_path))
+
+        metadata_file = MetadataFile('@mod')
+        metadata_file.read_data()
+        self.assertEqual(metadata_file.get_torrent_resume_data(), b'resume')
+        self.assertFalse(os.path.exists(file_path))
+        self.assertIn('@mod', self.store.get_mods_states())
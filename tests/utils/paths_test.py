@@ -0,0 +1,56 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils import paths
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'subdir', 'file')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_replaces_file(self):
+        with paths.atomic_write(self.path) as f:
+            f.write(b'old')
+
+        with paths.atomic_write(self.path, fsync=True) as f:
+            f.write(b'new')
+
+        self.assertEqual(self.read(), b'new')
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['file'])
+
+    def test_keeps_file_on_error(self):
+        with paths.atomic_write(self.path) as f:
+            f.write(b'old')
+
+        with self.assertRaises(ValueError):
+            with paths.atomic_write(self.path) as f:
+                f.write(b'truncat')
+                raise ValueError()
+
+        self.assertEqual(self.read(), b'old')
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['file'])
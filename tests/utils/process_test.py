@@ -24,7 +24,7 @@ from mock import patch, Mock
 from kivy.clock import Clock
 
 from nose.plugins.attrib import attr
-from utils.process import Para
+from utils.process import Para, stop_worker_host
 
 
 def worker_func(con, arg1, arg2):
@@ -46,6 +46,31 @@ def termination_func(con):
     con.resolve('terminating')
 
 
+def progress_burst_func(con, count):
+    """this function is run in another process"""
+    for i in range(count):
+        con.progress({'msg': 'progress {}'.format(i)}, float(i) / count)
+
+    con.resolve('done')
+
+
+def mixed_burst_func(con, count):
+    """this function is run in another process"""
+    for i in range(count):
+        con.progress({'msg': 'progress {}'.format(i)}, float(i) / count)
+        if i % 10 == 0:
+            con.progress({'msg': 'checked {}'.format(i), 'mod_key': i, 'complete': True}, float(i) / count)
+
+    con.progress({'msg': 'special', 'special_message': {'command': 'mod_found_action'}}, 1.0)
+    con.progress({'msg': 'last'}, 1.0)
+    con.resolve('done')
+
+
+def pid_func(con):
+    """this function is run in another process"""
+    con.resolve(os.getpid())
+
+
 def blocking_after_resolving(con):
     """this function is run in another process"""
     con.progress({'msg': 'blocking_after_resolving started'})
@@ -147,3 +172,88 @@ class ParaTest(unittest.TestCase):
                 para.request_termination()
 
         res_handler.assert_called_once_with('terminating')
+
+    def test_para_should_coalesce_progress_messages(self):
+        res_handler = Mock()
+        progress_handler = Mock()
+        count = 200
+
+        para = Para(progress_burst_func, (count,), 'testaction')
+        para.then(res_handler, None, progress_handler)
+        para.run()
+
+        # Let the child fill the pipe before reading anything
+        time.sleep(1)
+
+        for _ in range(1, 120):
+            Clock.tick()
+            if para.state == 'resolved':
+                break
+
+            time.sleep(0.1)
+
+        res_handler.assert_called_once_with('done')
+        progress_handler.assert_called_with({'msg': 'progress {}'.format(count - 1)},
+                                            float(count - 1) / count)
+
+        self.assertLess(progress_handler.call_count, count)
+        self.assertEqual(para.stats['messages_received'], count + 1)
+        self.assertEqual(para.stats['messages_dropped'], count - progress_handler.call_count)
+        self.assertGreater(para.stats['max_queue_depth'], 1)
+
+    def test_para_should_not_coalesce_other_progress_messages(self):
+        res_handler = Mock()
+        progress_handler = Mock()
+        count = 200
+
+        para = Para(mixed_burst_func, (count,), 'testaction')
+        para.then(res_handler, None, progress_handler)
+        para.run()
+
+        # Let the child fill the pipe before reading anything
+        time.sleep(1)
+
+        for _ in range(1, 120):
+            Clock.tick()
+            if para.state == 'resolved':
+                break
+
+            time.sleep(0.1)
+
+        res_handler.assert_called_once_with('done')
+        received = [call[0][0] for call in progress_handler.call_args_list]
+
+        self.assertEqual([data['mod_key'] for data in received if 'mod_key' in data], range(0, count, 10))
+        self.assertEqual([data for data in received if 'special_message' in data],
+                         [{'msg': 'special', 'special_message': {'command': 'mod_found_action'}}])
+        self.assertEqual(received[-1], {'msg': 'last'})
+        self.assertLess(progress_handler.call_count, count)
+        self.assertEqual(para.stats['messages_received'], count + count / 10 + 3)
+
+    def _run_hosted(self, func):
+        res_handler = Mock()
+
+        para = Para(func, (), 'testaction', use_host=True)
+        para.then(res_handler, None, None)
+        para.run()
+
+        for _ in range(1, 120):
+            Clock.tick()
+            if para.state == 'resolved':
+                break
+
+            time.sleep(0.1)
+
+        self.assertEqual(para.state, 'resolved')
+        return res_handler.call_args[0][0]
+
+    def test_para_should_reuse_worker_host(self):
+        try:
+            first_pid = self._run_hosted(pid_func)
+            second_pid = self._run_hosted(pid_func)
+
+        finally:
+            stop_worker_host()
+
+        self.assertNotEqual(first_pid, os.getpid())
+        self.assertEqual(first_pid, second_pid)
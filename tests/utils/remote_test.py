@@ -0,0 +1,292 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import mock
+import paramiko
+
+from utils import remote
+
+
+class StandInServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if (username, password) == ('user', 'password'):
+            return paramiko.AUTH_SUCCESSFUL
+
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class StandInHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat((self.readfile or self.writefile).fileno()))
+
+
+class StandInSFTPServer(paramiko.SFTPServerInterface):
+    """SFTP server storing the files in a local directory"""
+
+    def __init__(self, server, root):
+        super(StandInSFTPServer, self).__init__(server)
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def _call(self, function, *args):
+        try:
+            function(*args)
+
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+        return paramiko.SFTP_OK
+
+    def list_folder(self, path):
+        return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(self._path(path), name)), name)
+                for name in os.listdir(self._path(path))]
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(self._path(path), flags | getattr(os, 'O_BINARY', 0), 0o666)
+
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+        handle = StandInHandle(flags)
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            handle.writefile = os.fdopen(fd, 'r+b' if flags & os.O_RDWR else 'wb')
+        else:
+            handle.readfile = os.fdopen(fd, 'rb')
+
+        return handle
+
+    def remove(self, path):
+        return self._call(os.remove, self._path(path))
+
+    def posix_rename(self, oldpath, newpath):
+        return self._call(os.rename, self._path(oldpath), self._path(newpath))
+
+
+class RemoteConnectionTest(unittest.TestCase):
+    """Test the RemoteConection against a local SSH/SFTP stand-in.
+
+    The round trips are counted on the client side: a request sent while no
+    other request is waiting for its response has to wait for the server.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.host_key = paramiko.RSAKey.generate(1024)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.transports = []
+        self.round_trips = 0
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.connection = remote.RemoteConection('127.0.0.1', 'user', 'password',
+                                                 self.listener.getsockname()[1])
+
+    def tearDown(self):
+        self.connection.close()
+        self.listener.close()
+
+        for transport in self.transports:
+            transport.close()
+
+        shutil.rmtree(self.root)
+
+    def serve(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+
+            except socket.error:
+                return
+
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, StandInSFTPServer, self.root)
+            transport.start_server(server=StandInServer())
+            self.transports.append(transport)
+
+    def count_round_trips(self):
+        original_send_packet = paramiko.SFTPClient._send_packet
+
+        def send_packet(sftp, t, packet):
+            if len(sftp._expecting) <= 1:
+                self.round_trips += 1
+
+            return original_send_packet(sftp, t, packet)
+
+        return mock.patch.object(paramiko.SFTPClient, '_send_packet', send_packet)
+
+    def reverse_responses(self):
+        """Make the server seem to answer the pending requests in reverse order."""
+
+        original_read_packet = paramiko.SFTPClient._read_packet
+        packets = []
+
+        def read_packet(sftp):
+            if not packets:
+                packets.extend(original_read_packet(sftp) for _ in range(len(sftp._expecting)))
+                packets.reverse()
+
+            return packets.pop(0)
+
+        return mock.patch.object(paramiko.SFTPClient, '_read_packet', read_packet)
+
+    def reverse_renames(self):
+        """Make the server seem to process the pipelined renames in reverse order."""
+
+        original_rename_overwrite_many = self.connection.rename_overwrite_many
+
+        def rename_overwrite_many(renames):
+            return original_rename_overwrite_many(renames[::-1])[::-1]
+
+        return mock.patch.object(self.connection, 'rename_overwrite_many', rename_overwrite_many)
+
+    def write_file(self, name, contents):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(contents)
+
+    def read_file(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def test_save_file_rotates_backups_before_renaming(self):
+        self.write_file('metadata.json', b'version 2')
+        self.write_file('metadata.json_bak', b'version 1')
+
+        with self.count_round_trips():
+            self.connection.save_file('/metadata.json', b'version 3', keep_backups=10)
+
+        self.assertEqual(self.read_file('metadata.json'), b'version 3')
+        self.assertEqual(self.read_file('metadata.json_bak'), b'version 2')
+        self.assertEqual(self.read_file('metadata.json_bak1'), b'version 1')
+        self.assertEqual(sorted(os.listdir(self.root)), ['metadata.json', 'metadata.json_bak', 'metadata.json_bak1'])
+
+        # Open, the pipelined write and close, the two backups rotation steps and the rename
+        self.assertEqual(self.round_trips, 5)
+
+    def test_save_file_rotation_does_not_depend_on_the_order(self):
+        for i, name in enumerate(['metadata.json', 'metadata.json_bak', 'metadata.json_bak1', 'metadata.json_bak2']):
+            self.write_file(name, b'version {}'.format(4 - i))
+
+        with self.reverse_renames():
+            self.connection.save_file('/metadata.json', b'version 5', keep_backups=4)
+
+        self.assertEqual(sorted(os.listdir(self.root)), ['metadata.json', 'metadata.json_bak', 'metadata.json_bak1',
+                                                         'metadata.json_bak2', 'metadata.json_bak3'])
+        for i, name in enumerate(['metadata.json', 'metadata.json_bak', 'metadata.json_bak1',
+                                  'metadata.json_bak2', 'metadata.json_bak3']):
+            self.assertEqual(self.read_file(name), b'version {}'.format(5 - i))
+
+    def test_save_file_stops_when_backup_fails(self):
+        self.write_file('metadata.json', b'version 2')
+        os.mkdir(os.path.join(self.root, 'metadata.json_bak'))
+        self.write_file(os.path.join('metadata.json_bak', 'file'), b'')
+
+        self.assertRaises(IOError, self.connection.save_file, '/metadata.json', b'version 3', keep_backups=1)
+
+        self.assertEqual(self.read_file('metadata.json'), b'version 2')
+        self.assertEqual(sorted(os.listdir(self.root)), ['metadata.json', 'metadata.json_bak'])
+
+    def test_rename_overwrite_many_returns_errors(self):
+        self.write_file('a', b'a')
+        self.write_file('d', b'd')
+
+        with self.count_round_trips():
+            results = self.connection.rename_overwrite_many([('/a', '/b'), ('/missing', '/c'), ('/d', '/e')])
+
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], IOError)
+        self.assertIsNone(results[2])
+        self.assertEqual(sorted(os.listdir(self.root)), ['b', 'e'])
+        self.assertEqual(self.round_trips, 1)
+
+    def test_responses_out_of_order(self):
+        self.write_file('a', b'a')
+        self.write_file('d', b'd')
+
+        with self.reverse_responses():
+            results = self.connection.rename_overwrite_many([('/a', '/b'), ('/missing', '/c'), ('/d', '/e')])
+
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], IOError)
+        self.assertIsNone(results[2])
+        self.assertEqual(sorted(os.listdir(self.root)), ['b', 'e'])
+
+    def test_put_files(self):
+        local_directory = tempfile.mkdtemp()
+
+        try:
+            files = []
+            for i in range(5):
+                local_path = os.path.join(local_directory, 'mod{}.torrent'.format(i))
+                with open(local_path, 'wb') as f:
+                    f.write(os.urandom(100000 + i))
+
+                files.append((local_path, '/mod{}.torrent'.format(i)))
+
+            self.write_file('mod0.torrent', b'old')
+            self.connection.put_files(files, connections=3)
+
+            self.assertEqual(sorted(os.listdir(self.root)), ['mod{}.torrent'.format(i) for i in range(5)])
+            for local_path, remote_path in files:
+                with open(local_path, 'rb') as f:
+                    self.assertEqual(self.read_file(remote_path.lstrip('/')), f.read())
+
+        finally:
+            shutil.rmtree(local_directory)
+
+    def test_remove_files(self):
+        for name in ('a', 'b', 'c'):
+            self.write_file(name, b'')
+
+        with self.count_round_trips():
+            self.connection.remove_files(['/a', '/c'])
+
+        self.assertEqual(os.listdir(self.root), ['b'])
+        self.assertEqual(self.round_trips, 1)
@@ -0,0 +1,82 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import platform
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import walker
+
+
+class WalkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        for directory in ('a', 'a/b', 'c'):
+            os.mkdir(os.path.join(self.directory, directory))
+
+        for file_name in ('file', 'a/file1', 'a/b/file2', 'c/file3'):
+            with open(os.path.join(self.directory, file_name), 'wb') as f:
+                f.write(b'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _walked_files(self, **kwargs):
+        files = []
+        for dirpath, _, filenames in walker.walk(self.directory, **kwargs):
+            files.extend(os.path.relpath(os.path.join(dirpath, name), self.directory) for name in filenames)
+
+        return sorted(files)
+
+    def test_same_result_as_os_walk(self):
+        expected = [(dirpath, sorted(dirnames), sorted(filenames))
+                    for dirpath, dirnames, filenames in os.walk(self.directory)]
+        walked = [(dirpath, sorted(dirnames), sorted(filenames))
+                  for dirpath, dirnames, filenames in walker.walk(self.directory)]
+
+        self.assertEqual(sorted(walked), sorted(expected))
+
+    def test_same_result_without_scandir(self):
+        expected = self._walked_files()
+
+        with patch.object(walker, 'scandir', None):
+            self.assertEqual(self._walked_files(), expected)
+
+    def test_pruned_directories_are_not_entered(self):
+        files = []
+        for dirpath, dirnames, filenames in walker.walk(self.directory):
+            if 'a' in dirnames:
+                dirnames.remove('a')
+
+            files.extend(filenames)
+
+        self.assertEqual(sorted(files), ['file', 'file3'])
+
+    @unittest.skipIf(platform.system() == 'Windows', 'Requires symlinks')
+    def test_link_loops_are_not_followed(self):
+        os.symlink(self.directory, os.path.join(self.directory, 'a', 'b', 'loop'))
+
+        self.assertEqual(self._walked_files(followlinks=True),
+                         ['a/b/file2', 'a/file1', 'c/file3', 'file'])
+
+    def test_stat_files(self):
+        files_stats = walker.stat_files(os.path.join(self.directory, 'a'), self.directory)
+
+        self.assertEqual(sorted(files_stats), [os.path.join('a', 'b', 'file2'), os.path.join('a', 'file1')])
+        self.assertEqual(files_stats[os.path.join('a', 'file1')].st_size, 4)
@@ -0,0 +1,126 @@
+from __future__ import unicode_literals
+
+"""
+Benchmark the directory walker against the os.walk based walker it replaced.
+
+A synthetic tree is created in a temporary directory (or in --directory) and
+the walkers are used to list all the files and get their stat data, the way
+is_complete_quick does. The walker is measured both with scandir (needs the
+scandir package on Python 2) and with its listdir + lstat fallback.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils import walker
+
+
+def legacy_walk(top):
+    """The previous implementation: os.walk and a file id query per directory."""
+
+    visited = set()
+
+    for entry in os.walk(top, True, None, True):
+        try:
+            file_id = walker._get_file_id(entry[0], True)
+
+            if file_id in visited:
+                del entry[1][:]
+                continue
+
+            visited.add(file_id)
+
+        except Exception:
+            pass
+
+        yield entry
+
+
+def legacy_stat_files(top):
+    files_stats = {}
+
+    for dirpath, _, filenames in legacy_walk(top):
+        for file_name in filenames:
+            file_path = os.path.join(dirpath, file_name)
+            files_stats[os.path.relpath(file_path, top)] = os.lstat(file_path)
+
+    return files_stats
+
+
+def fallback_stat_files(top):
+    """walker.stat_files without scandir."""
+
+    scandir = walker.scandir
+    walker.scandir = None
+
+    try:
+        return walker.stat_files(top)
+
+    finally:
+        walker.scandir = scandir
+
+
+def create_tree(directory, files_count, files_per_directory, directories_per_directory):
+    print 'Creating {} files in {}...'.format(files_count, directory)
+
+    created = 0
+    pending = [directory]
+
+    while created < files_count:
+        current = pending.pop(0)
+
+        for i in xrange(min(files_per_directory, files_count - created)):
+            with open(os.path.join(current, 'file_{}.pbo'.format(i)), 'wb') as f:
+                f.write(b'x' * (i % 16))
+
+            created += 1
+
+        for i in xrange(directories_per_directory):
+            subdirectory = os.path.join(current, 'dir_{}'.format(i))
+            os.mkdir(subdirectory)
+            pending.append(subdirectory)
+
+
+def measure(name, function, directory, runs):
+    timings = []
+
+    for _ in xrange(runs):
+        start = time.time()
+        files_stats = function(directory)
+        timings.append(time.time() - start)
+
+    print '{:<30} {:>8} files  best: {:0.3f}s  average: {:0.3f}s'.format(
+        name, len(files_stats), min(timings), sum(timings) / len(timings))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the directory walker.')
+    parser.add_argument('-d', '--directory', help='Existing directory to walk instead of creating a tree')
+    parser.add_argument('-n', '--files', type=int, default=200000, help='Number of files of the synthetic tree')
+    parser.add_argument('-r', '--runs', type=int, default=3, help='Number of runs of each walker')
+    args = parser.parse_args()
+
+    directory = args.directory
+
+    if not directory:
+        directory = tempfile.mkdtemp(prefix='walker_benchmark_')
+        create_tree(directory, args.files, files_per_directory=50, directories_per_directory=4)
+
+    try:
+        measure('os.walk + lstat', legacy_stat_files, directory, args.runs)
+        measure('walker.stat_files (listdir)', fallback_stat_files, directory, args.runs)
+
+        if walker.scandir is not None:
+            measure('walker.stat_files (scandir)', walker.stat_files, directory, args.runs)
+        else:
+            print 'scandir is not available. Install it with: pip install scandir'
+
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)